@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import random
+import argparse
+import contextlib
+import io
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils import get_unique_htmlID
+
+parser = argparse.ArgumentParser(
+    description="Check the htmlID collision resolver against the former nested-loop "
+    "implementation on a synthetic dataset with many same-day streams, and time both."
+)
+parser.add_argument("--days", type=int, default=200, help="number of stream days.")
+parser.add_argument(
+    "--streams", type=int, default=4, help="maximum number of streams per day."
+)
+parser.add_argument("--songs", type=int, default=15, help="songs per stream.")
+parser.add_argument("--seed", type=int, default=0, help="random seed.")
+parser.add_argument(
+    "--skip-reference",
+    action="store_true",
+    help="only time the resolver (the reference is quadratic).",
+)
+args = parser.parse_args()
+
+
+def get_unique_htmlID_reference(df):
+    """
+    The former implementation of `utils.get_unique_htmlID`, comparing every song to every stream.
+    """
+    print("\nChecking htmlIDs duplicates")
+    df_gb = (
+        df[["live_title", "htmlID"]]
+        .groupby(["live_title", "htmlID"])
+        .size()
+        .reset_index(name="count")
+    )
+    htmlIDs = []
+    live_to_update = []
+    for idx, row in df_gb.iterrows():
+        htmlIDs.append(row["htmlID"])
+        count = htmlIDs.count(row["htmlID"])
+        if count > 1:
+            print(f"\tMultiple {row['htmlID']} for {row['live_title']} ({count})")
+            df_gb.loc[idx, "htmlID"] = row["htmlID"] + chr(64 + count)
+            live_to_update.append(row["live_title"])
+    for idx, row in df.iterrows():
+        for _, row_gb in df_gb.iterrows():
+            if (
+                row["live_title"] == row_gb["live_title"]
+                and row["htmlID"] != row_gb["htmlID"]
+                and row["live_title"] in live_to_update
+            ):
+                df.loc[idx, "htmlID"] = row_gb["htmlID"]
+    print("Done")
+    return df
+
+
+def make_songs_df(days, streams, songs, seed):
+    """
+    Builds a minimal song DataFrame where most days hold several streams on the same media.
+    """
+    rng = random.Random(seed)
+    live_titles, htmlIDs = [], []
+    for day in range(days):
+        date_str = f"2{day // 365 + 1:02d}{day % 12 + 1:02d}{day % 28 + 1:02d}"
+        media = rng.choice(["tw", "yt", "live"])
+        for stream in range(rng.randint(1, streams)):
+            title = f"Stream {day} - {stream}"
+            # Some titles are reused on another day, as happens for recurring streams
+            if rng.random() < 0.02 and live_titles:
+                title = rng.choice(live_titles)
+            for _ in range(songs):
+                live_titles.append(title)
+                htmlIDs.append(f"{date_str}{media}")
+    return pd.DataFrame({"live_title": live_titles, "htmlID": htmlIDs})
+
+
+df = make_songs_df(args.days, args.streams, args.songs, args.seed)
+print(f"{len(df)} songs, {df['live_title'].nunique()} streams")
+
+output = io.StringIO()
+start = time.perf_counter()
+with contextlib.redirect_stdout(output):
+    df_new = get_unique_htmlID(df.copy())
+duration = time.perf_counter() - start
+print(f"Resolver: {duration:.3f} s")
+
+if not args.skip_reference:
+    output_reference = io.StringIO()
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(output_reference):
+        df_reference = get_unique_htmlID_reference(df.copy())
+    duration_reference = time.perf_counter() - start
+    print(
+        f"Reference: {duration_reference:.3f} s, speedup {duration_reference / duration:.0f}x"
+    )
+    pd.testing.assert_frame_equal(df_new, df_reference)
+    assert output.getvalue() == output_reference.getvalue()
+    print("Outputs identical to the reference.")
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+import openpyxl
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils import get_df_from_xls, get_stream_blocks, stream_blocks_memory
+from xls_reader import read_sheet_rows
+
+parser = argparse.ArgumentParser(
+    description="Time a full parse against an incremental parse after a one-block edit."
+)
+parser.add_argument("xls_file", help="workbook to benchmark (e.g. marc_tw.xlsm).")
+parser.add_argument("--en", action="store_true", help="use the English sheet.")
+parser.add_argument("--repeat", type=int, default=5, help="number of timed runs.")
+args = parser.parse_args()
+
+sheet = "Sheet2" if args.en else "Sheet1"
+
+
+def timed(function, *args, **kwargs):
+    start = time.perf_counter()
+    result = function(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+with tempfile.TemporaryDirectory() as tmp_dir:
+    xls_file = f"{tmp_dir}/{os.path.basename(args.xls_file)}"
+    blocks_dir = f"{tmp_dir}/blocks"
+    shutil.copy(args.xls_file, xls_file)
+
+    # Store the blocks of the unedited workbook, on disk and in memory
+    get_df_from_xls(xls_file, EN=args.en, incremental=True, blocks_dir=blocks_dir)
+    stored_memory = {key: dict(blocks) for key, blocks in stream_blocks_memory.items()}
+
+    # Edit the comment of the first song of the last stream block
+    blocks = get_stream_blocks(read_sheet_rows(xls_file, sheet))
+    wrkbk = openpyxl.load_workbook(xls_file, keep_vba=xls_file.endswith(".xlsm"))
+    cell = wrkbk[sheet].cell(blocks[-1]["first_row"], 8)
+    cell.value = f"{cell.value} (edited)"
+    wrkbk.save(xls_file)
+    print(f"Edited block '{blocks[-1]['title']}' ({len(blocks)} blocks)\n")
+
+    timings = {"read": [], "full": [], "new process": [], "same process": []}
+    for _ in range(args.repeat):
+        timings["read"].append(timed(read_sheet_rows, xls_file, sheet)[0])
+
+        duration, df_full = timed(get_df_from_xls, xls_file, EN=args.en)
+        timings["full"].append(duration)
+
+        # Previous run only available on disk
+        stream_blocks_memory.clear()
+        shutil.copytree(blocks_dir, f"{blocks_dir}_run")
+        duration, df_incremental = timed(
+            get_df_from_xls,
+            xls_file,
+            EN=args.en,
+            incremental=True,
+            blocks_dir=f"{blocks_dir}_run",
+        )
+        timings["new process"].append(duration)
+        shutil.rmtree(f"{blocks_dir}_run")
+        pd.testing.assert_frame_equal(df_full, df_incremental)
+
+        # Previous run still in memory
+        stream_blocks_memory.clear()
+        for key, blocks in stored_memory.items():
+            stream_blocks_memory[key.replace(blocks_dir, f"{blocks_dir}_run")] = dict(
+                blocks
+            )
+        duration, df_incremental = timed(
+            get_df_from_xls,
+            xls_file,
+            EN=args.en,
+            incremental=True,
+            blocks_dir=f"{blocks_dir}_run",
+        )
+        timings["same process"].append(duration)
+        shutil.rmtree(f"{blocks_dir}_run")
+        pd.testing.assert_frame_equal(df_full, df_incremental)
+
+read = min(timings["read"])
+full = min(timings["full"])
+print(f"\nSheet read (shared by every mode): {read:.3f} s")
+print(f"Full parse: {full:.3f} s (songs: {full - read:.3f} s)")
+for mode in ["new process", "same process"]:
+    duration = min(timings[mode])
+    print(
+        f"Incremental parse, {mode}: {duration:.3f} s (songs: {duration - read:.3f} s), "
+        f"speedup {full / duration:.2f}x"
+    )
+print("Outputs identical to the full parse.")
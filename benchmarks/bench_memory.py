@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import sys
+import argparse
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils import get_dfs_from_xls, get_unique_IDs, compact_songs_df
+
+parser = argparse.ArgumentParser(
+    description="Report the memory used by the song DataFrame before and after compact_songs_df."
+)
+parser.add_argument(
+    "xls_files",
+    nargs="*",
+    default=["marc_yt.xlsm", "marc_tw.xlsm", "marc_live.xlsm"],
+    help="workbooks to load.",
+)
+parser.add_argument("--en", action="store_true", help="use the English sheet.")
+args = parser.parse_args()
+
+df = get_unique_IDs(get_dfs_from_xls(args.xls_files, sheets=(args.en,))[args.en])
+df_compact = compact_songs_df(df)
+
+before = df.memory_usage(deep=True, index=False)
+after = df_compact.memory_usage(deep=True, index=False)
+report = pd.DataFrame(
+    {
+        "dtype before": df.dtypes.astype(str),
+        "before (kB)": before / 1024,
+        "dtype after": df_compact.dtypes.astype(str),
+        "after (kB)": after / 1024,
+        "ratio": after / before,
+    }
+)
+
+# memory_usage(deep=True) counts the string buffers, whatever the storage of the str columns
+print(
+    f"\n_______ Memory usage, {len(df)} songs "
+    f"(str storage: {df['name'].dtype.storage}) _______\n"
+)
+print(report.to_string(float_format=lambda x: f"{x:.2f}"))
+print(
+    f"\nTotal: {before.sum() / 1024:.1f} kB -> {after.sum() / 1024:.1f} kB "
+    f"({after.sum() / before.sum():.0%})"
+)
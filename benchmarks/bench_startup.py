@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import re
+import sys
+import time
+import argparse
+import subprocess
+
+root_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+# Startup budget of each entry point (seconds), measured with --help: the imports and the argument parsing
+startup_budgets = {
+    "do_search.py": 0.3,
+    "do_database.py": 0.8,
+    "do_plots.py": 0.8,
+    "dl_songs.py": 0.8,
+    "do_watch.py": 0.8,
+}
+
+# Modules only the functions using them may import
+heavy_modules = [
+    "matplotlib",
+    "seaborn",
+    "plothist",
+    "xlsx2html",
+    "bs4",
+    "pythumb",
+    "yaml",
+    "pytube",
+    "yt_dlp",
+    "pydub",
+    "mutagen",
+    "openpyxl",
+]
+
+parser = argparse.ArgumentParser(
+    description="Check the startup time of each entry point against its budget, "
+    "and that no heavy module is imported at startup."
+)
+parser.add_argument("--repeat", type=int, default=5, help="number of timed runs.")
+args = parser.parse_args()
+
+
+def get_startup_time(script):
+    """
+    Returns the best wall time of `python script --help` over `args.repeat` runs.
+    """
+    best = None
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, script, "--help"],
+            cwd=root_dir,
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        duration = time.perf_counter() - start
+        best = duration if best is None else min(best, duration)
+    return best
+
+
+def get_heavy_imports(script):
+    """
+    Returns the heavy modules imported by `python script --help`, from the -X importtime report.
+    """
+    report = subprocess.run(
+        [sys.executable, "-X", "importtime", script, "--help"],
+        cwd=root_dir,
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    ).stderr
+    imported = set(re.findall(r"\|\s*([\w.]+)$", report, re.M))
+    return [module for module in heavy_modules if module in imported]
+
+
+failures = 0
+print(f"{'entry point':<16} {'startup (s)':>11} {'budget (s)':>10}  heavy imports")
+for script, budget in startup_budgets.items():
+    startup_time = get_startup_time(script)
+    heavy_imports = get_heavy_imports(script)
+    over_budget = startup_time > budget
+    failures += over_budget or bool(heavy_imports)
+    print(
+        f"{script:<16} {startup_time:>11.3f} {budget:>10.1f}  "
+        f"{', '.join(heavy_imports) or '-'}{'  OVER BUDGET' if over_budget else ''}"
+    )
+
+sys.exit(1 if failures else 0)
@@ -0,0 +1,258 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import io
+import sys
+import json
+import time
+import platform
+import argparse
+import datetime
+import tempfile
+import contextlib
+import statistics
+
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+
+benchmarks_dir = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(benchmarks_dir, ".."))
+from synthetic_workbooks import make_workbooks
+
+parser = argparse.ArgumentParser(
+    description="Time the pipeline on synthetic workbooks at several scales, "
+    "record the results as JSON and flag regressions against a baseline."
+)
+parser.add_argument(
+    "--scales",
+    type=int,
+    nargs="+",
+    default=[1, 10],
+    help="sizes of the workbooks, as multiples of today's size (e.g. 1 10 100).",
+)
+parser.add_argument("--repeat", type=int, default=3, help="number of timed runs.")
+parser.add_argument(
+    "--workbooks-dir",
+    default=os.path.join(benchmarks_dir, ".workbooks"),
+    help="folder keeping the generated workbooks between runs.",
+)
+parser.add_argument(
+    "--output",
+    default=os.path.join(benchmarks_dir, "results.json"),
+    help="file to write the results to.",
+)
+parser.add_argument(
+    "--baseline",
+    default=os.path.join(benchmarks_dir, "baseline.json"),
+    help="results to compare against.",
+)
+parser.add_argument(
+    "--save-baseline",
+    action="store_true",
+    help="also store the results as the new baseline.",
+)
+parser.add_argument(
+    "--tolerance",
+    type=float,
+    default=0.25,
+    help="relative slowdown flagged as a regression. Default is 0.25 (25%%).",
+)
+parser.add_argument(
+    "--min-delta",
+    type=float,
+    default=0.02,
+    help="slowdowns shorter than this (seconds) are never flagged, to ignore noise.",
+)
+parser.add_argument(
+    "--stages", nargs="+", help="only run the stages starting with these names."
+)
+args = parser.parse_args()
+
+
+def run_stage(function, setup=None):
+    """
+    Times a stage `args.repeat` times, its output silenced.
+
+    Parameters:
+    function (callable): The stage, called with the value returned by `setup`.
+    setup (callable): Called before each run, untimed. Default is None.
+
+    Returns:
+    dict: The "runs" durations (seconds), their "best" and "median", or the "error" raised.
+    """
+    runs = []
+    for _ in range(args.repeat):
+        value = setup() if setup is not None else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            try:
+                function(value)
+            except Exception as error:
+                return {"error": f"{type(error).__name__}: {error}"}
+            runs.append(time.perf_counter() - start)
+        plt.close("all")
+    return {"runs": runs, "best": min(runs), "median": statistics.median(runs)}
+
+
+def run_scale(scale):
+    """
+    Runs every stage on the synthetic workbooks of one scale, in a temporary working folder.
+
+    Returns:
+    dict: The size of the dataset and the result of each stage.
+    """
+    workbooks_dir = os.path.abspath(f"{args.workbooks_dir}/x{scale}")
+    if not os.path.exists(f"{workbooks_dir}/marc_live.xlsm"):
+        print(f"Generating the x{scale} workbooks in {workbooks_dir}")
+        make_workbooks(workbooks_dir, scale)
+    xls_files = [f"{workbooks_dir}/marc_{media}.xlsm" for media in ["tw", "live", "yt"]]
+
+    # The stages write data/, plots/ and .cache/ in the working folder
+    cwd = os.getcwd()
+    work_dir = tempfile.mkdtemp(prefix=f"bench_x{scale}_")
+    os.chdir(work_dir)
+    for media in ["yt", "tw", "live"]:
+        os.symlink(f"{workbooks_dir}/marc_{media}.xlsx", f"marc_{media}.xlsx")
+        os.makedirs(f"data/tables/{media}", exist_ok=True)
+
+    import pandas as pd
+    from utils import get_df_from_xls, get_unique_IDs, print_simple_stats
+    from database import output_newdatabase_JSON, make_html_tables
+    from thumbnails import StubResolver
+    from rollup import build_rollup
+    import plotting
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        df = get_unique_IDs(
+            pd.concat([get_df_from_xls(file) for file in xls_files], ignore_index=True)
+        )
+    filtered_df = df[~df["songID"].str.startswith("cut")].query("rank != 'I'")
+    filtered_df = filtered_df.sort_values("date_DT", ascending=False)
+    rollup = build_rollup(filtered_df)
+
+    def reset_thumbnails(_=None):
+        with open("data/thumbnails.json", "w") as f:
+            f.write("{}\n")
+
+    def output_json(_):
+        output_newdatabase_JSON(df, resolver=StubResolver())
+
+    stages = {
+        "get_df_from_xls": lambda _: [get_df_from_xls(file) for file in xls_files],
+        "get_unique_IDs": lambda raw_df: get_unique_IDs(raw_df),
+        "print_simple_stats": lambda _: print_simple_stats(df),
+        "output_newdatabase_JSON": output_json,
+        "make_html_tables": lambda _: make_html_tables(df),
+        "build_rollup": lambda _: build_rollup(filtered_df),
+    }
+    setups = {
+        "get_unique_IDs": lambda: pd.concat(
+            [get_df_from_xls(file) for file in xls_files], ignore_index=True
+        ),
+        "output_newdatabase_JSON": reset_thumbnails,
+    }
+    for name in dir(plotting):
+        if not name.startswith("make_"):
+            continue
+        plot = getattr(plotting, name)
+        if name == "make_length_plot":
+            for plot_type in ["timing", "stream_length"]:
+                stages[f"{name}[{plot_type}]"] = (
+                    lambda _, plot=plot, plot_type=plot_type: plot(
+                        filtered_df, plot_type=plot_type, rollup=rollup
+                    )
+                )
+        elif name == "make_rank_plots":
+            for rank in ["high", "mid", "low"]:
+                stages[f"{name}[{rank}]"] = lambda _, plot=plot, rank=rank: plot(
+                    filtered_df, rank=rank, rollup=rollup
+                )
+        elif name == "make_streamtype_plot":
+            for plot_type in ["rank", "tempo"]:
+                stages[f"{name}[{plot_type}]"] = (
+                    lambda _, plot=plot, plot_type=plot_type: plot(
+                        filtered_df, plot_type=plot_type, rollup=rollup
+                    )
+                )
+        else:
+            stages[name] = lambda _, plot=plot: plot(filtered_df, rollup=rollup)
+
+    results = {}
+    for stage, function in stages.items():
+        if args.stages and not any(stage.startswith(name) for name in args.stages):
+            continue
+        results[stage] = run_stage(function, setups.get(stage))
+        if "error" in results[stage]:
+            print(f"  {stage:<40} error: {results[stage]['error']}")
+        else:
+            print(f"  {stage:<40} {results[stage]['best']:8.3f} s")
+
+    os.chdir(cwd)
+    return {
+        "n_streams": int(df["htmlID"].nunique()),
+        "n_songs": len(df),
+        "stages": results,
+    }
+
+
+def get_regressions(results, baseline):
+    """
+    Compares the best time of each stage to the baseline.
+
+    Returns:
+    list: The (scale, stage, baseline time, time) of the stages slower than the tolerance allows.
+    """
+    regressions = []
+    for scale, scale_results in results["scales"].items():
+        baseline_stages = baseline["scales"].get(scale, {}).get("stages", {})
+        for stage, result in scale_results["stages"].items():
+            reference = baseline_stages.get(stage, {}).get("best")
+            if reference is None or "best" not in result:
+                continue
+            if (
+                result["best"] > reference * (1 + args.tolerance)
+                and result["best"] - reference > args.min_delta
+            ):
+                regressions.append((scale, stage, reference, result["best"]))
+    return regressions
+
+
+results = {
+    "date": datetime.datetime.now().isoformat(timespec="seconds"),
+    "python": platform.python_version(),
+    "platform": platform.platform(),
+    "repeat": args.repeat,
+    "scales": {},
+}
+for scale in args.scales:
+    print(f"\n_______ x{scale} _______\n")
+    results["scales"][f"x{scale}"] = run_scale(scale)
+    print(
+        f"\n{results['scales'][f'x{scale}']['n_songs']} songs, "
+        f"{results['scales'][f'x{scale}']['n_streams']} streams"
+    )
+
+with open(args.output, "w") as f:
+    json.dump(results, f, indent=2)
+print(f"\nResults saved to {args.output}")
+
+regressions = []
+if os.path.exists(args.baseline):
+    with open(args.baseline, "r") as f:
+        regressions = get_regressions(results, json.load(f))
+    for scale, stage, reference, best in regressions:
+        print(
+            f"REGRESSION {scale} {stage}: {reference:.3f} s -> {best:.3f} s "
+            f"({best / reference - 1:+.0%})"
+        )
+    if not regressions:
+        print(f"No regression against {args.baseline}")
+
+if args.save_baseline:
+    with open(args.baseline, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"Baseline saved to {args.baseline}")
+
+sys.exit(1 if regressions else 0)
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import random
+import argparse
+import datetime
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import PatternFill
+
+# Number of streams of each workbook at scale 1, roughly the size of the workbooks today
+base_streams = {"yt": 110, "tw": 140, "live": 25}
+
+# Raw ranks with the background colors of their row and of their rank cell (see database.css_colors_dict)
+rank_colors = {
+    "S": ("FFCC00", "FF9900"),
+    "A+": ("E8D1FF", "CC66FF"),
+    "A": ("E8D1FF", "CC99FF"),
+    "B+": ("99FF99", "00FF00"),
+    "B": ("99FF99", "66FF99"),
+    "C+": ("CCECFF", "19D3FF"),
+    "C": ("CCECFF", "53D2FF"),
+    "D": ("C4C4C4", "A6A6A6"),
+    "S I D": ("C4C4C4", "A6A6A6"),
+    "-": ("C4C4C4", "A6A6A6"),
+}
+rank_weights = [6, 8, 12, 14, 14, 12, 10, 14, 2, 8]
+
+tempos = ["medium", "fast", "slow", "medium fast", "medium slow", "fast into slow"]
+genres = ["funk", "house", "gospel", "blues", "hip hop", "disco", "rock", "jazz"]
+words = (
+    "night groove hello morning baby dance loop people money coffee "
+    "problems phone party feeling boots dramatic event weekend bass keys"
+).split()
+
+first_date = datetime.date(2017, 12, 1)
+last_date = datetime.date(2024, 12, 31)
+
+
+def get_stream_date(n_stream, n_streams):
+    """
+    Returns the date of a stream, the streams being spread evenly between `first_date` and `last_date`.
+    """
+    span = (last_date - first_date).days
+    return first_date + datetime.timedelta(days=n_stream * span // max(n_streams, 1))
+
+
+def get_song_URL(media, video_code, seconds):
+    """
+    Returns the hyperlink of a song, pointing to its timestamp in the stream video.
+    """
+    if media == "tw":
+        hours, minutes = divmod(seconds // 60, 60)
+        return f"https://www.twitch.tv/videos/{video_code}?t={hours}h{minutes}m{seconds % 60}s"
+    return f"https://www.youtube.com/watch?v={video_code}&t={seconds}s"
+
+
+def make_sheet_rows(media, n_streams, EN, rng):
+    """
+    Generates the rows of one sheet, laid out as `utils.get_df_from_xls` expects.
+
+    The songs start at row 5. The first song row of each stream holds the stream title (column A),
+    its comment (B) and the date when it was ranked (J), the second one the stream date (A). Column C
+    holds the song name, hyperlinked to the song timestamp, and a blank row separates the streams.
+
+    Returns:
+    list: The rows, as lists of (value, hyperlink, fill color) cells.
+    """
+    rows = [[] for _ in range(4)]
+    for n_stream in range(n_streams):
+        date = get_stream_date(n_stream, n_streams)
+        ranked = date + datetime.timedelta(days=rng.randint(1, 400))
+        if media == "tw":
+            video_code = str(rng.randint(10**8, 10**9))
+            date_cell = date.strftime("%y%m%d") + "t"
+        else:
+            video_code = "".join(
+                rng.choices("abcdefghijkABCDEFGHIJK0123456789_-", k=11)
+            )
+            date_cell = date.strftime("%b %-d, %Y")
+
+        seconds = rng.randint(0, 300)
+        choral = None
+        for n_song in range(rng.randint(6, 18)):
+            rank = rng.choices(list(rank_colors), weights=rank_weights)[0]
+            row_color, rank_color = rank_colors[rank]
+            minutes = rng.randint(1, 9)
+            name = " ".join(rng.choices(words, k=rng.randint(1, 3))).title()
+
+            row = [None] * 10
+            if n_song == 0:
+                title = f"Stream {n_stream + 1}" if EN else f"Live {n_stream + 1}"
+                row[0] = f'{title} "{rng.choice(words)}"'
+                if rng.random() < 0.5:
+                    row[1] = "Great stream" if EN else "Super live"
+                # Some streams are not ranked yet
+                if rng.random() < 0.9:
+                    row[9] = int(ranked.strftime("%y%m%d"))
+            elif n_song == 1:
+                row[0] = date_cell
+            row[2] = name
+            row[3] = rank
+            row[4] = rng.choice(genres)
+            row[5] = rng.choice(tempos)
+            row[6] = f"{minutes}'{rng.randint(0, 59):02d}"
+            # The sheets write "-" for a song without a comment
+            if rng.random() < 0.3:
+                row[7] = "Nice loop" if EN else "Belle boucle"
+            else:
+                row[7] = "-"
+            if rng.random() < 0.2:
+                # Ditto marks repeat the choral of the row above
+                row[8] = '"' if choral and rng.random() < 0.5 else "yes"
+            choral = row[8]
+
+            rows.append(
+                [
+                    (
+                        value,
+                        (
+                            get_song_URL(media, video_code, seconds)
+                            if n_column == 2
+                            else None
+                        ),
+                        rank_color if n_column == 3 else row_color,
+                    )
+                    for n_column, value in enumerate(row)
+                ]
+            )
+            seconds += minutes * 60 + rng.randint(0, 120)
+        rows.append([])
+    return rows
+
+
+def make_workbook(path, media, n_streams, seed=0):
+    """
+    Writes a synthetic workbook with the French (Sheet1) and English (Sheet2) sheets of `n_streams` streams.
+
+    Parameters:
+    path (str): The path of the workbook to write (e.g. marc_tw.xlsm).
+    media (str): The media of the workbook ("yt", "tw" or "live").
+    n_streams (int): The number of streams.
+    seed (int): The random seed, so that both sheets hold the same streams.
+    """
+    wrkbk = openpyxl.Workbook(write_only=True)
+    fills = {}
+    for sheet, EN in [("Sheet1", False), ("Sheet2", True)]:
+        wrksht = wrkbk.create_sheet(sheet)
+        for row in make_sheet_rows(media, n_streams, EN, random.Random(seed)):
+            cells = []
+            for value, hyperlink, color in row:
+                cell = WriteOnlyCell(wrksht, value)
+                if hyperlink is not None:
+                    cell.hyperlink = hyperlink
+                if color not in fills:
+                    fills[color] = PatternFill("solid", fgColor=color)
+                cell.fill = fills[color]
+                cells.append(cell)
+            wrksht.append(cells)
+    wrkbk.save(path)
+
+
+def make_workbooks(folder, scale=1, seed=0, extensions=(".xlsm", ".xlsx")):
+    """
+    Writes the synthetic marc_yt, marc_tw and marc_live workbooks at `scale` times today's size.
+
+    The .xlsx copies are the ones `database.make_html_tables` reads.
+
+    Parameters:
+    folder (str): The folder to write the workbooks to.
+    scale (int): The size factor, applied to the number of streams of `base_streams`.
+    seed (int): The random seed.
+    extensions (tuple): The extensions to write each workbook with.
+
+    Returns:
+    list: The paths of the .xlsm workbooks.
+    """
+    os.makedirs(folder, exist_ok=True)
+    xls_files = []
+    for n_media, (media, n_streams) in enumerate(base_streams.items()):
+        path = f"{folder}/marc_{media}"
+        make_workbook(path + extensions[0], media, n_streams * scale, seed + n_media)
+        for extension in extensions[1:]:
+            with open(path + extensions[0], "rb") as f_in, open(
+                path + extension, "wb"
+            ) as f_out:
+                f_out.write(f_in.read())
+        xls_files.append(path + extensions[0])
+    return xls_files
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Write synthetic marc_*.xlsm workbooks at a multiple of today's size."
+    )
+    parser.add_argument("folder", help="folder to write the workbooks to.")
+    parser.add_argument(
+        "--scale", type=int, default=1, help="size factor (1, 10, 100)."
+    )
+    parser.add_argument("--seed", type=int, default=0, help="random seed.")
+    args = parser.parse_args()
+
+    for xls_file in make_workbooks(args.folder, args.scale, args.seed):
+        print(f"Wrote {xls_file} ({os.path.getsize(xls_file) / 1024:.0f} kB)")
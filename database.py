@@ -1,11 +1,24 @@
-from xlsx2html import xlsx2html
-from bs4 import BeautifulSoup
-import json
-from pythumb import Thumbnail
-import subprocess
-from magic import *
 import os
-import yaml
+from profiling import profiled, stage
+from json_writer import write_database
+from database_shards import write_database_shards
+from thumbnails import get_thumbnail_registry, prefetch_thumbnails
+from database_diff import (
+    read_database_albums,
+    diff_databases,
+    write_database_delta,
+    print_database_diff,
+    get_delta_path,
+)
+
+# Output folder and files of the website database, set by the local config module. The defaults
+# are used without it (e.g. benchmarks, fresh clones).
+try:
+    from magic import folder, database_fr, database_en
+except ImportError:
+    folder = "data"
+    database_fr = f"{folder}/newdatabase.json"
+    database_en = f"{folder}/EN_newdatabase.json"
 
 num_to_months = {
     1: "Janvier",
@@ -146,18 +159,27 @@ def get_date_short(htmlID):
     return date
 
 
-def output_newdatabase_JSON(df, EN=False):
+@profiled
+def get_albums(df, EN=False, thumbnails=None, resolver=None):
     """
-    Generates a JSON representation of the song database and writes it to a file.
+    Builds the album of each stream of the DataFrame, fetching the missing thumbnails.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
-    EN (bool): A flag to determine if the JSON file should be in English.
+    EN (bool): A flag to determine if the albums should be in English.
                If False, uses French.
+    thumbnails (thumbnails.ThumbnailRegistry): The picture links of the streams, updated with the
+                                               fetched ones. If None, uses the registry of data/thumbnails.json.
+    resolver (thumbnails.ThumbnailResolver): The resolver of the missing thumbnails, see
+                                             `thumbnails.prefetch_thumbnails`. Default is None (network).
 
-    Writes:
-    JSON content to a file named 'newdatabase.json' or 'EN_newdatabase.json' based on the language flag.
+    Returns:
+    list: The albums in DataFrame order, as dicts with a "date_DT" key to sort them, see `write_newdatabase_JSON`.
     """
+    if thumbnails is None:
+        thumbnails = get_thumbnail_registry()
+    # Resolve the missing thumbnails first, concurrently
+    prefetch_thumbnails(df, thumbnails, resolver)
 
     albums = []
     current_live = {"title": None}
@@ -178,37 +200,13 @@ def output_newdatabase_JSON(df, EN=False):
                 "date_short": get_date_short(song.htmlID),
                 "when_ranked": get_date_verbose(song.when_ranked_DT, EN),
                 "comment": song.live_comment,
-                "picture_link": None,
+                # None if the thumbnail could not be fetched, it is fetched again on the next build
+                "picture_link": (
+                    thumbnails[song.htmlID] if song.htmlID in thumbnails else None
+                ),
                 "songs": [],
             }
 
-            # If the thumbnail is not in data/thumbnails.yaml, update the htmlID : picture_link in the file
-            with open("data/thumbnails.yaml", "r") as f:
-                thumbnails = yaml.safe_load(f)
-
-            if song.htmlID not in thumbnails:
-                if "twitch" in song.URL:
-                    current_live["picture_link"] = subprocess.run(
-                        [
-                            "youtube-dl",
-                            "--get-thumbnail",
-                            song.URL,
-                        ],
-                        check=True,
-                        capture_output=True,
-                        text=True,
-                    ).stdout
-                else:
-                    current_live["picture_link"] = Thumbnail(
-                        f"https://www.youtube.com/watch?v={get_live_code(song.URL)}"
-                    ).fetch(url=True)
-
-                thumbnails[song.htmlID] = current_live["picture_link"]
-                with open("data/thumbnails.yaml", "w") as f:
-                    yaml.dump(thumbnails, f)
-
-            current_live["picture_link"] = thumbnails[song.htmlID]
-
         current_live["songs"].append(
             {
                 "name": song.name,
@@ -225,41 +223,106 @@ def output_newdatabase_JSON(df, EN=False):
     if current_live is not None:
         albums.append(current_live)
 
+    return albums
+
+
+@profiled
+def write_newdatabase_JSON(albums, EN=False, compact=False, shards=None):
+    """
+    Writes albums built by `get_albums` to the database file, most recent first.
+
+    Every album is held in memory: they are sorted by date, and the shards and the delta read them
+    all. Only their encoding is streamed to the files, see `json_writer.DatabaseWriter`.
+
+    Parameters:
+    albums (list): The albums, left unchanged.
+    EN (bool): A flag to determine if the JSON file should be in English.
+               If False, uses French.
+    compact (bool): A flag to write compact JSON rather than indented. Default is False.
+    shards (str): "album" or "year" to also write the albums as shards with a manifest, see
+                  `database_shards.write_database_shards`. Default is None (no shards).
+
+    Writes:
+    JSON content to a file named 'newdatabase.json' or 'EN_newdatabase.json' based on the language flag,
+    with its .gz/.br precompressed copies (see `json_writer.write_database`), and the delta from the
+    previous build next to it, see `database_diff.write_database_delta`.
+    """
     # Sort albums by date
     albums = sorted(albums, key=lambda x: x["date_DT"])
 
     # remove date_DT
-    for album in albums:
-        del album["date_DT"]
+    albums = [
+        {key: value for key, value in album.items() if key != "date_DT"}
+        for album in albums
+    ]
 
     albums.reverse()
 
-    data = {"albums": albums}
+    # Keep the previous build to report and publish what changed
+    database_path = database_en if EN else database_fr
+    old_albums = read_database_albums(database_path)
 
     # Write the generated JSON content to the database file
     os.makedirs(folder, exist_ok=True)
-    if EN:
-        with open(database_en, "w") as f:
-            json.dump(data, f, indent=4)
-        print(f"Database saved to {database_en}")
-    else:
-        with open(database_fr, "w") as f:
-            json.dump(data, f, indent=4)
-        print(f"Database saved to {database_fr}")
+    with stage("database.json_write", "io"):
+        write_database(albums, database_path, compact=compact)
+        if shards is not None:
+            write_database_shards(albums, database_path, by=shards)
 
+    if old_albums is not None:
+        diff = diff_databases(old_albums, albums)
+        if diff["from"] != diff["to"]:
+            write_database_delta(diff, albums, get_delta_path(database_path))
+        print_database_diff(diff)
 
-def get_HOF_info(songsName, df):
-    HOF_info = []
 
-    for songName in songsName:
-        found = False
-        print(f"Searching for {songName}")
-        for n_song, song in enumerate(df.itertuples()):
-            if song.name == songName:
-                HOF_info.append((song.htmlID, song.name))
-                found = True
-        if not found:
-            HOF_info.append(f"{songName} not found in the database")
+@profiled
+def output_newdatabase_JSON(df, EN=False, resolver=None, compact=False, shards=None):
+    """
+    Generates a JSON representation of the song database and writes it to a file.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+    EN (bool): A flag to determine if the JSON file should be in English.
+               If False, uses French.
+    resolver (thumbnails.ThumbnailResolver): The resolver of the missing thumbnails. Default is None (network).
+    compact (bool): A flag to write compact JSON rather than indented. Default is False.
+    shards (str): "album" or "year" to also write the albums as shards. Default is None (no shards).
+
+    Writes:
+    JSON content to a file named 'newdatabase.json' or 'EN_newdatabase.json' based on the language flag.
+    """
+    write_newdatabase_JSON(get_albums(df, EN, resolver=resolver), EN, compact, shards)
+
+
+@profiled
+def get_HOF_info(songsName, df, name_index=None):
+    """
+    Finds the streams of the Hall-of-Fame songs, suggesting close names for the songs not found.
+
+    Parameters:
+    songsName (list): The names of the Hall-of-Fame songs.
+    df (pd.DataFrame): The DataFrame containing song data.
+    name_index (SongNameIndex): The name index of `df`, built if None. Default is None.
+
+    Returns:
+    list: The (htmlID, name) pairs of every song found, and a message for each name not found.
+    """
+    from song_index import SongNameIndex
+
+    if name_index is None:
+        name_index = SongNameIndex(df)
+
+    HOF_info = []
+    for result in name_index.lookup(songsName):
+        if result["matches"]:
+            HOF_info.extend(result["matches"])
+        else:
+            message = f"{result['name']} not found in the database"
+            if result["suggestions"]:
+                suggestions = ", ".join(name for name, _ in result["suggestions"])
+                message += f" (did you mean: {suggestions}?)"
+            HOF_info.append(message)
     for info in HOF_info:
         print(info)
     return HOF_info
@@ -292,6 +355,7 @@ def get_ranked_date_prompt(date_DT, EN=False):
     return f"{prompt} {num_to_months_used[date_DT.month]} {date_DT.year}"
 
 
+@profiled
 def output_html(df, EN=False):
     """
     Generates HTML content for different media types and writes it to text files.
@@ -304,12 +368,16 @@ def output_html(df, EN=False):
     Writes:
     HTML content to text files for each media type and a parallax configuration file.
     """
+    from song_index import SongIndex
+
     # Sort the DataFrame by date and remove duplicates based on htmlID
     df = df.sort_values("date_DT", ascending=False).drop_duplicates(["htmlID"])
 
     parallax_line = ""
     parallax_bg_lines = ""
 
+    song_index = SongIndex(df, columns=["media"])
+
     # Iterate through each media type and generate HTML content
     for media, media_folder in [("YouTube", "yt"), ("Live", "live"), ("Twitch", "tw")]:
         media_suffix = "EN_" if EN else ""
@@ -319,7 +387,7 @@ def output_html(df, EN=False):
             f.close()
 
         # Filter the DataFrame for the current media type
-        df_media = df.query(f"media=='{media}'")
+        df_media = song_index.get("media", media)
 
         live_div = ""
         # Generate HTML content for each live entry
@@ -348,6 +416,7 @@ def output_html(df, EN=False):
         f.write(parallax_bg_lines)
 
 
+@profiled
 def output_database_JSON(df, EN=False):
     """
     Generates a JSON representation of the song database and writes it to a file.
@@ -456,18 +525,29 @@ def get_css_color(css_color, rank=False):
     return style_div
 
 
-def make_html_tables(df, EN=False):
+@profiled
+def make_html_tables(df, EN=False, htmlIDs_to_update=None):
     """
     Generates HTML tables from an Excel file and writes them to files.
 
+    The tables are cut from the .xlsx export of each workbook, whose stream blocks are matched to the
+    streams of the DataFrame by title. Only the medias of the DataFrame are made.
+
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
     EN (bool): A flag to determine if the content should be in English.
                If False, uses the default language.
+    htmlIDs_to_update (set): The htmlIDs of the streams whose table is regenerated.
+                             If None, regenerates every table. Default is None.
 
     Writes:
     HTML tables to files for each media type.
     """
+    from xlsx2html import xlsx2html
+    from bs4 import BeautifulSoup
+    from utils import get_block_index
+    from song_index import SongIndex
+
     # Determine the sheet and table folder based on the language flag
     if EN:
         sheet = "Sheet2"
@@ -477,34 +557,53 @@ def make_html_tables(df, EN=False):
         table_folder = "tables"
 
     medias = [("YouTube", "yt"), ("Twitch", "tw"), ("Live", "live")]
+    song_index = SongIndex(df, columns=["media"])
 
     # Iterate through each media type and generate HTML tables
     for media, media_folder in medias:
-        df_media = df.query(f"media=='{media}'")
-        df_media = (
-            df_media[["htmlID", "live_title"]]
-            .groupby("htmlID", sort=False)
-            .size()
-            .reset_index()
-            .rename(columns={0: "nSongs"})
-        )
+        df_media = song_index.get("media", media)
+        if df_media.empty:
+            # Workbook not loaded (e.g. --only)
+            continue
+        xlsx_file = f"marc_{media_folder}.xlsx"
+        if not os.path.exists(xlsx_file):
+            print(f"{xlsx_file} not found, {media} tables not made")
+            continue
         print(f"Making {media}")
-        row_start = 4
+
+        # The n-th stream of a title is the n-th block of that title in the sheet, both being in sheet
+        # order. The .xlsx export can lag behind the workbook, so streams without a block are skipped.
+        title_blocks = {}
+        for block in get_block_index(xlsx_file, EN=EN):
+            title_blocks.setdefault(block["title"], []).append(block)
+        streams = df_media[["htmlID", "live_title"]].astype(object).drop_duplicates()
+        stream_blocks = []
+        for live_title, group in streams.groupby("live_title", sort=False):
+            blocks = title_blocks.get(live_title, [])
+            if len(blocks) != len(group):
+                print(
+                    f"{xlsx_file} ({sheet}) holds {len(blocks)} stream(s) {live_title}, "
+                    f"the DataFrame {len(group)}: their tables are not made"
+                )
+                continue
+            stream_blocks.extend(zip(group["htmlID"], blocks))
+        stream_blocks.sort(key=lambda stream_block: stream_block[1]["first_row"])
 
         # Generate HTML table for each live entry
-        for live in df_media.itertuples():
-            print(live.htmlID)
-            row_end = row_start + live.nSongs - 1
+        for htmlID, block in stream_blocks:
+            if htmlIDs_to_update is not None and htmlID not in htmlIDs_to_update:
+                continue
+            print(htmlID)
+            # xlsx2html rows are 0-based
             xlsx2html(
-                f"marc_{media_folder}.xlsx",
-                f"data/{table_folder}/{media_folder}/{live.htmlID}.htm",
-                row_range=(row_start, row_end),
+                xlsx_file,
+                f"data/{table_folder}/{media_folder}/{htmlID}.htm",
+                row_range=(block["first_row"] - 1, block["last_row"] - 1),
                 sheet=sheet,
             )
-            row_start = row_end + 2
 
             # Read the generated HTML content from the file
-            with open(f"data/{table_folder}/{media_folder}/{live.htmlID}.htm") as fp:
+            with open(f"data/{table_folder}/{media_folder}/{htmlID}.htm") as fp:
                 soup = BeautifulSoup(fp, "html.parser")
             td_elements = soup.find_all("td")
             css_colors = []
@@ -535,7 +634,7 @@ def make_html_tables(df, EN=False):
 
             # Write the updated HTML content to the file
             updated_html = str(soup)
-            file_path = f"data/{table_folder}/{media_folder}/{live.htmlID}.htm"
+            file_path = f"data/{table_folder}/{media_folder}/{htmlID}.htm"
 
             with open(file_path, "w") as file:
                 file.write(updated_html)
@@ -544,6 +643,7 @@ def make_html_tables(df, EN=False):
 ### DEPRECATED: old and fastidious way to generate the database
 
 
+@profiled
 def output_database(df, EN=False):
     """
     Generates JavaScript code to create Song objects and writes it to a text file.
@@ -574,38 +674,3 @@ def output_database(df, EN=False):
             songIDs += f"{song.songID}, "
         songIDs = songIDs[:-2]
         f.write(f"\t\t\tvar songList = [{songIDs}];")
-
-    # Print streams added if not in English
-    if not EN:
-        print_streams_added(df, songIDs)
-
-
-def print_streams_added(df, songIDs):
-    """
-    Prints the number of new live streams added since the last update.
-
-    Parameters:
-    df (pd.DataFrame): The DataFrame containing song data.
-    songIDs (str): A comma-separated string of song IDs.
-
-    Prints:
-    The number of new live streams added and their titles.
-    """
-    # Read the old list of song IDs from the file
-    with open(f"oldList.txt", "r") as f:
-        old_songIDs = f.readline().split(", ")
-
-    # Split the new song IDs into a list
-    songIDs = songIDs.split(", ")
-
-    live_added = []
-
-    # Determine the new song IDs that were added
-    for songID in list(set(songIDs) - set(old_songIDs)):
-        live_title = df.query(f"songID=='{songID}'").iloc[-1]["live_title"]
-        if live_title not in live_added:
-            live_added.append(live_title)
-
-    # Print the number of new live streams added and their titles
-    print(f"{len(live_added)} live added since last time: {live_added}")
-    print("\n(Don't forget to update oldList!)\n")
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+from profiling import profiled
+
+delta_version = 1
+
+# Fields of an album compared as its metadata, the songs being compared one by one
+album_fields = ["title", "date", "date_short", "when_ranked", "comment", "picture_link"]
+
+
+def get_content_hash(value):
+    """
+    Returns the content hash of a JSON value (an album, a song), independent of the key order.
+
+    Parameters:
+    value: The JSON value.
+
+    Returns:
+    str: A 16-character hex digest.
+    """
+    content = json.dumps(value, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha1(content.encode()).hexdigest()[:16]
+
+
+def get_delta_path(database_path):
+    """
+    Returns the path of the delta file stored next to a database file.
+
+    Parameters:
+    database_path (str): The path of the database file (e.g. data/newdatabase.json).
+
+    Returns:
+    str: The path of the delta file (e.g. data/newdatabase.delta.json).
+    """
+    root, _ = os.path.splitext(database_path)
+    return f"{root}.delta.json"
+
+
+def read_database_albums(path):
+    """
+    Reads the albums of a database file.
+
+    Parameters:
+    path (str): The path of the database file.
+
+    Returns:
+    list: The albums, or None if the file is missing or unreadable.
+    """
+    try:
+        with open(path, "r") as f:
+            return json.load(f)["albums"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        return None
+
+
+def get_song_keys(album):
+    """
+    Returns the key of each song of an album: its URL, the timestamp identifying the song in the stream,
+    suffixed with "#n" for the n-th repeat of the same URL.
+    """
+    counts = {}
+    keys = []
+    for song in album["songs"]:
+        n = counts.get(song["url"], 0)
+        counts[song["url"]] = n + 1
+        keys.append(f"{song['url']}#{n}" if n else song["url"])
+    return keys
+
+
+def is_same_value(old_value, new_value):
+    """
+    Compares two JSON values, NaN (a missing comment, choral...) being equal to NaN.
+    """
+    return old_value == new_value or (old_value != old_value and new_value != new_value)
+
+
+def get_changed_fields(old, new, fields):
+    return [
+        field for field in fields if not is_same_value(old.get(field), new.get(field))
+    ]
+
+
+def get_song_change(album, song):
+    return {"album": album["id"], "name": song["name"], "url": song["url"]}
+
+
+def diff_album(old_album, new_album, diff):
+    """
+    Adds the song changes between two versions of an album to `diff`.
+    """
+    old_songs = dict(zip(get_song_keys(old_album), old_album["songs"]))
+    for key, song in zip(get_song_keys(new_album), new_album["songs"]):
+        old_song = old_songs.pop(key, None)
+        if old_song is None:
+            diff["songs"]["added"].append(get_song_change(new_album, song))
+            continue
+        fields = get_changed_fields(old_song, song, sorted(set(old_song) | set(song)))
+        if "rank" in fields:
+            diff["songs"]["reranked"].append(
+                {
+                    **get_song_change(new_album, song),
+                    "old_rank": old_song.get("rank"),
+                    "rank": song.get("rank"),
+                }
+            )
+            fields.remove("rank")
+        if fields:
+            diff["songs"]["edited"].append(
+                {**get_song_change(new_album, song), "fields": fields}
+            )
+    for song in old_songs.values():
+        diff["songs"]["removed"].append(get_song_change(old_album, song))
+
+
+@profiled
+def diff_databases(old_albums, new_albums):
+    """
+    Compares two builds of the database, album by album then song by song.
+
+    The albums are matched by id and compared by content hash, so only the changed albums are compared
+    song by song, and the songs are matched by URL: the cost is linear in the number of songs.
+
+    Parameters:
+    old_albums (list): The albums of the previous build.
+    new_albums (list): The albums of the new build.
+
+    Returns:
+    dict: The "streams" {"added", "removed", "edited"} and the "songs" {"added", "removed", "reranked",
+          "edited"} changes, the "from" and "to" hashes of the builds, and "reordered", a flag telling
+          whether streams were added or moved.
+    """
+    old_hashes = {album["id"]: get_content_hash(album) for album in old_albums}
+    new_hashes = {album["id"]: get_content_hash(album) for album in new_albums}
+    old_by_id = {album["id"]: album for album in old_albums}
+    diff = {
+        "streams": {"added": [], "removed": [], "edited": []},
+        "songs": {"added": [], "removed": [], "reranked": [], "edited": []},
+    }
+
+    for album in new_albums:
+        old_album = old_by_id.pop(album["id"], None)
+        if old_album is None:
+            diff["streams"]["added"].append(
+                {"id": album["id"], "title": album["title"]}
+            )
+            for song in album["songs"]:
+                diff["songs"]["added"].append(get_song_change(album, song))
+        elif old_hashes[album["id"]] != new_hashes[album["id"]]:
+            diff["streams"]["edited"].append(
+                {
+                    "id": album["id"],
+                    "title": album["title"],
+                    "fields": get_changed_fields(old_album, album, album_fields),
+                }
+            )
+            diff_album(old_album, album, diff)
+
+    for album in old_by_id.values():
+        diff["streams"]["removed"].append({"id": album["id"], "title": album["title"]})
+        for song in album["songs"]:
+            diff["songs"]["removed"].append(get_song_change(album, song))
+
+    diff["from"] = get_content_hash(list(old_hashes.items()))
+    diff["to"] = get_content_hash(list(new_hashes.items()))
+    diff["reordered"] = bool(diff["streams"]["added"]) or [
+        album["id"] for album in old_albums if album["id"] in new_hashes
+    ] != [album["id"] for album in new_albums if album["id"] in old_hashes]
+    return diff
+
+
+@profiled
+def write_database_delta(diff, new_albums, path):
+    """
+    Writes the delta turning the previous build of the database into the new one, in compact JSON.
+
+    A client holding the build `diff["from"]` removes the "remove" albums, replaces or inserts the
+    "upsert" albums and, if given, reorders the albums along "order" to get the build `diff["to"]`.
+    The "changes" list what changed, for a "what changed" feed.
+
+    Parameters:
+    diff (dict): The changes, see `diff_databases`.
+    new_albums (list): The albums of the new build.
+    path (str): The path of the delta file, see `get_delta_path`.
+    """
+    changed = {
+        stream["id"] for stream in diff["streams"]["added"] + diff["streams"]["edited"]
+    }
+    delta = {
+        "version": delta_version,
+        "from": diff["from"],
+        "to": diff["to"],
+        "remove": [stream["id"] for stream in diff["streams"]["removed"]],
+        "upsert": [album for album in new_albums if album["id"] in changed],
+        "changes": {"streams": diff["streams"], "songs": diff["songs"]},
+    }
+    # The order is only sent when albums were added or moved
+    if diff["reordered"]:
+        delta["order"] = [album["id"] for album in new_albums]
+    with open(path + ".tmp", "w") as f:
+        json.dump(delta, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+    print(f"Delta saved to {path} ({os.path.getsize(path) / 1024:.0f} kB)")
+
+
+def print_database_diff(diff):
+    """
+    Prints the number of streams and songs added, removed, re-ranked and edited, and the streams added.
+    """
+    streams, songs = diff["streams"], diff["songs"]
+    print(
+        f"Streams: {len(streams['added'])} added, {len(streams['removed'])} removed, "
+        f"{len(streams['edited'])} edited"
+    )
+    print(
+        f"Songs: {len(songs['added'])} added, {len(songs['removed'])} removed, "
+        f"{len(songs['reranked'])} re-ranked, {len(songs['edited'])} edited"
+    )
+    if streams["added"]:
+        print(
+            f"{len(streams['added'])} live added since last time: "
+            f"{[stream['title'] for stream in streams['added']]}"
+        )
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import time
+import hashlib
+from profiling import profiled
+
+manifest_version = 1
+
+# Time (seconds) a shard stays on disk once no longer listed, so that the clients still holding the
+# previous manifest can fetch it
+shard_grace_period = 24 * 3600
+
+# Ways of grouping the albums into shards: the key of the shard of an album
+shard_keys = {
+    "album": lambda album: album["id"],
+    # date_short is the "YYYY-MM-DD" date of the stream
+    "year": lambda album: album["date_short"][:4],
+}
+
+
+def get_shards_paths(database_path):
+    """
+    Returns the paths of the shards folder and of the manifest stored next to a database file.
+
+    Parameters:
+    database_path (str): The path of the database file (e.g. data/newdatabase.json).
+
+    Returns:
+    tuple: The shards folder (e.g. data/newdatabase.shards) and the manifest
+           (e.g. data/newdatabase.manifest.json).
+    """
+    root, _ = os.path.splitext(database_path)
+    return f"{root}.shards", f"{root}.manifest.json"
+
+
+def get_album_summary(album):
+    return {
+        "id": album["id"],
+        "title": album["title"],
+        "date": album["date"],
+        "n_songs": len(album["songs"]),
+    }
+
+
+@profiled
+def write_database_shards(
+    albums, database_path, by="album", grace_period=shard_grace_period
+):
+    """
+    Writes the albums as shards, named after the hash of their content, and their manifest.
+
+    A shard is the compact JSON {"albums": [...]} of one album or of the albums of one year. As its
+    file name is its content hash, a shard file never changes and can be cached forever, and an unchanged
+    shard keeps its file name between builds: it is not written again. The manifest, written last, lists
+    the shards in database order with the id, title, date and number of songs of their albums.
+
+    The mtime of a shard is the last time it was listed. The shards no longer listed are only removed
+    once `grace_period` has passed, as clients may still hold a previous manifest.
+
+    Parameters:
+    albums (list): The albums, in database order (most recent first), without their "date_DT" key.
+    database_path (str): The path of the database file, see `get_shards_paths`.
+    by (str): "album" for a shard per album, "year" for a shard per year. Default is "album".
+    grace_period (float): The time (seconds) an unlisted shard is kept. Default is one day.
+
+    Returns:
+    dict: The manifest.
+    """
+    shards_dir, manifest_path = get_shards_paths(database_path)
+    os.makedirs(shards_dir, exist_ok=True)
+
+    # Albums of each shard, in order of first album
+    grouped = {}
+    for album in albums:
+        grouped.setdefault(shard_keys[by](album), []).append(album)
+
+    shards = []
+    n_written = 0
+    for key, shard_albums in grouped.items():
+        content = json.dumps(
+            {"albums": shard_albums}, ensure_ascii=False, separators=(",", ":")
+        ).encode()
+        content_hash = hashlib.sha256(content).hexdigest()[:20]
+        file = f"{content_hash}.json"
+        path = f"{shards_dir}/{file}"
+        if not os.path.exists(path):
+            with open(path + ".tmp", "wb") as f:
+                f.write(content)
+            os.replace(path + ".tmp", path)
+            n_written += 1
+        else:
+            os.utime(path)
+        shards.append(
+            {
+                "key": key,
+                "file": f"{os.path.basename(shards_dir)}/{file}",
+                "hash": content_hash,
+                "size": len(content),
+                "albums": [get_album_summary(album) for album in shard_albums],
+            }
+        )
+
+    manifest = {"version": manifest_version, "by": by, "shards": shards}
+    with open(manifest_path + ".tmp", "w") as f:
+        json.dump(manifest, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(manifest_path + ".tmp", manifest_path)
+
+    listed = {f"{shard['hash']}.json" for shard in shards}
+    n_kept = n_removed = 0
+    for file in os.listdir(shards_dir):
+        if file.endswith(".json") and file not in listed:
+            path = f"{shards_dir}/{file}"
+            if time.time() - os.path.getmtime(path) < grace_period:
+                n_kept += 1
+            else:
+                os.remove(path)
+                n_removed += 1
+
+    print(
+        f"Manifest saved to {manifest_path} ({len(shards)} shards by {by}: "
+        f"{n_written} written, {len(shards) - n_written} unchanged, "
+        f"{n_kept} unlisted kept, {n_removed} removed)"
+    )
+    return manifest
@@ -0,0 +1,401 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import json
+import hashlib
+import numpy as np
+import pandas as pd
+from utils import get_dfs_from_xls, get_unique_IDs, compact_songs_df
+from rollup import Rollup, build_rollup
+from profiling import profiled
+
+cache_dir = ".cache/datasets"
+cache_max_size = 256 * 1024 * 1024  # bytes
+
+cache_magic = b"MARCDS2\n"
+cache_align = 64
+
+
+def get_file_hash(xls_file, fingerprints):
+    """
+    Returns the content hash of a file, re-hashing it only if its size or mtime changed.
+
+    Parameters:
+    xls_file (str): The path to the file.
+    fingerprints (dict): The known {path: [size, mtime_ns, hash]} fingerprints, updated in place.
+
+    Returns:
+    str: The SHA-256 hex digest of the file content.
+    """
+    stat = os.stat(xls_file)
+    path = os.path.abspath(xls_file)
+    known = fingerprints.get(path)
+    if known is not None and known[:2] == [stat.st_size, stat.st_mtime_ns]:
+        return known[2]
+
+    sha = hashlib.sha256()
+    with open(xls_file, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    fingerprints[path] = [stat.st_size, stat.st_mtime_ns, sha.hexdigest()]
+    return fingerprints[path][2]
+
+
+def get_dataset_key(xls_files, EN=False, folder=cache_dir):
+    """
+    Computes the cache key of a dataset from the fingerprints of its workbooks and the sheet.
+
+    Parameters:
+    xls_files (list): The paths to the Excel files, in concatenation order.
+    EN (bool): A flag to determine which sheet is read (Sheet2 if True, Sheet1 otherwise).
+    folder (str): The cache folder holding the fingerprints file.
+
+    Returns:
+    str: The cache key.
+    """
+    fingerprints_file = f"{folder}/fingerprints.json"
+    try:
+        with open(fingerprints_file, "r") as f:
+            fingerprints = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        fingerprints = {}
+    known = {path: list(fingerprint) for path, fingerprint in fingerprints.items()}
+
+    parts = [cache_magic.decode().strip(), "Sheet2" if EN else "Sheet1"]
+    for xls_file in xls_files:
+        stat = os.stat(xls_file)
+        parts.append(
+            f"{os.path.basename(xls_file)}:{stat.st_size}:{stat.st_mtime_ns}:"
+            f"{get_file_hash(xls_file, fingerprints)}"
+        )
+
+    # Only written when a workbook was re-hashed
+    if fingerprints != known:
+        os.makedirs(folder, exist_ok=True)
+        with open(fingerprints_file + ".tmp", "w") as f:
+            json.dump(fingerprints, f)
+        os.replace(fingerprints_file + ".tmp", fingerprints_file)
+
+    return hashlib.sha256("|".join(parts).encode()).hexdigest()[:32]
+
+
+@profiled
+def write_columnar(df, path):
+    """
+    Writes a DataFrame to a single memory-mappable columnar file.
+
+    Fixed-width columns (numbers, datetimes, timedeltas) are stored as raw aligned buffers,
+    categorical and text columns as int32 codes with their values kept in the header.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame to write.
+    path (str): The path of the file to write.
+    """
+    columns = []
+    buffers = []
+    offset = 0
+    for name in df.columns:
+        values = df[name].to_numpy()
+        column = {"name": name}
+        if isinstance(df[name].dtype, pd.CategoricalDtype):
+            column["categories"] = df[name].cat.categories.tolist()
+            column["categories_nan"] = []
+            column["categorical"] = True
+            buffer = df[name].cat.codes.to_numpy().astype(np.int32)
+        elif values.dtype == object:
+            categories = {}
+            codes = np.empty(len(values), dtype=np.int32)
+            for i, value in enumerate(values):
+                # NaN != NaN, so all the NaN values share the (type, None) key
+                key = (type(value), value) if value == value else (type(value), None)
+                codes[i] = categories.setdefault(key, len(categories))
+            column["categories"] = [value for _, value in categories]
+            column["categories_nan"] = [
+                n
+                for n, (kind, value) in enumerate(categories)
+                if value is None and kind is not type(None)
+            ]
+            buffer = codes
+        else:
+            buffer = np.ascontiguousarray(values)
+        column["dtype"] = buffer.dtype.str
+        column["offset"] = offset
+        columns.append(column)
+        buffers.append(buffer)
+        offset += -(-buffer.nbytes // cache_align) * cache_align
+
+    header = json.dumps({"n_rows": len(df), "columns": columns}).encode()
+    data_start = -(-(len(cache_magic) + 8 + len(header)) // cache_align) * cache_align
+
+    with open(path + ".tmp", "wb") as f:
+        f.write(cache_magic)
+        f.write(len(header).to_bytes(8, "little"))
+        f.write(header)
+        for column, buffer in zip(columns, buffers):
+            f.seek(data_start + column["offset"])
+            f.write(buffer.tobytes())
+        f.truncate(data_start + offset)
+    os.replace(path + ".tmp", path)
+
+
+@profiled
+def read_columnar(path):
+    """
+    Reads a file written by `write_columnar`, memory-mapping the column buffers.
+
+    Fixed-width columns and the codes of categorical columns are used in place, without copy. Text
+    columns are decoded from their codes into Python strings, one array per column.
+
+    Parameters:
+    path (str): The path of the file to read.
+
+    Returns:
+    pd.DataFrame: The stored DataFrame.
+    """
+    with open(path, "rb") as f:
+        if f.read(len(cache_magic)) != cache_magic:
+            raise ValueError(f"{path} is not a dataset cache file")
+        header_length = int.from_bytes(f.read(8), "little")
+        header = json.loads(f.read(header_length))
+    data_start = -(-(len(cache_magic) + 8 + header_length) // cache_align) * cache_align
+
+    n_rows = header["n_rows"]
+    data = {}
+    for column in header["columns"]:
+        if n_rows == 0:
+            buffer = np.empty(0, dtype=column["dtype"])
+        else:
+            buffer = np.memmap(
+                path,
+                dtype=column["dtype"],
+                mode="r",
+                offset=data_start + column["offset"],
+                shape=(n_rows,),
+            )
+        if column.get("categorical"):
+            buffer = pd.Categorical.from_codes(buffer, column["categories"])
+        elif "categories" in column:
+            categories = np.empty(len(column["categories"]), dtype=object)
+            categories[:] = column["categories"]
+            categories[column["categories_nan"]] = np.nan
+            buffer = categories[buffer]
+        data[column["name"]] = buffer
+    return pd.DataFrame(data)
+
+
+def get_rollup_paths(dataset_path, songs="all"):
+    """
+    Returns the paths of the rollup files stored next to a cached dataset.
+
+    Parameters:
+    dataset_path (str): The path of the cached dataset.
+    songs (str): "all" for the rollup of every song, "plotted" for the rollup of the plotted songs
+                 (see `plotting.get_plotted_songs`). Default is "all".
+
+    Returns:
+    tuple: The paths of the cube and of the stream totals.
+    """
+    root, _ = os.path.splitext(dataset_path)
+    if songs != "all":
+        root = f"{root}.{songs}"
+    return f"{root}.cube.marcds", f"{root}.streams.marcds"
+
+
+def write_rollup(rollup, dataset_path, songs="all"):
+    """
+    Writes the rollup of a cached dataset next to it, see `rollup.build_rollup`.
+
+    Parameters:
+    rollup (rollup.Rollup): The rollup to write.
+    dataset_path (str): The path of the cached dataset.
+    songs (str): The songs of the rollup, see `get_rollup_paths`. Default is "all".
+    """
+    cube_path, streams_path = get_rollup_paths(dataset_path, songs)
+    write_columnar(rollup.cube, cube_path)
+    write_columnar(rollup.streams, streams_path)
+
+
+def read_rollup(dataset_path, songs="all"):
+    """
+    Reads the rollup stored next to a cached dataset.
+
+    Parameters:
+    dataset_path (str): The path of the cached dataset.
+    songs (str): The songs of the rollup, see `get_rollup_paths`. Default is "all".
+
+    Returns:
+    rollup.Rollup: The stored rollup, or None if it is not in the cache.
+    """
+    cube_path, streams_path = get_rollup_paths(dataset_path, songs)
+    if not (os.path.exists(cube_path) and os.path.exists(streams_path)):
+        return None
+    os.utime(cube_path)
+    os.utime(streams_path)
+    return Rollup(cube=read_columnar(cube_path), streams=read_columnar(streams_path))
+
+
+def evict_datasets(folder=cache_dir, max_size=cache_max_size, keep=None):
+    """
+    Removes the least recently used cached datasets until the cache fits in `max_size` bytes.
+
+    A dataset is evicted together with its rollups: the files of a cache key are one entry, used
+    as recently as the most recently used of them.
+
+    Parameters:
+    folder (str): The cache folder.
+    max_size (int): The maximum total size of the cached datasets, in bytes.
+    keep (str): The path of a cached dataset that must not be evicted, rollups included.
+                Default is None.
+    """
+    if not os.path.isdir(folder):
+        return
+    # {key: [last access, size, files]}, the files of a key being {key}[.*].marcds
+    entries = {}
+    for file in os.listdir(folder):
+        if file.endswith(".marcds"):
+            stat = os.stat(f"{folder}/{file}")
+            entry = entries.setdefault(file.split(".")[0], [0, 0, []])
+            entry[0] = max(entry[0], stat.st_atime)
+            entry[1] += stat.st_size
+            entry[2].append(f"{folder}/{file}")
+    keep_key = None if keep is None else os.path.basename(keep).split(".")[0]
+    total_size = sum(size for _, size, _ in entries.values())
+    for key, (_, size, paths) in sorted(entries.items(), key=lambda item: item[1][0]):
+        if total_size <= max_size:
+            break
+        if key == keep_key:
+            continue
+        for path in paths:
+            os.remove(path)
+        total_size -= size
+        print(f"Evicted {key} ({len(paths)} files) from the dataset cache")
+
+
+def clear_dataset_cache(folder=cache_dir):
+    """
+    Invalidates every cached dataset and the stored workbook fingerprints.
+
+    Parameters:
+    folder (str): The cache folder.
+    """
+    if not os.path.isdir(folder):
+        return
+    for file in os.listdir(folder):
+        if file.endswith(".marcds") or file == "fingerprints.json":
+            os.remove(f"{folder}/{file}")
+    print(f"Dataset cache {folder} cleared")
+
+
+@profiled
+def get_datasets(
+    xls_files,
+    sheets=(False, True),
+    use_cache=True,
+    processes=None,
+    folder=cache_dir,
+    max_size=cache_max_size,
+):
+    """
+    Returns the song datasets of the given workbooks for several sheets, with unique songIDs and htmlIDs.
+
+    Each finished DataFrame is cached on disk, keyed by the size, mtime and content hash of every
+    workbook and by the sheet, so unchanged workbooks are never parsed twice. The (workbook, sheet)
+    pairs missing from the cache are parsed in parallel. The rollup of each parsed dataset is built
+    once and cached with it, see `get_rollup`.
+
+    Parameters:
+    xls_files (list): The paths to the Excel files, in concatenation order.
+    sheets (tuple): The EN flags of the sheets to read. Default is both (False, True).
+    use_cache (bool): A flag to enable the dataset cache. Default is True.
+    processes (int): The maximum number of worker processes, see `utils.get_dfs_from_xls`.
+    folder (str): The cache folder.
+    max_size (int): The maximum total size of the cached datasets, in bytes.
+
+    Returns:
+    dict: A mapping {EN flag: pd.DataFrame} containing the song data of all the workbooks.
+    """
+    datasets = {}
+    paths = {}
+    for EN in sheets:
+        if use_cache:
+            paths[EN] = f"{folder}/{get_dataset_key(xls_files, EN, folder)}.marcds"
+            if os.path.exists(paths[EN]):
+                print(f"Loading dataset from cache {paths[EN]}")
+                os.utime(paths[EN])
+                datasets[EN] = read_columnar(paths[EN])
+
+    missing = [EN for EN in sheets if EN not in datasets]
+    if missing:
+        dfs = get_dfs_from_xls(xls_files, sheets=missing, processes=processes)
+        for EN in missing:
+            datasets[EN] = compact_songs_df(get_unique_IDs(dfs[EN]))
+            if use_cache:
+                write_columnar(datasets[EN], paths[EN])
+                write_rollup(build_rollup(datasets[EN]), paths[EN])
+                evict_datasets(folder, max_size, keep=paths[EN])
+
+    return datasets
+
+
+def get_dataset(xls_files, EN=False, **kwargs):
+    """
+    Returns the song dataset of the given workbooks for one sheet, see `get_datasets`.
+
+    Parameters:
+    xls_files (list): The paths to the Excel files, in concatenation order.
+    EN (bool): A flag to determine which sheet to read from the workbooks.
+               If False, reads from "Sheet1" (French). If True, reads from "Sheet2" (English).
+    **kwargs: Additional arguments passed to `get_datasets` (e.g. use_cache, processes).
+
+    Returns:
+    pd.DataFrame: A DataFrame containing the song data of all the workbooks.
+    """
+    return get_datasets(xls_files, sheets=(EN,), **kwargs)[EN]
+
+
+@profiled
+def get_rollup(xls_files, EN=False, df=None, songs="all", **kwargs):
+    """
+    Returns the rollup of the song dataset of the given workbooks for one sheet.
+
+    The rollup is read from the cache when stored with the dataset, and otherwise built from the
+    dataset (loaded with `get_dataset` if `df` is None) and stored with it.
+
+    Parameters:
+    xls_files (list): The paths to the Excel files, in concatenation order.
+    EN (bool): A flag to determine which sheet to read from the workbooks.
+    df (pd.DataFrame): The dataset of the workbooks, if already loaded. Default is None.
+    songs (str): "all" for the rollup of every song, "plotted" for the rollup of the songs of the
+                 plots, filtered and ordered by `plotting.get_plotted_songs`. Default is "all".
+    **kwargs: Additional arguments passed to `get_datasets` (e.g. use_cache, folder).
+
+    Returns:
+    rollup.Rollup: The cube and the per-stream totals of the dataset.
+    """
+    if songs not in ["all", "plotted"]:
+        raise ValueError("songs must be one of 'all' or 'plotted'")
+    use_cache = kwargs.get("use_cache", True)
+    folder = kwargs.get("folder", cache_dir)
+    if use_cache:
+        path = f"{folder}/{get_dataset_key(xls_files, EN, folder)}.marcds"
+        rollup = read_rollup(path, songs)
+        if rollup is not None:
+            return rollup
+
+    if df is None:
+        df = get_dataset(xls_files, EN, **kwargs)
+        if use_cache and songs == "all":
+            # Built with the dataset if it was just parsed
+            rollup = read_rollup(path)
+            if rollup is not None:
+                return rollup
+
+    if songs == "plotted":
+        from plotting import get_plotted_songs
+
+        df = get_plotted_songs(df)
+
+    rollup = build_rollup(df)
+    if use_cache:
+        write_rollup(rollup, path, songs)
+    return rollup
@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import pandas as pd
+from database import folder, tempo_txt_dict
+from profiling import profiled
+
+# Categories of the dictionary columns, in a fixed order so that their codes stay the same between
+# exports. Values missing from these lists are appended, sorted.
+export_categories = {
+    "rank": ["S", "A+", "A", "B+", "B", "C+", "C", "D", "I"],
+    "tempo": list(tempo_txt_dict),
+    "media": ["YouTube", "Twitch", "Live"],
+    "genre": [],
+    "htmlID": [],
+    "live_title": [],
+}
+
+# Exported columns and their Arrow type: "dictionary" (categorical), "string", "timestamp" or "seconds"
+# (the "length" column, the song length as integer seconds)
+export_columns = {
+    "songID": "string",
+    "htmlID": "dictionary",
+    "name": "string",
+    "rank": "dictionary",
+    "genre": "dictionary",
+    "tempo": "dictionary",
+    "length": "seconds",
+    "comment": "string",
+    "choral": "string",
+    "URL": "string",
+    "media": "dictionary",
+    "date_DT": "timestamp",
+    "when_ranked_DT": "timestamp",
+    "live_title": "dictionary",
+    "live_comment": "string",
+}
+
+
+def import_pyarrow():
+    """
+    Imports pyarrow, an optional dependency only needed by the exports.
+
+    Returns:
+    module: pyarrow.
+    """
+    try:
+        import pyarrow
+    except ImportError as error:
+        raise ImportError(
+            "The Parquet and Arrow exports need pyarrow (pip install pyarrow)"
+        ) from error
+    return pyarrow
+
+
+def get_export_paths(EN=False, export_folder=folder):
+    """
+    Returns the paths of the Parquet and Arrow IPC exports of a sheet.
+
+    Parameters:
+    EN (bool): A flag for the English sheet. Default is False (French).
+    export_folder (str): The folder of the exports. Default is the database folder.
+
+    Returns:
+    tuple: The Parquet (e.g. data/songs.parquet) and Arrow (e.g. data/songs.arrow) paths.
+    """
+    root = f"{export_folder}/{'EN_' if EN else ''}songs"
+    return f"{root}.parquet", f"{root}.arrow"
+
+
+def get_export_table(df):
+    """
+    Converts the song DataFrame to an Arrow table with the types of `export_columns`.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+
+    Returns:
+    pyarrow.Table: The table.
+    """
+    pa = import_pyarrow()
+
+    arrays = {}
+    for column, kind in export_columns.items():
+        if kind == "seconds":
+            seconds = df["length_DT"].dt.total_seconds().round().astype("Int32")
+            arrays[column] = pa.array(seconds, type=pa.int32())
+        elif kind == "timestamp":
+            arrays[column] = pa.array(
+                df[column].astype("datetime64[us]"), type=pa.timestamp("us")
+            )
+        elif kind == "dictionary":
+            values = df[column].astype(object)
+            present = {value for value in values if isinstance(value, str)}
+            categories = export_categories[column] + sorted(
+                present - set(export_categories[column])
+            )
+            arrays[column] = pa.DictionaryArray.from_pandas(
+                pd.Categorical(values, categories=categories)
+            ).cast(pa.dictionary(pa.int32(), pa.string()))
+        else:
+            values = df[column].astype(object)
+            arrays[column] = pa.array(
+                [value if isinstance(value, str) else None for value in values],
+                type=pa.string(),
+            )
+    return pa.table(arrays)
+
+
+@profiled
+def export_dataset(df, EN=False, export_folder=folder):
+    """
+    Writes the song DataFrame to Parquet and to an Arrow IPC file, with stable typed columns.
+
+    The Parquet file is compressed (zstd), for storage and transfer. The Arrow file is uncompressed,
+    so that `load_dataset_export` can memory-map it and read columns without copying them.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+    EN (bool): A flag for the English sheet, see `get_export_paths`. Default is False.
+    export_folder (str): The folder of the exports. Default is the database folder.
+
+    Returns:
+    tuple: The Parquet and Arrow paths.
+    """
+    pa = import_pyarrow()
+    import pyarrow.parquet as pq
+
+    table = get_export_table(df)
+    parquet_path, arrow_path = get_export_paths(EN, export_folder)
+    os.makedirs(export_folder, exist_ok=True)
+
+    pq.write_table(table, parquet_path + ".tmp", compression="zstd")
+    os.replace(parquet_path + ".tmp", parquet_path)
+
+    with pa.OSFile(arrow_path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(arrow_path + ".tmp", arrow_path)
+
+    print(
+        f"Dataset exported to {parquet_path} ({os.path.getsize(parquet_path) / 1024:.0f} kB) "
+        f"and {arrow_path} ({os.path.getsize(arrow_path) / 1024:.0f} kB)"
+    )
+    return parquet_path, arrow_path
+
+
+@profiled
+def load_dataset_export(path, columns=None, as_pandas=True):
+    """
+    Reads an export written by `export_dataset`, only decoding the requested columns.
+
+    An Arrow file (.arrow) is memory-mapped: its columns are read in place, without copy, and only the
+    pages of the requested columns are loaded from disk. A Parquet file only has the requested columns
+    decompressed.
+
+    Parameters:
+    path (str): The path of the .arrow or .parquet export.
+    columns (list): The columns to read. If None, reads every column.
+    as_pandas (bool): A flag to return a DataFrame (dictionary columns as categoricals). Otherwise returns
+                      the pyarrow.Table. Default is True.
+
+    Returns:
+    pd.DataFrame or pyarrow.Table: The songs.
+    """
+    pa = import_pyarrow()
+
+    if path.endswith(".arrow"):
+        # The table's buffers point into the map, which stays open as long as they are used
+        table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        if columns is not None:
+            table = table.select(columns)
+    else:
+        import pyarrow.parquet as pq
+
+        table = pq.read_table(path, columns=columns, memory_map=True)
+
+    return table.to_pandas() if as_pandas else table
@@ -2,19 +2,28 @@
 # -*- coding: utf-8 -*-
 from utils import *
 from downloading import *
+from dataset_cache import get_dataset
+from song_index import SongIndex
+from profiling import add_profile_arguments, enable_from_args
+import argparse
 
-df = get_df_from_xls("marc_tw.xlsm", "Twitch")
-df = df.append(get_df_from_xls("marc_yt.xlsm", "YouTube"), ignore_index=True)
-df = df.append(get_df_from_xls("marc_live.xlsm", "Live"), ignore_index=True)
+parser = argparse.ArgumentParser(
+    description="Download and move the songs of the streams."
+)
+add_profile_arguments(parser, "dl_songs")
+enable_from_args(parser.parse_args())
 
-df = get_unique_IDs(df)
+df = get_dataset(["marc_tw.xlsm", "marc_yt.xlsm", "marc_live.xlsm"])
+# Only parse the streams needed (IDs are then made unique among these streams only)
+# df = get_unique_IDs(get_dfs_from_xls(["marc_tw.xlsm", "marc_yt.xlsm", "marc_live.xlsm"], stream_titles=["I'm feeling it."])[False])
 
 # download_songs_from_streams(df, stream_titles=["Music Break No. 4 | Bored Certified"])
 # download_songs_from_streams(df, stream_titles=["I'm feeling it.", "HARRY MACK IS ON THE STREAM"])
 
 stream_titles = list(df.drop_duplicates("live_title")["live_title"])
+song_index = SongIndex(df)
 
 # download_songs_from_streams(df, stream_titles=stream_titles, make_playlist_rank=[["S"], ["S", "Ap"], ["S", "Ap", "A"]])
 # dl_thumbnail(df, stream_titles=stream_titles)
 # mv_thumbnail_to_icloud(df, stream_titles=stream_titles)
-mv_mp3_to_icloud(df, stream_titles=stream_titles, ranks=["A"])
+mv_mp3_to_icloud(df, stream_titles=stream_titles, ranks=["A"], song_index=song_index)
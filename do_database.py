@@ -2,8 +2,11 @@
 # -*- coding: utf-8 -*-
 from utils import *
 from database import *
-import pandas as pd
+from dataset_cache import get_datasets, get_rollup, clear_dataset_cache
+from search_index import write_search_index, get_search_index_path
+import sys
 import argparse
+from profiling import add_profile_arguments, enable_from_args
 
 parser = argparse.ArgumentParser()
 parser.add_argument(
@@ -14,22 +17,72 @@ parser.add_argument(
     help="only process the specified platform(s): yt (YouTube), tw (Twitch), live (Live). Default is all platforms.",
 )
 parser.add_argument("--en", action="store_true", help="process the English database.")
+parser.add_argument(
+    "--both",
+    action="store_true",
+    help="process both the French and the English databases in one run.",
+)
 parser.add_argument("--stats", action="store_true", help="print simple statistics.")
+parser.add_argument(
+    "--stats-json",
+    metavar="PATH",
+    help="also write the statistics to a JSON file (e.g. for the stats page).",
+)
+parser.add_argument(
+    "--compact",
+    action="store_true",
+    help="write the database as compact JSON, without indentation.",
+)
+parser.add_argument(
+    "--shards",
+    choices=["album", "year"],
+    help="also write the database as content-hashed shards, one per album or per year, with a manifest.",
+)
+parser.add_argument(
+    "--export",
+    action="store_true",
+    help="also export the songs to Parquet and Arrow IPC files (needs pyarrow).",
+)
+parser.add_argument(
+    "--no-cache", action="store_true", help="parse the workbooks without the cache."
+)
+parser.add_argument(
+    "--clear-cache", action="store_true", help="invalidate the cached datasets first."
+)
+add_profile_arguments(parser, "do_database")
 
 args = parser.parse_args()
+enable_from_args(args)
 
-df = pd.DataFrame()
-for platform in args.only:
-    df = pd.concat(
-        [df, get_df_from_xls(f"marc_{platform}.xlsm", EN=args.en)], ignore_index=True
-    )
+if args.clear_cache:
+    clear_dataset_cache()
 
-df = get_unique_IDs(df)
+sheets = (False, True) if args.both else (args.en,)
+xls_files = [f"marc_{platform}.xlsm" for platform in args.only]
+dfs = get_datasets(
+    xls_files,
+    sheets=sheets[:1] if args.stats else sheets,
+    use_cache=not args.no_cache,
+)
 
-print_simple_stats(df)
+rollup = get_rollup(
+    xls_files, EN=sheets[0], df=dfs[sheets[0]], use_cache=not args.no_cache
+)
+stats = get_song_stats(dfs[sheets[0]], rollup=rollup)
+print_simple_stats(dfs[sheets[0]], stats)
+if args.stats_json:
+    stats.to_json(args.stats_json, indent=2)
 if args.stats:
     sys.exit()
 
-output_newdatabase_JSON(df, EN=args.en)
+for EN in sheets:
+    output_newdatabase_JSON(dfs[EN], EN=EN, compact=args.compact, shards=args.shards)
+    write_search_index(
+        dfs[EN], get_search_index_path(database_en if EN else database_fr)
+    )
+    if args.export:
+        from dataset_export import export_dataset
+
+        export_dataset(dfs[EN], EN=EN)
 
-# get_HOF_info(song_names, df)
+# get_HOF_info(song_names, dfs[sheets[0]])
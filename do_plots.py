@@ -2,36 +2,36 @@
 # -*- coding: utf-8 -*-
 from utils import *
 from plotting import *
-import pandas as pd
+from dataset_cache import get_dataset, get_rollup
+from profiling import add_profile_arguments, enable_from_args
+import argparse
 
-df = get_df_from_xls("marc_tw.xlsm", "Twitch")
-df = pd.concat([df, get_df_from_xls("marc_live.xlsm", "Live")], ignore_index=True)
-df = pd.concat([df, get_df_from_xls("marc_yt.xlsm", "YouTube")], ignore_index=True)
+parser = argparse.ArgumentParser(description="Print the statistics and make the plots.")
+add_profile_arguments(parser, "do_plots")
+enable_from_args(parser.parse_args())
 
-df = get_unique_IDs(df)
+xls_files = ["marc_tw.xlsm", "marc_live.xlsm", "marc_yt.xlsm"]
+df = get_dataset(xls_files)
 
-print_simple_stats(df)
+print_simple_stats(df, get_song_stats(df, rollup=get_rollup(xls_files, df=df)))
 
-filtered_df = (
-    df[~df["songID"].str.startswith("cut")]
-    .query("rank != 'I'")
-    .query("htmlID != 's200704l'")
-)
-filtered_df = filtered_df.sort_values("date_DT", ascending=False)
+filtered_df = get_plotted_songs(df)
+# The plots read the rollup of the filtered songs, cached with the dataset
+rollup = get_rollup(xls_files, df=df, songs="plotted")
 
-make_length_plot(filtered_df, plot_type="timing")
-make_length_plot(filtered_df, plot_type="stream_length")
+make_length_plot(filtered_df, plot_type="timing", rollup=rollup)
+make_length_plot(filtered_df, plot_type="stream_length", rollup=rollup)
 
-make_count_plot(filtered_df)
-make_nsongs_plot(filtered_df)
+make_count_plot(filtered_df, rollup=rollup)
+make_nsongs_plot(filtered_df, rollup=rollup)
 
-make_streamtype_plot(filtered_df, plot_type="rank")
-# make_streamtype_plot(filtered_df, plot_type="tempo")
+make_streamtype_plot(filtered_df, plot_type="rank", rollup=rollup)
+# make_streamtype_plot(filtered_df, plot_type="tempo", rollup=rollup)
 
-make_livetype_plot(filtered_df)
-make_rank_length_streamtype(filtered_df)
-# make_tempo_nsong(filtered_df)
+make_livetype_plot(filtered_df, rollup=rollup)
+make_rank_length_streamtype(filtered_df, rollup=rollup)
+# make_tempo_nsong(filtered_df, rollup=rollup)
 
-make_rank_plots(filtered_df, rank="high")
-make_rank_plots(filtered_df, rank="mid")
-make_rank_plots(filtered_df, rank="low")
+make_rank_plots(filtered_df, rank="high", rollup=rollup)
+make_rank_plots(filtered_df, rank="mid", rollup=rollup)
+make_rank_plots(filtered_df, rank="low", rollup=rollup)
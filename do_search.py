@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+from database import database_fr, database_en
+from search_index import SearchIndex, get_search_index_path
+import argparse
+from profiling import add_profile_arguments, enable_from_args
+import sys
+
+medias = {"yt": "YouTube", "tw": "Twitch", "live": "Live"}
+
+parser = argparse.ArgumentParser(
+    description='Search the songs of the database, e.g. `funk name:"hello" comment:jam`.'
+)
+parser.add_argument(
+    "query",
+    nargs="+",
+    help="terms and quoted phrases to match, optionally prefixed by a field "
+    "(name, comment, genre, live_title, live_comment, choral).",
+)
+parser.add_argument("--en", action="store_true", help="search the English database.")
+parser.add_argument("--rank", nargs="+", help="only keep the songs with these ranks.")
+parser.add_argument(
+    "--media",
+    nargs="+",
+    choices=list(medias),
+    help="only keep the songs of these platforms: yt (YouTube), tw (Twitch), live (Live).",
+)
+parser.add_argument("--from", dest="first", help="first stream date (YYYY-MM-DD).")
+parser.add_argument("--to", dest="last", help="last stream date (YYYY-MM-DD).")
+parser.add_argument(
+    "--limit", type=int, default=20, help="maximum number of results (default 20)."
+)
+add_profile_arguments(parser, "do_search")
+
+args = parser.parse_args()
+enable_from_args(args)
+
+index_path = get_search_index_path(database_en if args.en else database_fr)
+try:
+    search_index = SearchIndex.load(index_path)
+except FileNotFoundError:
+    sys.exit(f"{index_path} not found, run do_database.py first")
+
+try:
+    results = search_index.search(
+        " ".join(args.query),
+        ranks=args.rank,
+        medias=[medias[media] for media in args.media] if args.media else None,
+        date_range=(args.first, args.last),
+        limit=args.limit,
+    )
+except ValueError as error:
+    sys.exit(str(error))
+
+for result in results:
+    print(
+        f"{result['date']}  {result['htmlID']:<10} {result['rank']:>2}  {result['name']}  ({result['live_title']})"
+    )
+print(f"{len(results)} songs found")
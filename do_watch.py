@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import argparse
+from profiling import add_profile_arguments, enable_from_args
+
+parser = argparse.ArgumentParser(
+    description="Watch the workbooks and rebuild the database, the tables and the plots "
+    "of the streams that change on each save."
+)
+parser.add_argument(
+    "--only",
+    nargs="+",
+    choices=["yt", "tw", "live"],
+    default=["tw", "live", "yt"],
+    help="only watch the specified platform(s): yt (YouTube), tw (Twitch), live (Live). Default is all platforms.",
+)
+parser.add_argument("--en", action="store_true", help="watch the English database.")
+parser.add_argument(
+    "--both",
+    action="store_true",
+    help="watch both the French and the English databases.",
+)
+parser.add_argument(
+    "--tables", action="store_true", help="also regenerate the HTML tables."
+)
+parser.add_argument(
+    "--compact",
+    action="store_true",
+    help="write the database as compact JSON, without indentation.",
+)
+parser.add_argument(
+    "--shards",
+    choices=["album", "year"],
+    help="also write the database as content-hashed shards, one per album or per year.",
+)
+parser.add_argument("--no-plots", action="store_true", help="do not redraw the plots.")
+parser.add_argument(
+    "--debounce",
+    type=float,
+    default=2.0,
+    help="seconds the workbooks must stay unchanged before a rebuild. Default is 2.",
+)
+parser.add_argument(
+    "--interval",
+    type=float,
+    default=0.5,
+    help="seconds between two checks of the workbooks. Default is 0.5.",
+)
+add_profile_arguments(parser, "do_watch")
+
+args = parser.parse_args()
+enable_from_args(args)
+
+from watch import Watcher
+
+sheets = (False, True) if args.both else (args.en,)
+xls_files = [f"marc_{platform}.xlsm" for platform in args.only]
+Watcher(
+    xls_files,
+    sheets=sheets,
+    tables=args.tables,
+    plots=not args.no_plots,
+    debounce=args.debounce,
+    compact=args.compact,
+    shards=args.shards,
+).run(interval=args.interval)
@@ -1,19 +1,16 @@
-from pytube import YouTube
-from pytube.cli import on_progress
-from yt_dlp import YoutubeDL
-from pydub import AudioSegment
-from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK, TDRC, TCON, COMM, APIC
 import shlex
 import subprocess
-from pythumb import Thumbnail
 import os
 import sys
 from database import get_live_code
+from song_index import SongIndex
+from profiling import profiled
 
 dl_dir = "streams_dl"
 icloud_dir = "mp3_playlists/icloud"
 
 
+@profiled
 def extract_audio_segment(input_file, output_file, start_time, end_time):
     """
     Extracts a segment from an audio file and exports it as an MP3 file.
@@ -27,6 +24,8 @@ def extract_audio_segment(input_file, output_file, start_time, end_time):
     Writes:
     The extracted audio segment to the specified output file in mp3 format.
     """
+    from pydub import AudioSegment
+
     audio = AudioSegment.from_file(input_file, format="webm")
     segment = audio[start_time * 1000 : end_time * 1000]
     segment.export(output_file, format="mp3")
@@ -142,6 +141,7 @@ def get_date_for_mp3(htmlID):
     return f"20{htmlID[:2]}-{htmlID[2:4]}-{htmlID[4:]}"
 
 
+@profiled
 def change_mp3_metadata(
     mp3_file,
     title,
@@ -170,6 +170,8 @@ def change_mp3_metadata(
     Modifies:
     The metadata of the specified MP3 file.
     """
+    from mutagen.id3 import ID3, TIT2, TPE1, TALB, TRCK, TDRC, TCON, COMM, APIC
+
     audio = ID3(mp3_file)
 
     # Modify the title metadata
@@ -203,8 +205,9 @@ def change_mp3_metadata(
 
 
 # TODO: this thing needs refactoring
+@profiled
 def download_songs_from_streams(
-    df, stream_titles=[], make_songs=True, make_playlist_rank=None
+    df, stream_titles=[], make_songs=True, make_playlist_rank=None, song_index=None
 ):
     """
     Downloads songs from specified streams and processes them into individual MP3 files.
@@ -214,12 +217,15 @@ def download_songs_from_streams(
     stream_titles (list): A list of stream titles to download songs from.
     make_songs (bool): A flag to determine if individual songs should be processed. Default is True.
     make_playlist_rank (list): A list of ranks to create playlists for. Default is None.
+    song_index (SongIndex): The index of `df`, built if None. Default is None.
 
     Writes:
     MP3 files for each song in the specified streams and optionally creates playlists based on ranks.
     """
+    if song_index is None:
+        song_index = SongIndex(df)
     for stream_title in stream_titles:
-        df_stream = df.query(f'live_title=="{stream_title}"')
+        df_stream = song_index.get("live_title", stream_title)
         stream_title = format_stream_title(stream_title)
         stream_title = f'{get_stream_info(df_stream, "htmlID")[1:]} {stream_title}'
         stream_dir = f"{dl_dir}/{stream_title}"
@@ -365,19 +371,25 @@ def download_songs_from_streams(
     print("Done.")
 
 
-def dl_thumbnail(df, stream_titles):
+@profiled
+def dl_thumbnail(df, stream_titles, song_index=None):
     """
     Downloads thumbnails for specified streams.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing stream data.
     stream_titles (list): A list of stream titles to download thumbnails for.
+    song_index (SongIndex): The index of `df`, built if None. Default is None.
 
     Writes:
     Thumbnails to the specified directory for each stream.
     """
+    from pythumb import Thumbnail
+
+    if song_index is None:
+        song_index = SongIndex(df)
     for stream_title in stream_titles:
-        df_stream = df.query(f'live_title=="{stream_title}"')
+        df_stream = song_index.get("live_title", stream_title)
         stream_title = format_stream_title(stream_title)
         stream_title = f'{get_stream_info(df_stream, "htmlID")[1:]} {stream_title}'
         stream_dir = f"{dl_dir}/{stream_title}"
@@ -414,19 +426,23 @@ def dl_thumbnail(df, stream_titles):
             print(f"{stream_title} thumbnail already downloaded.")
 
 
-def mv_thumbnail_to_icloud(df, stream_titles):
+@profiled
+def mv_thumbnail_to_icloud(df, stream_titles, song_index=None):
     """
     Moves thumbnails for specified streams to the iCloud directory.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing stream data.
     stream_titles (list): A list of stream titles whose thumbnails need to be moved.
+    song_index (SongIndex): The index of `df`, built if None. Default is None.
 
     Moves:
     Thumbnails from the local directory to the iCloud directory.
     """
+    if song_index is None:
+        song_index = SongIndex(df)
     for stream_title in stream_titles:
-        df_stream = df.query(f'live_title=="{stream_title}"')
+        df_stream = song_index.get("live_title", stream_title)
         stream_title = format_stream_title(stream_title)
         stream_title = f'{get_stream_info(df_stream, "htmlID")[1:]} {stream_title}'
         stream_dir = f"{dl_dir}/{stream_title}"
@@ -441,7 +457,8 @@ def mv_thumbnail_to_icloud(df, stream_titles):
             print(f"{stream_title} thumbnail not found.")
 
 
-def mv_mp3_to_icloud(df, stream_titles, ranks):
+@profiled
+def mv_mp3_to_icloud(df, stream_titles, ranks, song_index=None):
     """
     Moves MP3 files for specified streams to the iCloud directory and updates their metadata.
 
@@ -449,12 +466,15 @@ def mv_mp3_to_icloud(df, stream_titles, ranks):
     df (pd.DataFrame): The DataFrame containing song data.
     stream_titles (list): A list of stream titles whose MP3 files need to be moved.
     ranks (list): A list of ranks to filter the songs by.
+    song_index (SongIndex): The index of `df`, built if None. Default is None.
 
     Moves:
     MP3 files from the local directory to the iCloud directory and updates their metadata.
     """
+    if song_index is None:
+        song_index = SongIndex(df)
     for stream_title in stream_titles:
-        df_stream = df.query(f'live_title=="{stream_title}"')
+        df_stream = song_index.get("live_title", stream_title)
         stream_title = format_stream_title(stream_title)
         stream_title = f'{get_stream_info(df_stream, "htmlID")[1:]} {stream_title}'
         stream_dir = f"{dl_dir}/{stream_title}"
@@ -1,14 +1,10 @@
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
 import calendar
-import seaborn as sns
-import plothist
 import numpy as np
 import pandas as pd
 import os
 from database import css_colors_dict
-
-os.makedirs("plots", exist_ok=True)
+from rollup import build_rollup
+from profiling import profiled, stage
 
 rank_list = ["S", "A+", "A", "B+", "B", "C+", "C", "D"]
 
@@ -20,32 +16,85 @@ custom_colors = [
 ]
 
 
-def make_length_plot(df, plot_type="timing"):
+def get_plotted_songs(df):
+    """
+    Returns the songs shown in the plots: cut songs, unranked songs and stream s200704l removed, most recent first.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+
+    Returns:
+    pd.DataFrame: The plotted songs.
+    """
+    filtered_df = (
+        df[~df["songID"].str.startswith("cut")]
+        .query("rank != 'I'")
+        .query("htmlID != 's200704l'")
+    )
+    return filtered_df.sort_values("date_DT", ascending=False)
+
+
+def import_pyplot():
+    """
+    Imports matplotlib with the plothist style, on the first plot rather than at import.
+
+    Returns:
+    module: matplotlib.pyplot.
+    """
+    import matplotlib.pyplot as plt
+    import plothist
+
+    return plt
+
+
+def save_plot(fig, output_file):
+    """
+    Saves a figure, creating the folder of the file if needed.
+
+    Parameters:
+    fig: The matplotlib figure (or pyplot, for the current figure).
+    output_file (str): The path of the image to write.
+    """
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
+    with stage("plotting.savefig", "matplotlib"):
+        fig.savefig(output_file, bbox_inches="tight")
+
+
+@profiled
+def make_length_plot(df, plot_type="timing", rollup=None):
     """
     Generates a plot for song lengths or stream lengths.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
     plot_type (str): The type of plot to generate ('timing' or 'stream_length').
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
     """
-    df["length_minutes"] = df["length_DT"].dt.seconds // 60
-    df["length_seconds"] = df["length_DT"].dt.seconds % 60
+    plt = import_pyplot()
+    import matplotlib.dates as mdates
+
+    if rollup is None:
+        rollup = build_rollup(df)
+    by_month = rollup.aggregate(["date_YM_DT"])
 
     if plot_type == "timing":
-        grouped = (
-            df[["length_minutes", "length_seconds", "date_YM_DT"]]
-            .groupby("date_YM_DT")
-            .mean()
+        grouped = pd.DataFrame(
+            {
+                "length_minutes": by_month["length_minutes_sum"]
+                / by_month["n_lengths"],
+                "length_seconds": by_month["length_seconds_sum"]
+                / by_month["n_lengths"],
+            }
         )
         ylabel = "Mean song length / stream (min)"
         output_file = "plots/live_song_length.png"
     else:
-        grouped = (
-            df[["date_YM_DT", "length_DT"]].groupby("date_YM_DT").sum()
-            / df.drop_duplicates("htmlID")[["date_YM_DT", "length_DT"]]
-            .groupby("date_YM_DT")
-            .count()
+        n_streams = (
+            rollup.streams.drop_duplicates("htmlID")
+            .groupby("date_YM_DT", observed=True)
+            .size()
         )
+        grouped = pd.DataFrame({"length_DT": by_month["length_sum"] / n_streams})
         grouped["length_minutes"] = grouped["length_DT"].dt.seconds // 60
         grouped["length_seconds"] = grouped["length_DT"].dt.seconds % 60
         ylabel = "Mean stream length (min)"
@@ -73,20 +122,26 @@ def make_length_plot(df, plot_type="timing"):
     ax.xaxis.set_major_locator(mdates.AutoDateLocator())
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m"))
     plt.xticks(rotation=45)
-    plt.savefig(output_file, bbox_inches="tight")
+    save_plot(plt, output_file)
 
 
-def make_nsongs_plot(df):
+@profiled
+def make_nsongs_plot(df, rollup=None):
     """
     Generates a bar plot for the number of songs per rank.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
 
     Writes:
     A bar plot saved as 'plots/rank_nsong.png' showing the number of songs for each rank.
     """
-    values = [len(df.query(f"rank == '{rank}'")) for rank in rank_list]
+    plt = import_pyplot()
+
+    if rollup is None:
+        rollup = build_rollup(df)
+    values = [rollup.count(rank=rank) for rank in rank_list]
     colors = [
         color
         for rank in rank_list
@@ -97,22 +152,30 @@ def make_nsongs_plot(df):
     plt.bar(rank_list, values, color=colors)
     plt.xlabel("Rank")
     plt.ylabel("Number of songs")
-    plt.savefig("plots/rank_nsong.png", bbox_inches="tight")
+    save_plot(plt, "plots/rank_nsong.png")
 
 
-def make_count_plot(df):
+@profiled
+def make_count_plot(df, rollup=None):
     """
     Generates a plot for the number of songs or the number of songs per rank.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
-    plot_type (str): The type of plot to generate ('nsongs' or 'rank_nsong').
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
     """
-    grouped = (
-        df[["date_YM_DT", "songID"]].groupby("date_YM_DT").count()
-        / df.drop_duplicates("htmlID")[["date_YM_DT", "songID"]]
-        .groupby("date_YM_DT")
-        .count()
+    plt = import_pyplot()
+    import matplotlib.dates as mdates
+
+    if rollup is None:
+        rollup = build_rollup(df)
+    grouped = pd.DataFrame(
+        {
+            "songID": rollup.aggregate(["date_YM_DT"])["n_songs"]
+            / rollup.streams.drop_duplicates("htmlID")
+            .groupby("date_YM_DT", observed=True)
+            .size()
+        }
     )
     ylabel = "Mean song number / stream"
     output_file = "plots/live_song_number.png"
@@ -134,28 +197,37 @@ def make_count_plot(df):
     ax.xaxis.set_major_locator(mdates.AutoDateLocator())
     ax.xaxis.set_major_formatter(mdates.DateFormatter("%Y-%m"))
     plt.xticks(rotation=45)
-    plt.savefig(output_file, bbox_inches="tight")
+    save_plot(plt, output_file)
 
 
-def make_livetype_plot(df):
+@profiled
+def make_livetype_plot(df, rollup=None):
     """
     Generates a stacked bar plot for the number of streams per media type over time.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing stream data.
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
 
     Writes:
     A stacked bar plot saved as 'plots/nstreams_stacked_bar_plot.png' showing the number of streams per media type.
     """
+    plt = import_pyplot()
+    import matplotlib.dates as mdates
+
+    if rollup is None:
+        rollup = build_rollup(df)
+    streams = rollup.streams
+
     # Define media types and colors
     media_types = ["YouTube", "Twitch", "Live"]
     colors = custom_colors
 
     # Group by "date_YM_DT" and calculate the count of htmlIDs for each media type
     grouped = {
-        media: df.query(f"media == '{media}'")
+        media: streams[streams["media"] == media]
         .drop_duplicates("htmlID")[["date_YM_DT", "htmlID"]]
-        .groupby("date_YM_DT")
+        .groupby("date_YM_DT", observed=True)
         .count()
         .reset_index()
         for media in media_types
@@ -225,46 +297,46 @@ def make_livetype_plot(df):
     plt.legend(legend_handles, legend_labels, loc="upper right")
 
     # Save the plot
-    plt.savefig("plots/nstreams_stacked_bar_plot.png", bbox_inches="tight")
+    save_plot(plt, "plots/nstreams_stacked_bar_plot.png")
 
 
-def make_rank_plots(df, rank="high"):
+@profiled
+def make_rank_plots(df, rank="high", rollup=None):
     """
     Generates a heatmap plot for the percentage of songs with specified ranks over time.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
     rank (str): The rank category to plot ('high', 'mid', 'low').
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
 
     Writes:
     A heatmap plot saved as 'plots/rank_heatmap_{rank}.png' showing the percentage of songs with specified ranks.
     """
-    rank_queries = {
-        "high": "rank == 'S' or rank == 'A+' or rank == 'A'",
-        "mid": "rank == 'B+' or rank == 'B'",
-        "low": "rank == 'C+' or rank == 'C' or rank == 'D'",
+    plt = import_pyplot()
+    import seaborn as sns
+
+    rank_categories = {
+        "high": ["S", "A+", "A"],
+        "mid": ["B+", "B"],
+        "low": ["C+", "C", "D"],
     }
     cmap = {"high": "YlOrRd", "mid": "YlGn", "low": "Blues"}
     rank_txt = {"high": "S, A+ or A", "mid": "B+ or B", "low": "C+, C or D"}
 
-    if rank not in rank_queries:
+    if rank not in rank_categories:
         raise ValueError(f"Invalid rank: {rank}")
-
-    query = rank_queries.get(rank, "rank == 'S' or rank == 'A+' or rank == 'A'")
-    percentage_df = (
-        df[["date_YM_DT", "when_ranked_YM_DT", "rank"]]
-        .query(query)
-        .groupby(["date_YM_DT", "when_ranked_YM_DT"])
-        .count()
-        / df[["date_YM_DT", "when_ranked_YM_DT", "rank"]]
-        .groupby(["date_YM_DT", "when_ranked_YM_DT"])
-        .count()
+    if rollup is None:
+        rollup = build_rollup(df)
+
+    # Share of the ranked songs of each (stream month, ranking month) in the rank category
+    months = ["date_YM_DT", "when_ranked_YM_DT"]
+    ranked = rollup.cube[rollup.cube["rank"].notna()]
+    df = (
+        rollup.aggregate(months, rank=rank_categories[rank])["n_songs"]
+        / ranked.groupby(months, observed=True)["n_songs"].sum()
     )
-
-    df = df[["date_YM_DT", "when_ranked_YM_DT"]]
-
-    # Merge the percentage data with the df DataFrame
-    df = pd.merge(df, percentage_df, on=["date_YM_DT", "when_ranked_YM_DT"], how="left")
+    df = df.rename("rank").reset_index()
 
     # Multiply rank column by 100 to get percentage values
     df["rank"] = df["rank"] * 100
@@ -307,17 +379,21 @@ def make_rank_plots(df, rank="high"):
     ax.set_yticklabels(ax.get_yticklabels())
 
     # Show the plot
-    fig.savefig(f"plots/rank_heatmap_{rank}.png", bbox_inches="tight")
+    save_plot(fig, f"plots/rank_heatmap_{rank}.png")
 
 
-def make_streamtype_plot(df, plot_type="rank"):
+@profiled
+def make_streamtype_plot(df, plot_type="rank", rollup=None):
     """
     Generates a plot for the number of songs per rank or tempo for each stream type.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
     plot_type (str): The type of plot to generate ('rank' or 'tempo').
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
     """
+    plt = import_pyplot()
+
     if plot_type == "rank":
         categories = rank_list
         ylabel = "Percentage"
@@ -329,21 +405,24 @@ def make_streamtype_plot(df, plot_type="rank"):
         output_file = "plots/tempo_nsong_streamtype.png"
         category_ticks = ["Slow or Smed", "Med", "Fmed or Fast"]
 
+    if rollup is None:
+        rollup = build_rollup(df)
+
     values = []
     for category in categories:
         category_values = []
         for media in ["YouTube", "Twitch", "Live"]:
             if plot_type == "rank":
                 category_values.append(
-                    len(df.query(f"rank == '{category}' and media == '{media}'"))
+                    rollup.count(rank=category, media=media)
                     * 100
-                    / len(df.query(f"media == '{media}'"))
+                    / rollup.count(media=media)
                 )
             else:
                 category_values.append(
-                    len(df.query(f"tempo in {category} and media == '{media}'"))
+                    rollup.count(tempo=category, media=media)
                     * 100
-                    / len(df.query(f"media == '{media}'"))
+                    / rollup.count(media=media)
                 )
         values.append(category_values)
 
@@ -374,28 +453,32 @@ def make_streamtype_plot(df, plot_type="rank"):
     legend_handles = [plt.Rectangle((0, 0), 1, 1, color=color) for color in colors[0]]
     plt.legend(legend_handles, ["YouTube", "Twitch", "Live"], loc="upper right")
     plt.xticks(x, category_ticks)
-    plt.savefig(output_file, bbox_inches="tight")
+    save_plot(plt, output_file)
 
 
-def make_rank_length_streamtype(df):
+@profiled
+def make_rank_length_streamtype(df, rollup=None):
     """
     Generates a bar plot showing the mean song length for each rank and media type.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
 
     Writes:
     A bar plot saved as 'plots/rank_length_streamtype.png' showing the mean song length for each rank and media type.
     """
+    plt = import_pyplot()
+
+    if rollup is None:
+        rollup = build_rollup(df)
     values = []
 
     # Calculate mean song length for each rank and media type
     for rank in rank_list:
         rank_values = []
         for media in ["YouTube", "Twitch", "Live"]:
-            rank_values.append(
-                df.query(f"rank == '{rank}' and media =='{media}' ")["length_DT"].mean()
-            )
+            rank_values.append(rollup.mean_length(rank=rank, media=media))
         values.append(rank_values)
 
     # Assign colors for each category
@@ -428,28 +511,34 @@ def make_rank_length_streamtype(df):
 
     plt.legend(legend_handles, ["YouTube", "Twitch", "Live"], loc="upper right")
     plt.xticks(x, rank_list)
-    plt.savefig("plots/rank_length_streamtype.png", bbox_inches="tight")
+    save_plot(plt, "plots/rank_length_streamtype.png")
 
 
-def make_tempo_nsong(df):
+@profiled
+def make_tempo_nsong(df, rollup=None):
     """
     Generates a bar plot showing the number of songs for each tempo category.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
 
     Writes:
     A bar plot saved as 'plots/tempo_nsong.png' showing the number of songs for each tempo category.
     """
+    plt = import_pyplot()
+
     # Define the categories and their corresponding values
     tempos = ["Slow or Smed", "Med", "Fmed or Fast"]
     values = []
     fig, ax = plt.subplots()
 
     # Calculate the number of songs for each tempo category
-    values.append(len(df.query(f"tempo == 'Slow' or tempo == 'Smed'")))
-    values.append(len(df.query(f"tempo == 'Med'")))
-    values.append(len(df.query(f"tempo == 'Fmed' or tempo == 'Fast'")))
+    if rollup is None:
+        rollup = build_rollup(df)
+    values.append(rollup.count(tempo=["Slow", "Smed"]))
+    values.append(rollup.count(tempo="Med"))
+    values.append(rollup.count(tempo=["Fmed", "Fast"]))
 
     # Plot the bar graph with custom colors
     plt.bar(tempos, values)
@@ -462,4 +551,4 @@ def make_tempo_nsong(df):
     # Rotate the x-axis labels if needed
     # plt.xticks(rotation=45)
 
-    plt.savefig("plots/tempo_nsong.png", bbox_inches="tight")
+    save_plot(plt, "plots/tempo_nsong.png")
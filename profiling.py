@@ -0,0 +1,260 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import sys
+import json
+import time
+import atexit
+import resource
+import functools
+import threading
+import contextlib
+import tracemalloc
+
+# Profiling state, disabled by default: the instrumented functions then only check this flag
+_enabled = False
+_trace_memory = False
+_origin_ns = 0
+_events = []
+# Peak traced memory of each running stage of the main thread, innermost last. The tracemalloc
+# peak is shared by every thread, so the stages of other threads record no memory peak.
+_peaks = []
+
+_null_stage = contextlib.nullcontext()
+
+
+class _Stage:
+    """
+    A running stage, recording its wall time, CPU time and peak memory as a trace event on exit.
+    """
+
+    __slots__ = ("name", "category", "wall_ns", "cpu_ns", "trace_memory")
+
+    def __init__(self, name, category):
+        self.name = name
+        self.category = category
+        self.trace_memory = (
+            _trace_memory and threading.current_thread() is threading.main_thread()
+        )
+
+    def __enter__(self):
+        if self.trace_memory:
+            # The memory peak reached so far belongs to the parent stage
+            if _peaks:
+                _peaks[-1] = max(_peaks[-1], tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            _peaks.append(0)
+        self.cpu_ns = time.process_time_ns()
+        self.wall_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_ns = time.perf_counter_ns()
+        cpu_ns = time.process_time_ns()
+        event_args = {"cpu_ms": (cpu_ns - self.cpu_ns) / 1e6}
+        if self.trace_memory:
+            peak = max(_peaks.pop(), tracemalloc.get_traced_memory()[1])
+            tracemalloc.reset_peak()
+            if _peaks:
+                _peaks[-1] = max(_peaks[-1], peak)
+            event_args["peak_memory_MB"] = peak / 2**20
+        elif not _trace_memory:
+            event_args["max_rss_MB"] = get_max_rss() / 2**20
+        _events.append(
+            {
+                "name": self.name,
+                "cat": self.category,
+                "ph": "X",
+                "ts": (self.wall_ns - _origin_ns) / 1e3,
+                "dur": (wall_ns - self.wall_ns) / 1e3,
+                "pid": os.getpid(),
+                "tid": threading.get_ident(),
+                "args": event_args,
+            }
+        )
+        return False
+
+
+def get_max_rss():
+    """
+    Returns the peak resident memory of the process so far, in bytes.
+    """
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return max_rss if sys.platform == "darwin" else max_rss * 1024
+
+
+def stage(name, category="stage"):
+    """
+    Context manager recording a stage, e.g. `with stage("thumbnails.load"): ...`.
+
+    Parameters:
+    name (str): The name of the stage.
+    category (str): The category of the stage in the trace. Default is "stage".
+
+    Returns:
+    A context manager, doing nothing when profiling is disabled.
+    """
+    if not _enabled:
+        return _null_stage
+    return _Stage(name, category)
+
+
+def profiled(function=None, name=None, category="function"):
+    """
+    Decorator recording each call of a function as a stage, named "module.function" by default.
+
+    Parameters:
+    function (callable): The function to instrument.
+    name (str): The name of the stage. Default is None (the qualified name of the function).
+    category (str): The category of the stage in the trace. Default is "function".
+
+    Returns:
+    callable: The instrumented function, calling `function` directly when profiling is disabled.
+    """
+
+    def decorate(function):
+        stage_name = name or f"{function.__module__}.{function.__qualname__}"
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return function(*args, **kwargs)
+            with _Stage(stage_name, category):
+                return function(*args, **kwargs)
+
+        return wrapper
+
+    if function is not None:
+        return decorate(function)
+    return decorate
+
+
+def enable(trace_path=None, trace_memory=False):
+    """
+    Starts recording the stages.
+
+    Parameters:
+    trace_path (str): The Chrome trace file written at exit, with a summary printed. Default is None (none).
+    trace_memory (bool): A flag to record the peak memory of each stage with tracemalloc, which slows
+                         the run down. Otherwise the peak resident memory of the process is recorded.
+    """
+    global _enabled, _trace_memory, _origin_ns
+    _enabled = True
+    _trace_memory = trace_memory
+    _origin_ns = time.perf_counter_ns()
+    _events.clear()
+    _peaks.clear()
+    if trace_memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    if trace_path is not None:
+        atexit.register(_write_at_exit, trace_path)
+
+
+def disable():
+    """
+    Stops recording the stages. The recorded events are kept.
+    """
+    global _enabled
+    _enabled = False
+    if _trace_memory and tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def get_summary():
+    """
+    Aggregates the recorded stages by name.
+
+    Returns:
+    dict: {name: {"calls", "wall_s", "cpu_s", "peak_memory_MB"}}, slowest stages first. Times include
+          the nested stages. With tracemalloc, the peak memory is 0 for the stages only run outside
+          the main thread.
+    """
+    summary = {}
+    for event in _events:
+        stats = summary.setdefault(
+            event["name"],
+            {"calls": 0, "wall_s": 0.0, "cpu_s": 0.0, "peak_memory_MB": 0.0},
+        )
+        stats["calls"] += 1
+        stats["wall_s"] += event["dur"] / 1e6
+        stats["cpu_s"] += event["args"]["cpu_ms"] / 1e3
+        memory = event["args"].get("peak_memory_MB", event["args"].get("max_rss_MB"))
+        if memory is not None:
+            stats["peak_memory_MB"] = max(stats["peak_memory_MB"], memory)
+    return dict(sorted(summary.items(), key=lambda item: -item[1]["wall_s"]))
+
+
+def write_trace(path):
+    """
+    Writes the recorded stages as a Chrome trace (chrome://tracing, ui.perfetto.dev), with the summary.
+
+    Parameters:
+    path (str): The path of the JSON file to write.
+    """
+    metadata = {
+        "name": "process_name",
+        "ph": "M",
+        "pid": os.getpid(),
+        "args": {"name": os.path.basename(sys.argv[0]) or "python"},
+    }
+    trace = {
+        "traceEvents": [metadata] + sorted(_events, key=lambda event: event["ts"]),
+        "displayTimeUnit": "ms",
+        "otherData": {
+            "memory": "tracemalloc peak" if _trace_memory else "process max RSS"
+        },
+        "summary": get_summary(),
+    }
+    with open(path, "w") as f:
+        json.dump(trace, f)
+
+
+def print_summary():
+    """
+    Prints the calls, wall time, CPU time and peak memory of each recorded stage.
+    """
+    print("\n_______ Profile _______\n")
+    print(f"{'stage':<50} {'calls':>6} {'wall (s)':>9} {'cpu (s)':>9} {'mem (MB)':>9}")
+    for name, stats in get_summary().items():
+        print(
+            f"{name:<50} {stats['calls']:>6} {stats['wall_s']:>9.3f} "
+            f"{stats['cpu_s']:>9.3f} {stats['peak_memory_MB']:>9.1f}"
+        )
+
+
+def _write_at_exit(trace_path):
+    print_summary()
+    write_trace(trace_path)
+    print(f"\nTrace saved to {trace_path}")
+
+
+def add_profile_arguments(parser, script):
+    """
+    Adds the --profile and --profile-memory options to the parser of an entry point.
+
+    Parameters:
+    parser (argparse.ArgumentParser): The parser of the entry point.
+    script (str): The name of the entry point, used for the default trace file name.
+    """
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const=f"{script}.trace.json",
+        metavar="PATH",
+        help="record the wall time, CPU time, peak memory and calls of each stage, print them "
+        f"and write them as a Chrome trace (default {script}.trace.json).",
+    )
+    parser.add_argument(
+        "--profile-memory",
+        action="store_true",
+        help="with --profile, trace the peak memory of each stage (slower).",
+    )
+
+
+def enable_from_args(args):
+    """
+    Enables profiling if requested by the options added with `add_profile_arguments`.
+    """
+    if args.profile:
+        enable(args.profile, trace_memory=args.profile_memory)
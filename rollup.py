@@ -0,0 +1,149 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import dataclasses
+import numpy as np
+import pandas as pd
+from profiling import profiled
+
+# Dimensions of the cube: stream month, ranking month, media, rank and tempo
+cube_dimensions = ["date_YM_DT", "when_ranked_YM_DT", "media", "rank", "tempo"]
+
+# Measures of the cube, summed when rolling it up
+cube_measures = [
+    "n_songs",
+    "n_lengths",
+    "length_sum",
+    "length_minutes_sum",
+    "length_seconds_sum",
+]
+
+# Columns identifying a stream, media included as a stream can appear in several workbooks
+stream_keys = ["htmlID", "live_title", "media"]
+
+
+@dataclasses.dataclass
+class Rollup:
+    """
+    Materialized aggregates of a song DataFrame, computed once by `build_rollup`.
+
+    `cube` has one row per (date_YM_DT, when_ranked_YM_DT, media, rank, tempo) combination of the
+    songs, with the number of songs, the number of songs with a length, the sum of their lengths
+    and the sums of the minutes and seconds parts of their lengths.
+    `streams` has one row per (htmlID, live_title, media) stream, in htmlID order, with the month and
+    ranking month of the stream, its number of songs, its length and its longest song.
+    """
+
+    cube: pd.DataFrame
+    streams: pd.DataFrame
+
+    def select(self, **filters):
+        """
+        Returns the cube rows matching every filter, e.g. `select(rank="S", media=["YouTube", "Live"])`.
+
+        Parameters:
+        **filters: The values to match for each dimension, a value or a list of values.
+
+        Returns:
+        pd.DataFrame: The matching rows of the cube.
+        """
+        mask = np.ones(len(self.cube), dtype=bool)
+        for dimension, values in filters.items():
+            if not isinstance(values, (list, tuple, set)):
+                values = [values]
+            mask &= self.cube[dimension].isin(values).to_numpy()
+        return self.cube[mask]
+
+    def aggregate(self, by, **filters):
+        """
+        Rolls the cube up to some dimensions, summing the measures of the rows matching the filters.
+
+        Parameters:
+        by (list): The dimensions to keep. Rows with a missing value in one of them are dropped.
+        **filters: The values to match for each dimension, see `select`.
+
+        Returns:
+        pd.DataFrame: The measures, indexed by the kept dimensions.
+        """
+        return self.select(**filters).groupby(by, observed=True)[cube_measures].sum()
+
+    def count(self, **filters):
+        """
+        Returns the number of songs matching every filter, see `select`.
+        """
+        return int(self.select(**filters)["n_songs"].sum())
+
+    def mean_length(self, **filters):
+        """
+        Returns the mean length of the songs matching every filter, see `select`.
+
+        Returns:
+        pd.Timedelta: The mean length, NaT if no song has a length.
+        """
+        selected = self.select(**filters)
+        n_lengths = selected["n_lengths"].sum()
+        if n_lengths == 0:
+            return pd.NaT
+        return selected["length_sum"].sum() / n_lengths
+
+
+@profiled
+def build_rollup(df):
+    """
+    Builds the rollup of a song DataFrame, in one grouped pass for the cube and one for the streams.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+
+    Returns:
+    Rollup: The cube and the per-stream totals of the songs.
+    """
+    seconds = df["length_DT"].dt.seconds
+    songs = df[cube_dimensions + ["htmlID", "live_title", "length_DT"]].assign(
+        length_minutes=seconds // 60, length_seconds=seconds % 60
+    )
+
+    cube = (
+        songs.groupby(cube_dimensions, observed=True, dropna=False)
+        .agg(
+            n_songs=("length_DT", "size"),
+            n_lengths=("length_DT", "count"),
+            length_sum=("length_DT", "sum"),
+            length_minutes_sum=("length_minutes", "sum"),
+            length_seconds_sum=("length_seconds", "sum"),
+        )
+        .astype({"length_minutes_sum": np.int64, "length_seconds_sum": np.int64})
+        .reset_index()
+    )
+
+    streams = songs.groupby(stream_keys, observed=True, dropna=False).agg(
+        date_YM_DT=("date_YM_DT", "first"),
+        when_ranked_YM_DT=("when_ranked_YM_DT", "first"),
+        n_songs=("length_DT", "size"),
+        length_sum=("length_DT", "sum"),
+    )
+
+    # Longest song of each stream, the first one in DataFrame order on ties
+    longest = (
+        pd.DataFrame(
+            {
+                "htmlID": df["htmlID"].to_numpy(),
+                "live_title": df["live_title"].to_numpy(),
+                "media": df["media"].to_numpy(),
+                "longest_song_length": df["length_DT"].to_numpy(),
+                "longest_song_name": df["name"].to_numpy(dtype=object),
+                "longest_song_position": np.arange(len(df)),
+            }
+        )
+        .dropna(subset=["longest_song_length"])
+        .sort_values(
+            ["longest_song_length", "longest_song_position"], ascending=[False, True]
+        )
+        .drop_duplicates(stream_keys)
+        .set_index(stream_keys)
+    )
+    streams = streams.join(longest)
+    streams["longest_song_position"] = (
+        streams["longest_song_position"].fillna(-1).astype(np.int64)
+    )
+
+    return Rollup(cube=cube, streams=streams.reset_index())
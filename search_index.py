@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import re
+import json
+import datetime
+import unicodedata
+from profiling import profiled
+
+# Free-text columns of the song DataFrame, searchable with "field:term"
+search_fields = ["name", "comment", "genre", "live_title", "live_comment", "choral"]
+
+# Columns stored for each song, to filter and print the results without the workbooks
+stored_columns = ["songID", "htmlID", "name", "rank", "media", "live_title"]
+
+search_index_version = 1
+
+# Terms and "quoted phrases", prefixed by "field:" only for the names of `search_fields`, so that
+# e.g. 14:30 is a plain term
+query_pattern = re.compile(rf'(?:({"|".join(search_fields)}):)?(?:"([^"]*)"|(\S+))')
+
+
+def fold_text(text):
+    """
+    Folds a text for indexing: accents removed (é -> e, ç -> c) and case folded.
+
+    Parameters:
+    text (str): The text to fold.
+
+    Returns:
+    str: The folded text.
+    """
+    text = unicodedata.normalize("NFKD", text)
+    return "".join(char for char in text if not unicodedata.combining(char)).casefold()
+
+
+def tokenize(text):
+    """
+    Splits a text into folded alphanumeric tokens.
+
+    Parameters:
+    text (str): The text to split. Non-string values (NaN) have no tokens.
+
+    Returns:
+    list: The tokens, in order.
+    """
+    if not isinstance(text, str):
+        return []
+    return re.findall(r"\w+", fold_text(text))
+
+
+def format_date_bound(date):
+    """
+    Returns a date bound of a search as the "YYYY-MM-DD" string stored in the index.
+
+    Parameters:
+    date (str, datetime.date or None): The date, e.g. "2024-01-05" or "2024-1-5".
+
+    Returns:
+    str: The zero-padded date, or None if `date` is None.
+    """
+    if date is None:
+        return None
+    if isinstance(date, datetime.date):
+        return date.strftime("%Y-%m-%d")
+    try:
+        return datetime.datetime.strptime(date, "%Y-%m-%d").strftime("%Y-%m-%d")
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid date {date!r}, use YYYY-MM-DD") from None
+
+
+def get_search_index_path(database_path):
+    """
+    Returns the path of the search index stored next to a database file.
+
+    Parameters:
+    database_path (str): The path of the database file (e.g. data/newdatabase.json).
+
+    Returns:
+    str: The path of the search index (e.g. data/newdatabase.search.json).
+    """
+    root, _ = os.path.splitext(database_path)
+    return f"{root}.search.json"
+
+
+def build_search_index(df):
+    """
+    Builds the inverted index of the free-text columns of a song DataFrame.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+
+    Returns:
+    dict: The index, with the "fields", the stored "columns" of each song and the "postings"
+          {term: [[song, field, position], ...]} in song order.
+    """
+    postings = {}
+    for n_field, field in enumerate(search_fields):
+        for n_song, text in enumerate(df[field].tolist()):
+            for position, token in enumerate(tokenize(text)):
+                postings.setdefault(token, []).append([n_song, n_field, position])
+    for term_postings in postings.values():
+        term_postings.sort()
+
+    columns = {column: df[column].astype(object).tolist() for column in stored_columns}
+    columns["date"] = df["date_DT"].dt.strftime("%Y-%m-%d").tolist()
+    for values in columns.values():
+        values[:] = [value if isinstance(value, str) else None for value in values]
+
+    return {
+        "version": search_index_version,
+        "fields": search_fields,
+        "columns": columns,
+        "postings": postings,
+    }
+
+
+@profiled
+def write_search_index(df, path):
+    """
+    Builds the search index of a song DataFrame and writes it to a JSON file.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+    path (str): The path of the index file, see `get_search_index_path`.
+    """
+    index = build_search_index(df)
+    with open(path + ".tmp", "w") as f:
+        json.dump(index, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(path + ".tmp", path)
+    print(f"Search index saved to {path} ({len(index['postings'])} terms)")
+
+
+class SearchIndex:
+    """
+    Query API over a search index written by `write_search_index`.
+
+    Queries are made of terms and "quoted phrases", all required, each optionally restricted to
+    one field with "field:" (e.g. `genre:funk name:"hello world"`); any other "word:" prefix is part
+    of the term. Accents and case are ignored.
+    """
+
+    def __init__(self, index):
+        self.fields = index["fields"]
+        self.columns = index["columns"]
+        self.postings = index["postings"]
+        self.n_songs = len(self.columns["songID"])
+
+    @classmethod
+    def load(cls, path):
+        """
+        Loads a search index file.
+
+        Parameters:
+        path (str): The path of the index file.
+
+        Returns:
+        SearchIndex: The loaded index.
+        """
+        with open(path, "r") as f:
+            index = json.load(f)
+        if index.get("version") != search_index_version:
+            raise ValueError(f"{path} was written by another version, rebuild it")
+        return cls(index)
+
+    def _get_hits(self, tokens, field=None):
+        """
+        Returns the number of occurrences of a term or phrase in each song, as {song: count}.
+        """
+        n_field = None if field is None else self.fields.index(field)
+        # {(song, field): positions} of each token
+        occurrences = []
+        for token in tokens:
+            token_occurrences = {}
+            for n_song, token_field, position in self.postings.get(token, []):
+                if n_field is None or token_field == n_field:
+                    token_occurrences.setdefault((n_song, token_field), set()).add(
+                        position
+                    )
+            occurrences.append(token_occurrences)
+
+        hits = {}
+        for key, positions in occurrences[0].items():
+            for offset, token_occurrences in enumerate(occurrences[1:], 1):
+                positions = {
+                    position
+                    for position in positions
+                    if position + offset in token_occurrences.get(key, ())
+                }
+            if positions:
+                hits[key[0]] = hits.get(key[0], 0) + len(positions)
+        return hits
+
+    def search(self, query, ranks=None, medias=None, date_range=None, limit=None):
+        """
+        Returns the songs matching a query, best matches first.
+
+        Parameters:
+        query (str): The terms and phrases to match, see `SearchIndex`.
+        ranks (list): The ranks of the songs to keep. If None, keeps every rank.
+        medias (list): The media types to keep (e.g. ["YouTube"]). If None, keeps every media.
+        date_range (tuple): The (first, last) stream dates to keep as "YYYY-MM-DD", inclusive.
+                            Either bound can be None, see `format_date_bound`.
+        limit (int): The maximum number of results. If None, returns every match.
+
+        Returns:
+        list: The matching songs, as dicts with the stored columns, the stream "date" and the "score".
+              Empty if the query has no term.
+        """
+        first, last = [format_date_bound(date) for date in (date_range or (None, None))]
+        if first is not None and last is not None and first > last:
+            raise ValueError(f"Empty date range, {first} is after {last}")
+
+        scores = None
+        for field, phrase, term in query_pattern.findall(query):
+            tokens = tokenize(phrase or term)
+            if not tokens:
+                continue
+            hits = self._get_hits(tokens, field or None)
+            if scores is None:
+                scores = hits
+            else:
+                scores = {
+                    n_song: score + hits[n_song]
+                    for n_song, score in scores.items()
+                    if n_song in hits
+                }
+        if scores is None:
+            return []
+
+        results = []
+        for n_song in sorted(scores, key=lambda n_song: (-scores[n_song], n_song)):
+            date = self.columns["date"][n_song]
+            if ranks is not None and self.columns["rank"][n_song] not in ranks:
+                continue
+            if medias is not None and self.columns["media"][n_song] not in medias:
+                continue
+            if (first is not None and (date is None or date < first)) or (
+                last is not None and (date is None or date > last)
+            ):
+                continue
+            result = {column: values[n_song] for column, values in self.columns.items()}
+            result["score"] = scores[n_song]
+            results.append(result)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
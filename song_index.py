@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import unicodedata
+import numpy as np
+
+# Columns hashed by default, the ones the scripts look songs up by
+indexed_columns = ["live_title", "htmlID", "songID", "rank", "media", "tempo"]
+
+
+class SongIndex:
+    """
+    Hash indexes over the columns of a song DataFrame, built once and queried by value.
+
+    Each indexed column maps its values to the sorted positions of the rows holding them, so a lookup
+    costs one dict access instead of a full scan of the DataFrame. Slices are taken with `df.iloc` and
+    keep the labels and order of `df`, as `df.query` would.
+    """
+
+    def __init__(self, df, columns=indexed_columns):
+        """
+        Builds the hash index of each column, in one grouped pass per column.
+
+        Parameters:
+        df (pd.DataFrame): The DataFrame containing song data.
+        columns (list): The columns to index. Default is `indexed_columns`.
+        """
+        self.df = df
+        self.positions = {
+            column: df.groupby(column, observed=True, sort=False).indices
+            for column in columns
+            if column in df.columns
+        }
+
+    def get_positions(self, column, values):
+        """
+        Returns the positions of the rows whose `column` holds one of the given values.
+
+        Parameters:
+        column (str): The indexed column.
+        values: A value, or a list of values.
+
+        Returns:
+        np.ndarray: The sorted row positions.
+        """
+        if column not in self.positions:
+            raise KeyError(f"{column} is not indexed")
+        index = self.positions[column]
+        if not isinstance(values, (list, tuple, set)):
+            return index.get(values, np.empty(0, dtype=np.intp))
+        found = [index[value] for value in values if value in index]
+        if not found:
+            return np.empty(0, dtype=np.intp)
+        return np.sort(np.concatenate(found))
+
+    def select_positions(self, **filters):
+        """
+        Returns the positions of the rows matching every filter, see `select`.
+        """
+        positions = None
+        for column, values in filters.items():
+            column_positions = self.get_positions(column, values)
+            if positions is None:
+                positions = column_positions
+            else:
+                positions = np.intersect1d(
+                    positions, column_positions, assume_unique=True
+                )
+        if positions is None:
+            return np.arange(len(self.df))
+        return positions
+
+    def select(self, **filters):
+        """
+        Returns the rows matching every filter, e.g. `select(rank="S", media=["YouTube", "Live"])`.
+
+        Parameters:
+        **filters: The values to match for each indexed column, a value or a list of values.
+
+        Returns:
+        pd.DataFrame: The matching rows of the DataFrame.
+        """
+        return self.df.iloc[self.select_positions(**filters)]
+
+    def count(self, **filters):
+        """
+        Returns the number of rows matching every filter, see `select`.
+        """
+        return len(self.select_positions(**filters))
+
+    def get(self, column, value):
+        """
+        Returns the rows whose `column` holds `value` (e.g. every song of a stream for "live_title").
+
+        Parameters:
+        column (str): The indexed column.
+        value: The value to look up.
+
+        Returns:
+        pd.DataFrame: The matching rows of the DataFrame.
+        """
+        return self.df.iloc[self.get_positions(column, value)]
+
+
+def normalize_name(name):
+    """
+    Normalizes a song name for fuzzy matching: accents folded, lowercase, punctuation and spaces collapsed.
+
+    Parameters:
+    name (str): The song name.
+
+    Returns:
+    str: The normalized name.
+    """
+    name = unicodedata.normalize("NFKD", str(name))
+    name = "".join(char for char in name if not unicodedata.combining(char))
+    return " ".join("".join(c if c.isalnum() else " " for c in name.casefold()).split())
+
+
+def get_trigrams(name):
+    """
+    Returns the set of character trigrams of a normalized name, padded so that short names have some.
+    """
+    padded = f"  {name} "
+    return {padded[i : i + 3] for i in range(len(padded) - 2)}
+
+
+def get_edit_distance(a, b):
+    """
+    Returns the Levenshtein distance between two strings.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(
+                min(
+                    previous[j] + 1,
+                    current[j - 1] + 1,
+                    previous[j - 1] + (char_a != char_b),
+                )
+            )
+        previous = current
+    return previous[-1]
+
+
+class SongNameIndex:
+    """
+    Name index of a song DataFrame, resolving lists of song names by exact lookup then fuzzy matching.
+
+    Exact names are looked up in a hash index. Names without an exact match are looked up by their
+    normalized form (case, accents and punctuation ignored), and otherwise get suggestions: candidates
+    sharing trigrams with the name, ranked by edit-distance similarity.
+    """
+
+    def __init__(self, df):
+        """
+        Builds the exact, normalized and trigram indexes over the distinct song names.
+
+        Parameters:
+        df (pd.DataFrame): The DataFrame containing song data with "name" and "htmlID" columns.
+        """
+        self.df = df
+        self.positions = df.groupby("name", observed=True, sort=False).indices
+        self.names = list(self.positions)
+        self.normalized = {}
+        self.trigrams = {}
+        for name in self.names:
+            normalized = normalize_name(name)
+            self.normalized.setdefault(normalized, []).append(name)
+            for trigram in get_trigrams(normalized):
+                self.trigrams.setdefault(trigram, set()).add(normalized)
+
+    def get_suggestions(self, name, n_suggestions=3, min_similarity=0.5):
+        """
+        Returns the names of the index closest to a name, by trigram retrieval then edit distance.
+
+        Parameters:
+        name (str): The name to match.
+        n_suggestions (int): The maximum number of suggestions. Default is 3.
+        min_similarity (float): The minimum similarity (1 - edit distance / length) of a suggestion.
+
+        Returns:
+        list: The (name, similarity) pairs of the suggestions, most similar first.
+        """
+        normalized = normalize_name(name)
+        trigrams = get_trigrams(normalized)
+        shared = {}
+        for trigram in trigrams:
+            for candidate in self.trigrams.get(trigram, ()):
+                shared[candidate] = shared.get(candidate, 0) + 1
+
+        # Only the candidates sharing the most trigrams go through the edit distance
+        candidates = sorted(shared, key=lambda candidate: -shared[candidate])
+        suggestions = []
+        for candidate in candidates[: max(20, n_suggestions)]:
+            length = max(len(normalized), len(candidate), 1)
+            similarity = 1 - get_edit_distance(normalized, candidate) / length
+            if similarity >= min_similarity:
+                for candidate_name in self.normalized[candidate]:
+                    suggestions.append((candidate_name, round(similarity, 3)))
+        suggestions.sort(key=lambda suggestion: -suggestion[1])
+        return suggestions[:n_suggestions]
+
+    def lookup(self, names, n_suggestions=3, min_similarity=0.5):
+        """
+        Resolves a list of song names in one pass.
+
+        Parameters:
+        names (list): The song names to look up.
+        n_suggestions (int): The maximum number of suggestions for a name without match. Default is 3.
+        min_similarity (float): The minimum similarity of a suggestion, see `get_suggestions`.
+
+        Returns:
+        list: For each name, a dict with the "name" looked up, the "matches" found as (htmlID, name)
+              pairs in DataFrame order (empty if none) and the "suggestions" as (name, similarity) pairs.
+        """
+        htmlIDs = self.df["htmlID"].to_numpy()
+        song_names = self.df["name"].to_numpy()
+        results = []
+        for name in names:
+            positions = self.positions.get(name)
+            if positions is None:
+                matched = self.normalized.get(normalize_name(name), [])
+                if matched:
+                    positions = np.sort(
+                        np.concatenate([self.positions[match] for match in matched])
+                    )
+            if positions is not None:
+                matches = [(htmlIDs[n], song_names[n]) for n in positions]
+                suggestions = []
+            else:
+                matches = []
+                suggestions = self.get_suggestions(name, n_suggestions, min_similarity)
+            results.append(
+                {"name": name, "matches": matches, "suggestions": suggestions}
+            )
+        return results
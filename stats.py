@@ -0,0 +1,161 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import dataclasses
+import pandas as pd
+from rollup import build_rollup
+from profiling import profiled
+
+ranks = ["S", "A+", "A", "B+", "B", "C+", "C", "D", "I"]
+
+# Streams expected to be ranked in the end (lives + extra streams)
+expected_streams = 108 + 25
+
+
+@dataclasses.dataclass
+class SongStats:
+    """
+    Aggregates of a song DataFrame, computed by `get_song_stats`.
+
+    Lengths are pd.Timedelta objects, written as seconds by `to_dict` and `to_json`.
+    """
+
+    n_songs: int
+    rank_counts: dict
+    rank_lengths: dict
+    n_streams: int
+    total_length: pd.Timedelta
+    avg_length_per_stream: pd.Timedelta
+    longest_stream_length: pd.Timedelta
+    longest_stream_title: str
+    longest_stream_htmlID: str
+    avg_song_length: pd.Timedelta
+    longest_song_length: pd.Timedelta
+    longest_song_name: str
+    avg_songs_per_stream: float
+    max_songs_per_stream: int
+    max_songs_stream_title: str
+    estimated_streams_left: int
+    estimated_songs_left: float
+    estimated_length_left: pd.Timedelta
+    streams: list
+
+    def to_dict(self):
+        """
+        Returns the stats as JSON-serializable values, with lengths in seconds.
+
+        Returns:
+        dict: The stats.
+        """
+        return _to_json_value(dataclasses.asdict(self))
+
+    def to_json(self, path=None, indent=None):
+        """
+        Serializes the stats to JSON.
+
+        Parameters:
+        path (str): The file to write the JSON to. If None, only returns it.
+        indent (int): The indentation of the JSON. Default is None (compact).
+
+        Returns:
+        str: The JSON string.
+        """
+        json_str = json.dumps(self.to_dict(), indent=indent, ensure_ascii=False)
+        if path is not None:
+            with open(path, "w") as f:
+                f.write(json_str)
+        return json_str
+
+
+def _to_json_value(value):
+    """
+    Converts the lengths (as seconds) and numpy scalars of a stats value to JSON types, recursively.
+    """
+    if isinstance(value, dict):
+        return {str(key): _to_json_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_to_json_value(item) for item in value]
+    if isinstance(value, pd.Timedelta):
+        return value.total_seconds()
+    if pd.isna(value):
+        return None
+    if hasattr(value, "item"):
+        return value.item()
+    return value
+
+
+@profiled
+def get_song_stats(df, rollup=None):
+    """
+    Computes the song, stream and rank statistics of a DataFrame from its rollup.
+
+    The per-stream, per-title and per-rank aggregates are rolled up from the cube and the stream
+    totals of `rollup.Rollup`, so their number of rows is tiny and the songs are never scanned again.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+    rollup (rollup.Rollup): The rollup of `df`, built if None. Default is None.
+
+    Returns:
+    SongStats: The statistics of the songs.
+    """
+    if rollup is None:
+        rollup = build_rollup(df)
+    streams = rollup.streams
+
+    by_stream = streams.groupby("htmlID", observed=True)[
+        ["n_songs", "length_sum"]
+    ].sum()
+    by_title = streams.groupby("live_title", observed=True)[
+        ["n_songs", "length_sum"]
+    ].sum()
+    by_rank = rollup.aggregate(["rank"])
+
+    n_songs = int(streams["n_songs"].sum())
+    n_streams = len(by_stream)
+    total_length = streams["length_sum"].sum()
+    avg_length_per_stream = total_length / n_streams
+    avg_songs_per_stream = n_songs / n_streams
+    estimated_streams_left = expected_streams - n_streams
+
+    # One row per (htmlID, live_title) pair, in htmlID order
+    by_pair = streams.groupby(["htmlID", "live_title"], observed=True)[
+        ["n_songs", "length_sum"]
+    ].sum()
+
+    # Longest song, the first one in DataFrame order on ties
+    longest_song_length = streams["longest_song_length"].max()
+    longest_song = streams[streams["longest_song_length"] == longest_song_length]
+    longest_song = longest_song.sort_values("longest_song_position").iloc[0]
+
+    return SongStats(
+        n_songs=n_songs,
+        rank_counts={rank: int(by_rank["n_songs"].get(rank, 0)) for rank in ranks},
+        rank_lengths={
+            rank: by_rank["length_sum"].get(rank, pd.Timedelta(0)) for rank in ranks
+        },
+        n_streams=n_streams,
+        total_length=total_length,
+        avg_length_per_stream=avg_length_per_stream,
+        longest_stream_length=by_stream["length_sum"].max(),
+        longest_stream_title=by_title["length_sum"].idxmax(),
+        longest_stream_htmlID=by_stream["length_sum"].idxmax(),
+        avg_song_length=total_length / n_songs,
+        longest_song_length=longest_song_length,
+        longest_song_name=longest_song["longest_song_name"],
+        avg_songs_per_stream=avg_songs_per_stream,
+        max_songs_per_stream=int(by_title["n_songs"].max()),
+        max_songs_stream_title=by_title["n_songs"].idxmax(),
+        estimated_streams_left=estimated_streams_left,
+        estimated_songs_left=estimated_streams_left * avg_songs_per_stream,
+        estimated_length_left=estimated_streams_left * avg_length_per_stream,
+        streams=[
+            {
+                "htmlID": htmlID,
+                "live_title": live_title,
+                "n_songs": int(stream["n_songs"]),
+                "length": stream["length_sum"],
+            }
+            for (htmlID, live_title), stream in by_pair.iterrows()
+        ],
+    )
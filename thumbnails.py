@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import abc
+import json
+import time
+import subprocess
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from profiling import profiled, stage
+
+thumbnails_file = "data/thumbnails.json"
+# Former registry, migrated to `thumbnails_file` on first use
+legacy_thumbnails_file = "data/thumbnails.yaml"
+
+# Registry of each file, kept for the whole run, see `get_thumbnail_registry`
+_registries = {}
+
+# Concurrent requests, seconds before a request is abandoned and attempts of each stream
+prefetch_workers = 8
+prefetch_timeout = 30.0
+prefetch_retries = 2
+
+# Errors worth retrying: network errors and timeouts (requests exceptions and socket timeouts are
+# OSErrors), and the failures of youtube-dl
+retried_errors = (OSError, subprocess.TimeoutExpired, subprocess.CalledProcessError)
+
+
+def get_file_fingerprint(path):
+    """
+    Returns the (size, mtime_ns) of a file, or None if it does not exist.
+    """
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns)
+
+
+class ThumbnailRegistry:
+    """
+    The picture link of each stream, {htmlID: link}, loaded once and written back in a single atomic write.
+
+    New links are kept in memory until `flush`, which rewrites the file once whatever the number of
+    new links. Used as a context manager, the registry is flushed on exit, errors included, so that
+    the links already resolved are never lost.
+    """
+
+    def __init__(self, path=thumbnails_file, legacy_path=legacy_thumbnails_file):
+        """
+        Parameters:
+        path (str): The JSON file of the registry.
+        legacy_path (str): The YAML registry read when `path` does not exist yet.
+        """
+        self.path = path
+        self.links = {}
+        self.n_new = 0
+        with stage("thumbnails.load", "io"):
+            if os.path.exists(path):
+                with open(path, "r") as f:
+                    self.links = json.load(f)
+            elif legacy_path is not None and os.path.exists(legacy_path):
+                import yaml
+
+                with open(legacy_path, "r") as f:
+                    self.links = yaml.safe_load(f) or {}
+                print(f"Migrating {len(self.links)} thumbnails from {legacy_path}")
+                # Written at once, so that the next runs read `path` even if no link is added
+                self.n_new = len(self.links)
+        self.fingerprint = get_file_fingerprint(path)
+        if self.n_new:
+            self.flush()
+
+    def __contains__(self, htmlID):
+        return htmlID in self.links
+
+    def __getitem__(self, htmlID):
+        return self.links[htmlID]
+
+    def __setitem__(self, htmlID, link):
+        self.links[htmlID] = link
+        self.n_new += 1
+
+    def __len__(self):
+        return len(self.links)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.flush()
+        return False
+
+    @profiled
+    def flush(self):
+        """
+        Writes the registry if links were added since the last flush, through a temporary file.
+        """
+        if not self.n_new:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path + ".tmp", "w") as f:
+            json.dump(self.links, f, indent=0, sort_keys=True)
+        os.replace(self.path + ".tmp", self.path)
+        print(f"{self.n_new} thumbnail(s) saved to {self.path}")
+        self.n_new = 0
+        self.fingerprint = get_file_fingerprint(self.path)
+
+
+def get_thumbnail_registry(path=thumbnails_file, legacy_path=legacy_thumbnails_file):
+    """
+    Returns the registry of a file, loaded on the first call of the run and again only if the file
+    was changed by another program.
+
+    Parameters:
+    path (str): The JSON file of the registry.
+    legacy_path (str): The YAML registry migrated when `path` does not exist yet.
+
+    Returns:
+    ThumbnailRegistry: The registry.
+    """
+    registry = _registries.get(path)
+    if registry is None or (
+        registry.n_new == 0 and registry.fingerprint != get_file_fingerprint(path)
+    ):
+        registry = _registries[path] = ThumbnailRegistry(path, legacy_path)
+    return registry
+
+
+class ThumbnailResolver(abc.ABC):
+    """
+    Resolves the picture link of a stream from the URL of its first song. Subclasses implement `resolve`.
+    """
+
+    @abc.abstractmethod
+    def resolve(self, url, timeout=prefetch_timeout):
+        """
+        Parameters:
+        url (str): The URL of the first song of the stream.
+        timeout (float): The time (seconds) after which the request is abandoned.
+
+        Returns:
+        str: The picture link.
+        """
+
+
+class NetworkResolver(ThumbnailResolver):
+    """
+    Fetches the thumbnails of Twitch streams with youtube-dl, and of YouTube streams with pythumb.
+    """
+
+    def resolve(self, url, timeout=prefetch_timeout):
+        if "twitch" in url:
+            return subprocess.run(
+                ["youtube-dl", "--get-thumbnail", url],
+                check=True,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            ).stdout
+
+        from pythumb import Thumbnail
+        from database import get_live_code
+
+        return Thumbnail(f"https://www.youtube.com/watch?v={get_live_code(url)}").fetch(
+            url=True, timeout=timeout
+        )
+
+
+class StubResolver(ThumbnailResolver):
+    """
+    Builds a picture link from the URL alone, without any request, for tests and benchmarks.
+    Use it with a throwaway registry: its links are not the real ones for Twitch streams.
+    """
+
+    def __init__(self, delay=0.0):
+        """
+        Parameters:
+        delay (float): The time (seconds) each resolution takes, to simulate the network. Default is 0.
+        """
+        self.delay = delay
+
+    def resolve(self, url, timeout=prefetch_timeout):
+        if self.delay:
+            time.sleep(min(self.delay, timeout))
+        if "twitch" in url:
+            return "https://static-cdn.jtvnw.net/cf_vods/stub/thumb.jpg"
+        from database import get_live_code
+
+        return f"https://i.ytimg.com/vi/{get_live_code(url)}/maxresdefault.jpg"
+
+
+def resolve_with_retries(resolver, url, timeout, retries):
+    """
+    Resolves a picture link, retrying after 1 s, 2 s, 4 s... on network errors and timeouts.
+    Other errors (e.g. a video without thumbnail) are raised at once.
+
+    Returns:
+    str: The picture link.
+    """
+    for attempt in range(retries + 1):
+        try:
+            return resolver.resolve(url, timeout=timeout)
+        except retried_errors:
+            if attempt == retries:
+                raise
+            time.sleep(2**attempt)
+
+
+@profiled
+def prefetch_thumbnails(
+    df,
+    thumbnails=None,
+    resolver=None,
+    workers=prefetch_workers,
+    timeout=prefetch_timeout,
+    retries=prefetch_retries,
+):
+    """
+    Resolves the picture links missing from the registry for the streams of a DataFrame, concurrently,
+    and saves them.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+    thumbnails (ThumbnailRegistry): The registry to complete. If None, uses the registry of data/thumbnails.json.
+    resolver (ThumbnailResolver): The resolver of the links. If None, fetches them with `NetworkResolver`.
+    workers (int): The maximum number of concurrent resolutions.
+    timeout (float): The time (seconds) after which a request is abandoned.
+    retries (int): The number of retries of a failed resolution.
+
+    Returns:
+    dict: The {htmlID: error} of the streams whose link could not be resolved.
+    """
+    if thumbnails is None:
+        thumbnails = get_thumbnail_registry()
+    if resolver is None:
+        resolver = NetworkResolver()
+
+    # The album of a stream starts with its first song, see `database.get_albums`
+    first_songs = df[df["live_title"].ne(df["live_title"].shift())]
+    missing = {
+        htmlID: url
+        for htmlID, url in zip(first_songs["htmlID"], first_songs["URL"])
+        if htmlID not in thumbnails
+    }
+    if not missing:
+        return {}
+
+    print(f"Fetching {len(missing)} thumbnail(s)")
+    errors = {}
+    with thumbnails, ThreadPoolExecutor(min(workers, len(missing))) as pool:
+        futures = {
+            pool.submit(resolve_with_retries, resolver, url, timeout, retries): htmlID
+            for htmlID, url in missing.items()
+        }
+        for future in as_completed(futures):
+            htmlID = futures[future]
+            try:
+                thumbnails[htmlID] = future.result()
+            except Exception as error:
+                errors[htmlID] = error
+                print(
+                    f"Thumbnail of {htmlID} not fetched: {type(error).__name__}: {error}"
+                )
+    return errors
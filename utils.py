@@ -1,11 +1,21 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
-import sys
+import os
+import json
 import math
-import openpyxl
+import pickle
+import hashlib
+import multiprocessing
 import numpy as np
 import datetime
 import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from stats import get_song_stats
+from profiling import profiled
+
+blocks_cache_dir = ".cache/blocks"
+# Songs of the stream blocks parsed by incremental runs of this process, {blocks file: {(media, hash): songs}}
+stream_blocks_memory = {}
 
 
 months_to_num = {
@@ -24,9 +34,57 @@ months_to_num = {
 }
 
 
+# Columns of the song DataFrame, in order
+song_columns = [
+    "songID",
+    "rank",
+    "htmlID",
+    "length",
+    "length_DT",
+    "media",
+    "date_str",
+    "date_DT",
+    "date_YM_DT",
+    "name",
+    "tempo",
+    "comment",
+    "choral",
+    "genre",
+    "URL",
+    "when_ranked_DT",
+    "when_ranked_YM_DT",
+    "live_title",
+    "live_comment",
+]
+
+# Raw columns extracted from the workbooks, in the order of the Song arguments
+raw_song_columns = [
+    "name",
+    "media",
+    "live_date",
+    "rank",
+    "genre",
+    "tempo",
+    "length",
+    "comment",
+    "choral",
+    "URL",
+    "when_ranked",
+    "live_title",
+    "live_comment",
+]
+
+# dtypes pandas gives to datetime/timedelta objects (depends on the pandas version)
+datetime_dtype = pd.Series([datetime.datetime(2000, 1, 1)]).dtype
+timedelta_dtype = pd.Series([datetime.timedelta(0)]).dtype
+
+
 class Song:
     """
-    A class to represent a song with various attributes and methods to format and process these attributes.
+    A class to represent a song with various attributes, kept as a view over `build_songs_df` for compatibility.
+
+    The songs of a workbook are built column by column with `build_songs_df`, creating a Song
+    gives the same attributes for a single song.
 
     Attributes:
     -----------
@@ -38,15 +96,15 @@ class Song:
         A unique identifier for the song based on its live date and media type.
     length : str
         The length of the song, formatted appropriately.
-    length_DT : datetime.timedelta
+    length_DT : pd.Timedelta
         The length of the song as a timedelta object.
     media : str
         The media type of the song (e.g., YouTube, Live, Twitch).
     date_str : str
         The date string derived from the htmlID and media type.
-    date_DT : datetime.datetime
+    date_DT : pd.Timestamp
         The date of the song as a datetime object.
-    date_YM_DT : datetime.datetime
+    date_YM_DT : pd.Timestamp
         The year and month of the song's date as a datetime object.
     name : str
         The name of the song, formatted appropriately.
@@ -60,9 +118,9 @@ class Song:
         The genre of the song.
     URL : str
         The URL of the song.
-    when_ranked_DT : datetime.datetime
+    when_ranked_DT : pd.Timestamp
         The date when the song was ranked as a datetime object.
-    when_ranked_YM_DT : datetime.datetime
+    when_ranked_YM_DT : pd.Timestamp
         The year and month when the song was ranked as a datetime object.
     live_title : str
         The live title of the song.
@@ -86,39 +144,15 @@ class Song:
         live_title,
         live_comment,
     ):
-        self.songID = self.get_songID(name)
-        self.rank = self.format_rank(rank)
-        self.htmlID = self.get_htmlID(live_date, media)
-        self.length = self.format_length(length, self.songID)
-        self.length_DT = self.get_length_DT(self.length)
-        self.media = media
-        self.date_str = self.get_date_str(self.htmlID, media)
-        self.date_DT = datetime.datetime(
-            year=int("20" + self.date_str[0:2]),
-            month=int(self.date_str[2:4]),
-            day=int(self.date_str[4:6]),
-        )
-        self.date_YM_DT = datetime.datetime(
-            year=self.date_DT.year, month=self.date_DT.month, day=1
+        raw_song = locals()
+        song = build_songs_df(
+            {column: [raw_song[column]] for column in raw_song_columns}
         )
-        self.name = self.format_name(name)
-        self.tempo = self.format_tempo(tempo)
-        self.comment = self.format_comment(comment)
-        self.choral = self.format_choral(choral)
-        self.genre = genre
-        self.URL = URL
-        self.when_ranked_DT = datetime.datetime(
-            year=int("20" + str(when_ranked)[0:2]),
-            month=int(str(when_ranked)[2:4]),
-            day=int(str(when_ranked)[4:6]),
-        )
-        self.when_ranked_YM_DT = datetime.datetime(
-            year=self.when_ranked_DT.year, month=self.when_ranked_DT.month, day=1
-        )
-        self.live_title = live_title
-        self.live_comment = self.format_live_comment(live_comment)
+        for column in song_columns:
+            setattr(self, column, song[column].iloc[0])
 
-    def get_htmlID(self, live_date, media):
+    @staticmethod
+    def get_htmlID(live_date, media):
         """
         Generates a unique htmlID based on the live date and media type.
 
@@ -138,23 +172,8 @@ class Song:
         elif media == "Twitch":
             return f"s{live_date}"
 
-    def get_date_str(self, htmlID, media):
-        """
-        Extracts the date string from the htmlID based on the media type.
-
-        Parameters:
-        htmlID (str): The htmlID of the song.
-        media (str): The media type of the song (e.g., YouTube, Live, Twitch).
-
-        Returns:
-        str: The extracted date string.
-        """
-        if media == "YouTube":
-            return htmlID[1:]
-        elif media in ["Live", "Twitch"]:
-            return htmlID[1:-1]
-
-    def get_length_DT(self, length):
+    @staticmethod
+    def get_length_DT(length):
         """
         Converts the length of the song from a string to a timedelta object.
 
@@ -164,7 +183,7 @@ class Song:
         Returns:
         datetime.timedelta: The length of the song as a timedelta object.
         """
-        if (length not in [np.nan]) and len(length) > 3:
+        if not pd.isna(length) and len(length) > 3:
             if length[1] == "'":
                 return datetime.timedelta(
                     minutes=int(length[0]), seconds=int(length[2] + length[3])
@@ -179,7 +198,8 @@ class Song:
         else:
             return datetime.timedelta(minutes=0, seconds=0)
 
-    def format_tempo(self, tempo):
+    @staticmethod
+    def format_tempo(tempo):
         """
         Formats the tempo of the song.
 
@@ -219,180 +239,419 @@ class Song:
         else:
             raise ValueError(f"Unknown tempo: {tempo}")
 
-    def format_comment(self, comment):
-        """
-        Formats the comment associated with the song.
 
-        Parameters:
-        comment (str): The comment associated with the song.
+def map_unique(function, *columns):
+    """
+    Applies a scalar function once per distinct combination of values and maps the results back onto every row.
 
-        Returns:
-        str: The formatted comment.
-        """
-        for c in ["\n", '"']:
-            comment = comment.replace(c, "")
-        comment.replace("…", "...")
-        return comment
+    Parameters:
+    function (callable): The function to apply, taking one value per column.
+    *columns (array-like): The columns holding the function arguments.
 
-    def format_choral(self, choral):
-        """
-        Formats the choral information of the song.
+    Returns:
+    np.ndarray: An object array with the result of each row.
+    """
+    codes, uniques = factorize_columns(*columns)
+    mapped = np.empty(len(uniques), dtype=object)
+    mapped[:] = [function(*key) for key in uniques]
+    return mapped[codes]
 
-        Parameters:
-        choral (str): The choral information of the song.
 
-        Returns:
-        str: The formatted choral information.
-        """
+def factorize_columns(*columns):
+    """
+    Encodes each row by its distinct combination of values.
+
+    Parameters:
+    *columns (array-like): The columns to encode.
+
+    Returns:
+    tuple: The code of each row and the list of distinct combinations (as tuples).
+    """
+    keys = np.empty(len(columns[0]), dtype=object)
+    keys[:] = list(zip(*columns))
+    codes, uniques = pd.factorize(keys, use_na_sentinel=False)
+    return codes, list(uniques)
+
+
+def parse_date_str(date_str):
+    """
+    Converts "YYMMDD..." date strings to datetimes.
+
+    Parameters:
+    date_str (pd.Series): The date strings.
+
+    Returns:
+    pd.Series: The dates, with the datetime dtype of the song DataFrame.
+    """
+    return pd.to_datetime("20" + date_str.str[0:6], format="%Y%m%d").astype(
+        datetime_dtype
+    )
+
+
+def get_month_start(dates):
+    """
+    Returns the first day of the month of each date.
+
+    Parameters:
+    dates (pd.Series): The dates.
+
+    Returns:
+    pd.Series: The first days of the months, with the datetime dtype of the song DataFrame.
+    """
+    return pd.Series(
+        dates.to_numpy().astype("datetime64[M]"), index=dates.index
+    ).astype(datetime_dtype)
+
+
+@profiled
+def build_songs_df(raw_songs):
+    """
+    Builds the song DataFrame from the raw columns extracted from the workbooks, with column-wise operations.
+
+    Stream-level columns (htmlID, dates, ranking dates) are computed once per stream and mapped back
+    onto the songs, song-level columns with pandas string operations.
+
+    Parameters:
+    raw_songs (dict): The raw values of each song, as {column: list} with the columns of `raw_song_columns`.
+
+    Returns:
+    pd.DataFrame: A DataFrame with the `song_columns` of every song.
+    """
+    if len(raw_songs["name"]) == 0:
+        # Same schema as a non-empty result, so that it can be concatenated and deduplicated
+        dtypes = {
+            "length_DT": timedelta_dtype,
+            "date_DT": datetime_dtype,
+            "date_YM_DT": datetime_dtype,
+            "when_ranked_DT": datetime_dtype,
+            "when_ranked_YM_DT": datetime_dtype,
+        }
+        return pd.DataFrame(
+            {
+                column: pd.Series(dtype=dtypes.get(column, str))
+                for column in song_columns
+            }
+        )
+
+    raw = pd.DataFrame(
+        {
+            column: np.asarray(raw_songs[column], dtype=object)
+            for column in raw_song_columns
+        }
+    ).astype(object)
+    songs = {}
+
+    # Stream-level columns, computed once per (live date, media, ranking date)
+    stream_codes, stream_keys = factorize_columns(
+        raw["live_date"], raw["media"], raw["when_ranked"]
+    )
+    streams = pd.DataFrame(stream_keys, columns=["live_date", "media", "when_ranked"])
+    streams["htmlID"] = [
+        Song.get_htmlID(live_date, media)
+        for live_date, media in zip(streams["live_date"], streams["media"])
+    ]
+    streams["date_str"] = (
+        streams["htmlID"]
+        .str[1:]
+        .where(streams["media"] == "YouTube", streams["htmlID"].str[1:-1])
+    )
+    streams["date_DT"] = parse_date_str(streams["date_str"])
+    streams["date_YM_DT"] = get_month_start(streams["date_DT"])
+    streams["when_ranked_DT"] = parse_date_str(streams["when_ranked"].map(str))
+    streams["when_ranked_YM_DT"] = get_month_start(streams["when_ranked_DT"])
+    streams = streams.take(stream_codes).reset_index(drop=True)
+
+    # Remove punctuation and spaces from the name, and prefix IDs starting with a digit
+    songID = raw["name"].str.replace(r"[- '().\",&:!?\\/]", "", regex=True)
+    songs["songID"] = songID.where(
+        ~songID.str[0].str.isdigit().fillna(False).astype(bool), "n" + songID
+    )
+
+    rank = raw["rank"].str.replace("-", "I", regex=False)
+    songs["rank"] = rank.where(rank != "S I D", "D")
+    songs["htmlID"] = streams["htmlID"]
+
+    songs["length"] = raw["length"].where(songs["songID"] != "Dramaticevent", "14'30")
+    songs["length_DT"] = pd.Series(
+        map_unique(Song.get_length_DT, songs["length"])
+    ).astype(timedelta_dtype)
+    songs["media"] = raw["media"]
+    songs["date_str"] = streams["date_str"]
+    songs["date_DT"] = streams["date_DT"]
+    songs["date_YM_DT"] = streams["date_YM_DT"]
+
+    songs["name"] = raw["name"].str.replace('"', "", regex=False)
+    songs["tempo"] = pd.Series(map_unique(Song.format_tempo, raw["tempo"]))
+    songs["comment"] = raw["comment"].str.replace(r"[\n\"]", "", regex=True)
+
+    # Numbers (NaN included) mean there is no choral information
+    is_number = raw["choral"].map(lambda choral: isinstance(choral, (int, float)))
+    songs["choral"] = (
+        raw["choral"].where(~is_number, "-").str.replace("\n", "", regex=False)
+    )
+    songs["genre"] = raw["genre"]
+    songs["URL"] = raw["URL"]
+
+    songs["when_ranked_DT"] = streams["when_ranked_DT"]
+    songs["when_ranked_YM_DT"] = streams["when_ranked_YM_DT"]
+    songs["live_title"] = raw["live_title"]
+    songs["live_comment"] = raw["live_comment"].where(~raw["live_comment"].isna(), "-")
+
+    # Rebuild from object arrays so pandas infers the same dtypes as for a list of songs
+    # (copied, as the arrays returned by to_numpy can be read-only views)
+    return pd.DataFrame(
+        {
+            column: songs[column].to_numpy(
+                dtype=object if songs[column].dtype == object else None, copy=True
+            )
+            for column in song_columns
+        }
+    )
+
+
+@profiled
+def get_stream_blocks(rows, line_start=5, sheet=None):
+    """
+    Splits the rows of a sheet into stream blocks, using the same title/date detection as `get_df_from_xls`.
+
+    Parameters:
+    rows (dict): The rows of the sheet, as returned by `xls_reader.read_sheet_rows`.
+    line_start (int): The first row holding songs.
+    sheet (str): The name of the sheet, stored in each block. Default is None.
+
+    Returns:
+    list: A list of dicts with the "sheet", "title", "title_row", "first_row" (the first song row,
+          which holds the title), "last_row" (the last song row), "live_date" (the raw date cell) and
+          "hash" (the hash of every cell the block's songs depend on) of each stream block.
+    """
+    blocks = []
+    date_set = False
+
+    for n_line, (values, hyperlinks) in rows.items():
+        if n_line < line_start:
+            continue
+
+        song_name = np.nan if values[2] is None else values[2]
+        title_or_date = np.nan if values[0] is None else values[0]
+        if type(song_name) == int:
+            song_name = str(song_name)
+
+        # Skip rows where song_name is NaN
         try:
-            math.isnan(choral)
-            choral = "-"
+            math.isnan(song_name)
+            continue
         except:
-            pass
-        choral = choral.replace("\n", "")
-        return choral
+            # Check if the row contains a date or a title
+            try:
+                math.isnan(title_or_date)
+            except:
+                if date_set:
+                    date_set = False
+                else:
+                    blocks.append(
+                        {
+                            "sheet": sheet,
+                            "title": title_or_date,
+                            "title_row": n_line,
+                            "first_row": n_line,
+                            "last_row": None,
+                        }
+                    )
+                    date_set = True
 
-    def format_name(self, name):
-        """
-        Formats the name of the song.
+        if blocks:
+            blocks[-1]["last_row"] = n_line
 
-        Parameters:
-        name (str): The name of the song.
+    empty_row = ([None] * 10, [None] * 10)
+    for block in blocks:
+        # The date of the stream is written below its title
+        block["live_date"] = rows.get(block["first_row"] + 1, empty_row)[0][0]
+        sha = hashlib.sha1()
+        # The ditto marks of the first song refer to the row above the block
+        sha.update(repr(rows.get(block["first_row"] - 1, empty_row)[0][8]).encode())
+        # The date of a single-song block is read from the row below it
+        sha.update(repr(rows.get(block["first_row"] + 1, empty_row)[0][0]).encode())
+        for n_line in range(block["first_row"], block["last_row"] + 1):
+            if n_line in rows:
+                sha.update(repr(rows[n_line]).encode())
+        block["hash"] = sha.hexdigest()
 
-        Returns:
-        str: The formatted name.
-        """
-        name = name.replace('"', "")
-        return name
+    return blocks
 
-    def get_songID(self, name):
-        """
-        Generates a unique songID from the name of the song.
 
-        Parameters:
-        name (str): The name of the song.
+def write_block_index(xls_file, blocks, EN=False, blocks_dir=blocks_cache_dir):
+    """
+    Persists the stream-block index of a sheet, fingerprinted by the size and mtime of the workbook.
 
-        Returns:
-        str: The generated songID.
-        """
-        for c in [
-            "-",
-            " ",
-            "  ",
-            "'",
-            "(",
-            ")",
-            ".",
-            '"',
-            ",",
-            "&",
-            ":",
-            "!",
-            "?",
-            "\\",
-            "/",
-        ]:
-            name = name.replace(c, "")
-        if name[0].isdigit():
-            name = "n" + name
-        return name
+    Parameters:
+    xls_file (str): The path to the Excel file.
+    blocks (list): The stream blocks of the sheet, as returned by `get_stream_blocks`.
+    EN (bool): A flag to determine which sheet the blocks belong to (Sheet2 if True, Sheet1 otherwise).
+    blocks_dir (str): The folder storing the block indexes.
+    """
+    sheet = "Sheet2" if EN else "Sheet1"
+    index_file = f"{blocks_dir}/{os.path.basename(xls_file)}.{sheet}.index.json"
+    stat = os.stat(xls_file)
+    os.makedirs(blocks_dir, exist_ok=True)
+    with open(index_file + ".tmp", "w") as f:
+        json.dump(
+            {"fingerprint": [stat.st_size, stat.st_mtime_ns], "blocks": blocks},
+            f,
+            default=str,
+        )
+    os.replace(index_file + ".tmp", index_file)
 
-    def format_rank(self, rank):
-        """
-        Formats the rank of the song.
 
-        Parameters:
-        rank (str): The rank of the song.
+def load_block_index(xls_file, EN=False, blocks_dir=blocks_cache_dir):
+    """
+    Loads the stored stream-block index of a sheet, if the workbook is unchanged since it was written.
 
-        Returns:
-        str: The formatted rank.
-        """
-        rank = rank.replace("-", "I")
-        if rank == "S I D":
-            rank = "D"
-        return rank
+    Parameters:
+    xls_file (str): The path to the Excel file.
+    EN (bool): A flag to determine which sheet to index (Sheet2 if True, Sheet1 otherwise).
+    blocks_dir (str): The folder storing the block indexes.
 
-    def format_length(self, length, songID):
-        """
-        Formats the length of the song based on the songID.
+    Returns:
+    list: The stream blocks of the sheet (see `get_stream_blocks`), or None if the index is missing or stale.
+    """
+    sheet = "Sheet2" if EN else "Sheet1"
+    index_file = f"{blocks_dir}/{os.path.basename(xls_file)}.{sheet}.index.json"
+    stat = os.stat(xls_file)
+    try:
+        with open(index_file, "r") as f:
+            index = json.load(f)
+        if index["fingerprint"] == [stat.st_size, stat.st_mtime_ns]:
+            return index["blocks"]
+    except (FileNotFoundError, json.JSONDecodeError, KeyError):
+        pass
+    return None
+
+
+def get_block_index(xls_file, EN=False, blocks_dir=blocks_cache_dir):
+    """
+    Returns the stream-block index of a sheet, scanning the sheet only if the workbook changed
+    since the index was last written (by this function or by `get_df_from_xls`).
 
-        Parameters:
-        length (str): The length of the song as a string.
-        songID (str): The unique identifier of the song.
+    Parameters:
+    xls_file (str): The path to the Excel file.
+    EN (bool): A flag to determine which sheet to index (Sheet2 if True, Sheet1 otherwise).
+    blocks_dir (str): The folder storing the block indexes.
 
-        Returns:
-        str: The formatted length.
-        """
-        if songID == "Dramaticevent":
-            length = "14'30"
-        return length
+    Returns:
+    list: The stream blocks of the sheet, see `get_stream_blocks`.
+    """
+    blocks = load_block_index(xls_file, EN, blocks_dir)
+    if blocks is None:
+        from xls_reader import read_sheet_rows
 
-    def format_live_comment(self, live_comment):
-        """
-        Formats the live comment associated with the song.
+        sheet = "Sheet2" if EN else "Sheet1"
+        blocks = get_stream_blocks(read_sheet_rows(xls_file, sheet), sheet=sheet)
+        write_block_index(xls_file, blocks, EN, blocks_dir)
+    return blocks
 
-        Parameters:
-        live_comment (str): The live comment associated with the song.
 
-        Returns:
-        str: The formatted live comment.
-        """
-        if live_comment not in [np.nan]:
-            return live_comment
-        return "-"
+def get_stream_date(live_date, media):
+    """
+    Returns the date of a stream from the raw date cell of its block, as stored in the "date_DT" column.
 
+    Parameters:
+    live_date (str): The live date of the stream, as written below its title.
+    media (str): The media type of the stream (e.g., YouTube, Live, Twitch).
 
-def get_df_from_xls(xls_file, media=None, EN=False):
+    Returns:
+    datetime.datetime: The date of the stream.
     """
-    Extracts data from an Excel file and returns it as a pandas DataFrame.
+    htmlID = Song.get_htmlID(live_date, media)
+    date_str = htmlID[1:] if media == "YouTube" else htmlID[1:-1]
+    return datetime.datetime.strptime("20" + date_str[0:6], "%Y%m%d")
+
+
+def get_rank(rank):
+    """
+    Returns the rank of a song as stored in the "rank" column, from its raw value.
 
     Parameters:
-    xls_file (str): The path to the Excel file.
+    rank (str): The rank as written in the workbook (e.g. "A+", "-", "S I D").
+
+    Returns:
+    str: The rank of the song, or the raw value if it is not a string.
+    """
+    if not isinstance(rank, str):
+        return rank
+    rank = rank.replace("-", "I")
+    return "D" if rank == "S I D" else rank
+
+
+def filter_stream_blocks(blocks, media, stream_titles=None, date_range=None):
+    """
+    Keeps the stream blocks matching the title and date filters, before any of their songs are parsed.
+
+    Parameters:
+    blocks (list): The stream blocks of the sheet, see `get_stream_blocks`.
     media (str): The media type of the songs (e.g., YouTube, Live, Twitch).
-    EN (bool): A flag to determine which sheet to read from the workbook.
-               If False, reads from "Sheet1" (French). If True, reads from "Sheet2" (English).
+    stream_titles (list): The titles of the streams to keep. If None, keeps every title.
+    date_range (tuple): The (first, last) dates of the streams to keep, inclusive. Either bound can be None.
 
     Returns:
-    pd.DataFrame: A DataFrame containing the extracted song data.
+    list: The matching stream blocks.
     """
-    song_list = []
-    date_set = False
+    if stream_titles is not None:
+        stream_titles = set(stream_titles)
+        blocks = [block for block in blocks if block["title"] in stream_titles]
+
+    if date_range is not None:
+        first, last = [
+            None if date is None else pd.Timestamp(date) for date in date_range
+        ]
+        kept = []
+        for block in blocks:
+            try:
+                date = get_stream_date(block.get("live_date"), media)
+            except (TypeError, ValueError, KeyError, IndexError):
+                # Unreadable dates are kept, the full parse would fail on them anyway
+                kept.append(block)
+                continue
+            if (first is None or date >= first) and (last is None or date <= last):
+                kept.append(block)
+        blocks = kept
 
-    if media is None:
-        if "yt" in xls_file:
-            media = "YouTube"
-        elif "tw" in xls_file:
-            media = "Twitch"
-        elif "live" in xls_file:
-            media = "Live"
-    elif media not in ["YouTube", "Twitch", "Live"]:
-        raise ValueError("media must be one of 'YouTube', 'Twitch', or 'Live'")
+    return blocks
 
-    # Load the workbook and select the appropriate sheet
-    wrkbk = openpyxl.load_workbook(xls_file)
-    if not EN:
-        sh = wrkbk["Sheet1"]
-    else:
-        sh = wrkbk["Sheet2"]
 
-    line_start = 5
+def get_raw_songs_from_rows(rows, media, first_row, last_row):
+    """
+    Extracts the raw song values of the rows between `first_row` and `last_row` (usually a single stream block).
+
+    Parameters:
+    rows (dict): The rows of the sheet, as returned by `xls_reader.read_sheet_rows`.
+    media (str): The media type of the songs (e.g., YouTube, Live, Twitch).
+    first_row (int): The first row to read.
+    last_row (int): The last row to read.
+
+    Returns:
+    dict: The raw songs as {column: list}, with the columns of `raw_song_columns`.
+    """
+    raw_songs = {column: [] for column in raw_song_columns}
+    date_set = False
+    empty_row = ([None] * 10, [None] * 10)
+
+    # Iterate through the filled rows of the block
+    for n_line in range(first_row, last_row + 1):
+        if n_line not in rows:
+            continue
+        values, hyperlinks = rows[n_line]
 
-    # Iterate through the rows of the sheet
-    for n_line, row in enumerate(
-        sh.iter_rows(min_row=line_start, min_col=1, max_row=1500, max_col=10),
-        line_start,
-    ):
         line = []
-        for cell in row:
-            if cell.value is None:
+        for value in values:
+            if value is None:
                 line.append(np.nan)
             else:
-                line.append(cell.value)
+                line.append(value)
 
         # print(f"Reading line {n_line} : {line}")
 
-        if row[2].value is not None:
-            song_URL = row[2].hyperlink.target
+        if values[2] is not None:
+            song_URL = hyperlinks[2]
 
         title_or_date = line[0]
         song_name = line[2]
@@ -419,7 +678,7 @@ def get_df_from_xls(xls_file, media=None, EN=False):
                 else:
                     live_title = line[0]
                     live_comment = line[1]
-                    song_date = sh.cell(n_line + 1, 1).value
+                    song_date = rows.get(n_line + 1, empty_row)[0][0]
                     song_when_ranked = line[9]
                     if math.isnan(song_when_ranked):
                         song_when_ranked = 990101
@@ -430,11 +689,14 @@ def get_df_from_xls(xls_file, media=None, EN=False):
             math.isnan(song_choral)
         except:
             if '"' in song_choral:
-                song_choral = song_choral.replace('"', sh.cell(n_line - 1, 9).value)
+                song_choral = song_choral.replace(
+                    '"', rows.get(n_line - 1, empty_row)[0][8]
+                )
 
-        # Append the song information to the list
-        song_list.append(
-            Song(
+        # Append the song information to the columns
+        for column, value in zip(
+            raw_song_columns,
+            [
                 song_name,
                 media,
                 song_date,
@@ -448,80 +710,376 @@ def get_df_from_xls(xls_file, media=None, EN=False):
                 song_when_ranked,
                 live_title,
                 live_comment,
+            ],
+        ):
+            raw_songs[column].append(value)
+
+    return raw_songs
+
+
+@profiled
+def get_df_from_xls(
+    xls_file,
+    media=None,
+    EN=False,
+    reader="stream",
+    max_row=None,
+    incremental=False,
+    blocks_dir=blocks_cache_dir,
+    stream_titles=None,
+    medias=None,
+    date_range=None,
+    ranks=None,
+):
+    """
+    Extracts data from an Excel file and returns it as a pandas DataFrame.
+
+    The filters are applied while scanning the sheet: the songs of the stream blocks they exclude are
+    never parsed, and if the stored block index is up to date only the rows of the kept blocks are decoded.
+
+    Parameters:
+    xls_file (str): The path to the Excel file.
+    media (str): The media type of the songs (e.g., YouTube, Live, Twitch).
+    EN (bool): A flag to determine which sheet to read from the workbook.
+               If False, reads from "Sheet1" (French). If True, reads from "Sheet2" (English).
+    reader (str): The reader used to parse the workbook. "stream" (default) streams the sheet XML
+                  straight from the archive, "openpyxl" loads the full workbook with openpyxl.
+    max_row (int): The last row to read. If None, reads every filled row of the sheet.
+    incremental (bool): A flag to only rebuild the songs of the stream blocks that changed since the
+                        previous incremental run. The other songs are taken from memory, or from
+                        `blocks_dir` in a new process. Default is False: the sheet still has to be read
+                        and hashed, so it is not faster than a full parse (see
+                        benchmarks/bench_incremental.py).
+    blocks_dir (str): The folder storing the stream-block index of the sheet and, for incremental runs,
+                      the songs of each stream block.
+    stream_titles (list): The titles of the streams to keep. If None (default), keeps every stream.
+    medias (list): The media types to keep. If the workbook's media is not one of them, nothing is read.
+    date_range (tuple): The (first, last) dates of the streams to keep, inclusive. Either bound can be None.
+    ranks (list): The ranks of the songs to keep, as stored in the "rank" column (e.g. ["S", "A+"]).
+
+    Returns:
+    pd.DataFrame: A DataFrame containing the extracted song data.
+    """
+    if media is None:
+        if "yt" in xls_file:
+            media = "YouTube"
+        elif "tw" in xls_file:
+            media = "Twitch"
+        elif "live" in xls_file:
+            media = "Live"
+    elif media not in ["YouTube", "Twitch", "Live"]:
+        raise ValueError("media must be one of 'YouTube', 'Twitch', or 'Live'")
+
+    if medias is not None and media not in medias:
+        return build_songs_df({column: [] for column in raw_song_columns})
+
+    sheet = "Sheet2" if EN else "Sheet1"
+    line_start = 5
+    filter_blocks = stream_titles is not None or date_range is not None
+
+    # With an up-to-date block index, only the rows of the streams kept by the filters are decoded
+    blocks = None
+    min_row = None
+    if filter_blocks and reader == "stream" and max_row is None:
+        blocks = load_block_index(xls_file, EN, blocks_dir)
+    if blocks is not None:
+        kept = filter_stream_blocks(blocks, media, stream_titles, date_range)
+        if not kept:
+            return build_songs_df({column: [] for column in raw_song_columns})
+        # The row above a block holds its ditto marks, the row below a single song its date
+        min_row = min(block["first_row"] for block in kept) - 1
+        max_row = max(block["last_row"] for block in kept) + 1
+
+    # Read the filled rows of the appropriate sheet, openpyxl being only loaded when a workbook is read
+    from xls_reader import read_sheet_rows, read_sheet_rows_openpyxl
+
+    if reader == "stream":
+        rows = read_sheet_rows(
+            xls_file, sheet, max_col=10, min_row=min_row, max_row=max_row
+        )
+    elif reader == "openpyxl":
+        rows = read_sheet_rows_openpyxl(xls_file, sheet, max_col=10, max_row=max_row)
+    else:
+        raise ValueError("reader must be one of 'stream' or 'openpyxl'")
+
+    if blocks is None:
+        # Index the stream blocks of the sheet, shared with `database.make_html_tables`
+        blocks = get_stream_blocks(rows, line_start, sheet)
+        if max_row is None:
+            write_block_index(xls_file, blocks, EN, blocks_dir)
+        if filter_blocks:
+            kept = filter_stream_blocks(blocks, media, stream_titles, date_range)
+    if not filter_blocks:
+        kept = blocks
+
+    raw_songs = {column: [] for column in raw_song_columns}
+    if not incremental:
+        for block in kept:
+            block_songs = get_raw_songs_from_rows(
+                rows, media, block["first_row"], block["last_row"]
             )
+            for column in raw_song_columns:
+                raw_songs[column].extend(block_songs[column])
+    else:
+        # Reuse the songs of the unchanged stream blocks from the previous run
+        blocks_file = f"{blocks_dir}/{os.path.basename(xls_file)}.{sheet}.blocks.pkl"
+        previous_blocks = stream_blocks_memory.get(blocks_file)
+        if previous_blocks is None:
+            try:
+                with open(blocks_file, "rb") as f:
+                    previous_blocks = pickle.load(f)
+            except (FileNotFoundError, EOFError, pickle.UnpicklingError):
+                previous_blocks = {}
+
+        # A filtered run only parses some of the blocks, so it keeps the songs of the others that are
+        # still in the sheet. The blocks gone from the sheet are dropped.
+        current_blocks = {}
+        if filter_blocks:
+            sheet_keys = {(media, block["hash"]) for block in blocks}
+            current_blocks = {
+                key: songs
+                for key, songs in previous_blocks.items()
+                if key in sheet_keys
+            }
+        n_parsed = 0
+        for block in kept:
+            key = (media, block["hash"])
+            if key in previous_blocks:
+                current_blocks[key] = previous_blocks[key]
+            else:
+                current_blocks[key] = get_raw_songs_from_rows(
+                    rows, media, block["first_row"], block["last_row"]
+                )
+                n_parsed += 1
+            for column in raw_song_columns:
+                raw_songs[column].extend(current_blocks[key][column])
+        print(f"{xls_file} ({sheet}): {n_parsed}/{len(kept)} stream blocks parsed")
+
+        stream_blocks_memory[blocks_file] = current_blocks
+        if current_blocks.keys() != previous_blocks.keys():
+            os.makedirs(blocks_dir, exist_ok=True)
+            with open(blocks_file + ".tmp", "wb") as f:
+                pickle.dump(current_blocks, f)
+            os.replace(blocks_file + ".tmp", blocks_file)
+
+    # Drop the songs marked for deletion, skipping the song following each dropped one
+    names = raw_songs["name"]
+    kept_songs = list(range(len(names)))
+    for n_song in kept_songs:
+        if isinstance(names[n_song], str) and names[n_song].replace('"', "") == (
+            "DELETETHISSONG"
+        ):
+            kept_songs.remove(n_song)
+    if ranks is not None:
+        ranks = set(ranks)
+        kept_songs = [
+            n_song
+            for n_song in kept_songs
+            if get_rank(raw_songs["rank"][n_song]) in ranks
+        ]
+    if len(kept_songs) < len(names):
+        raw_songs = {
+            column: [values[n_song] for n_song in kept_songs]
+            for column, values in raw_songs.items()
+        }
+
+    return build_songs_df(raw_songs)
+
+
+def _get_df_from_xls_job(job):
+    """
+    Runs `get_df_from_xls` for one (xls_file, EN, kwargs) job of `get_dfs_from_xls`.
+
+    Returns the DataFrame and the entries of `stream_blocks_memory` the job replaced, for the parent
+    process to keep when the job runs in a forked worker.
+    """
+    xls_file, EN, kwargs = job
+    previous_memory = dict(stream_blocks_memory)
+    df = get_df_from_xls(xls_file, EN=EN, **kwargs)
+    return df, {
+        blocks_file: blocks
+        for blocks_file, blocks in stream_blocks_memory.items()
+        if previous_memory.get(blocks_file) is not blocks
+    }
+
+
+@profiled
+def get_dfs_from_xls(xls_files, sheets=(False,), processes=None, **kwargs):
+    """
+    Parses every (workbook, sheet) pair in parallel and returns one DataFrame per sheet.
+
+    Parameters:
+    xls_files (list): The paths to the Excel files, in concatenation order.
+    sheets (tuple): The EN flags of the sheets to read, (False,) for French only, (False, True) for both.
+    processes (int): The maximum number of worker processes. If None, uses one per pair (up to the CPU count).
+                     Pairs are parsed sequentially if 1 or if the platform cannot fork.
+    **kwargs: Additional arguments passed to `get_df_from_xls` (e.g. reader, incremental, stream_titles).
+
+    Returns:
+    dict: A mapping {EN flag: pd.DataFrame} holding the songs of all the workbooks for each sheet.
+    """
+    jobs = [(xls_file, EN, kwargs) for EN in sheets for xls_file in xls_files]
+    if processes is None:
+        processes = min(len(jobs), os.cpu_count() or 1)
+
+    # Workers are forked so that entry points don't need a __main__ guard
+    if processes > 1 and "fork" in multiprocessing.get_all_start_methods():
+        with ProcessPoolExecutor(
+            max_workers=processes, mp_context=multiprocessing.get_context("fork")
+        ) as executor:
+            results = list(executor.map(_get_df_from_xls_job, jobs))
+    else:
+        results = [_get_df_from_xls_job(job) for job in jobs]
+    dfs = []
+    for df, blocks_memory in results:
+        dfs.append(df)
+        stream_blocks_memory.update(blocks_memory)
+
+    # Concatenate each sheet once, in workbook order
+    return {
+        EN: pd.concat(
+            dfs[n_sheet * len(xls_files) : (n_sheet + 1) * len(xls_files)],
+            ignore_index=True,
         )
+        for n_sheet, EN in enumerate(sheets)
+    }
 
-    for song in song_list:
-        if song.name == "DELETETHISSONG":
-            song_list.remove(song)
 
-    # Convert the list of Song objects to a DataFrame
-    return pd.DataFrame([vars(v) for v in song_list])
+def get_songID_duplicates(df):
+    """
+    Finds the songIDs already used by a previous row, with a single counting pass over the rows.
 
+    The n-th occurrence (n > 1) of a songID, in row order, is renamed to songID + str(n).
 
-def get_unique_songID(df):
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data with a "songID" column.
+
+    Returns:
+    pd.DataFrame: One row per renamed song, indexed like `df`, with the "songID", its occurrence
+                  number "count" and the "new_songID".
+    """
+    count = df.groupby("songID", sort=False, observed=True).cumcount() + 1
+    duplicates = pd.DataFrame(
+        {"songID": df["songID"][count > 1], "count": count[count > 1]}
+    )
+    duplicates["new_songID"] = duplicates["songID"].astype(str) + duplicates[
+        "count"
+    ].astype(str)
+    return duplicates
+
+
+@profiled
+def get_unique_songID(df, verbose=True):
     """
     Ensures that each songID in the DataFrame is unique by appending a count to duplicate songIDs.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data with a "songID" column.
+    verbose (bool): A flag to print the duplicates found. Default is True.
 
     Returns:
     pd.DataFrame: The DataFrame with unique songIDs.
     """
-    print("\nChecking songIDs duplicates")
-    songIDs = []
-    for index, row in df.iterrows():
-        songID = row["songID"]
-        songIDs.append(songID)
-        if songIDs.count(songID) > 1:
-            print(f"\tMultiple {songID} ({songIDs.count(songID)})")
-            df.at[index, "songID"] = songID + str(songIDs.count(songID))
-    print("Done")
+    duplicates = get_songID_duplicates(df)
+    if verbose:
+        print("\nChecking songIDs duplicates")
+        for duplicate in duplicates.itertuples():
+            print(f"\tMultiple {duplicate.songID} ({duplicate.count})")
+        print("Done")
+    df.loc[duplicates.index, "songID"] = duplicates["new_songID"]
     return df
 
 
-def get_unique_htmlID(df):
+def get_htmlID_duplicates(df):
     """
-    Ensures that each songID in the DataFrame is unique by appending a count to duplicate htmlID.
+    Finds the streams sharing an htmlID (e.g. two streams on the same day), in one grouped pass.
+
+    Streams are the (live_title, htmlID) pairs, sorted by live_title then htmlID. The n-th stream
+    (n > 1) using an htmlID is renamed to htmlID + chr(64 + n), i.e. "B", "C", ...
 
     Parameters:
-    df (pd.DataFrame): The DataFrame.
+    df (pd.DataFrame): The DataFrame containing song data with "live_title" and "htmlID" columns.
 
     Returns:
-    pd.DataFrame: The DataFrame with unique htmlIDs.
+    pd.DataFrame: One row per stream, with its "live_title", "htmlID", number of songs "count",
+                  "occurrence" of the htmlID and "new_htmlID".
     """
-    print("\nChecking htmlIDs duplicates")
-    df_gb = (
+    streams = (
         df[["live_title", "htmlID"]]
-        .groupby(["live_title", "htmlID"])
+        .groupby(["live_title", "htmlID"], observed=True)
         .size()
         .reset_index(name="count")
     )
-    htmlIDs = []
-    live_to_update = []
-    for index, row in df_gb.iterrows():
-        htmlIDs.append(row["htmlID"])
-        if htmlIDs.count(row["htmlID"]) > 1:
+    streams["occurrence"] = streams.groupby("htmlID", observed=True).cumcount() + 1
+    streams["new_htmlID"] = (
+        streams["htmlID"]
+        .astype(str)
+        .where(
+            streams["occurrence"] == 1,
+            streams["htmlID"].astype(str)
+            # astype: the map of an empty Series keeps its int dtype
+            + streams["occurrence"]
+            .map(lambda occurrence: chr(64 + occurrence))
+            .astype(str),
+        )
+    )
+    return streams
+
+
+@profiled
+def get_unique_htmlID(df, verbose=True):
+    """
+    Ensures that each songID in the DataFrame is unique by appending a count to duplicate htmlID.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame.
+    verbose (bool): A flag to print the duplicates found. Default is True.
+
+    Returns:
+    pd.DataFrame: The DataFrame with unique htmlIDs.
+    """
+    streams = get_htmlID_duplicates(df)
+    duplicates = streams[streams["occurrence"] > 1]
+    if verbose:
+        print("\nChecking htmlIDs duplicates")
+        for duplicate in duplicates.itertuples():
             print(
-                f"\tMultiple {row['htmlID']} for {row['live_title']} ({htmlIDs.count(row['htmlID'])})"
+                f"\tMultiple {duplicate.htmlID} for {duplicate.live_title} ({duplicate.occurrence})"
             )
-            df_gb.at[index, "htmlID"] = row["htmlID"] + chr(
-                64 + htmlIDs.count(row["htmlID"])
-            )
-            live_to_update.append(row["live_title"])
-    for index, row in df.iterrows():
-        for index_gb, row_gb in df_gb.iterrows():
-            if (
-                row["live_title"] == row_gb["live_title"]
-                and row["htmlID"] != row_gb["htmlID"]
-                and row["live_title"] in live_to_update
-            ):
-                df.at[index, "htmlID"] = row_gb["htmlID"]
-    print("Done")
+
+    # Every song of a renamed stream's title takes the last new htmlID of that title
+    # differing from its own htmlID (titles are expected to hold a single stream)
+    resolved = {}
+    live_to_update = set(duplicates["live_title"])
+    title_streams = streams[streams["live_title"].isin(live_to_update)]
+    for live_title, group in title_streams.groupby("live_title", observed=True):
+        new_htmlIDs = list(group["new_htmlID"])
+        for htmlID in group["htmlID"]:
+            for new_htmlID in reversed(new_htmlIDs):
+                if new_htmlID != htmlID:
+                    resolved[(live_title, htmlID)] = new_htmlID
+                    break
+
+    if resolved:
+        mapping = pd.DataFrame(
+            [(*key, new_htmlID) for key, new_htmlID in resolved.items()],
+            columns=["live_title", "htmlID", "new_htmlID"],
+        )
+        new_htmlIDs = (
+            df[["live_title", "htmlID"]]
+            .astype(object)
+            .merge(mapping.astype(object), on=["live_title", "htmlID"], how="left")[
+                "new_htmlID"
+            ]
+        )
+        to_update = new_htmlIDs.notna().to_numpy()
+        df.loc[df.index[to_update], "htmlID"] = new_htmlIDs[to_update].to_numpy()
+    if verbose:
+        print("Done")
     return df
 
 
+@profiled
 def get_unique_IDs(df):
     """
     Ensures that each songID and htmlID in the DataFrame is unique by appending a count to duplicate IDs.
@@ -537,88 +1095,102 @@ def get_unique_IDs(df):
     return df
 
 
-def print_simple_stats(df):
+# Low-cardinality and stream-level columns stored as categoricals by `compact_songs_df`
+categorical_song_columns = [
+    "rank",
+    "htmlID",
+    "media",
+    "date_str",
+    "tempo",
+    "genre",
+    "live_title",
+    "live_comment",
+]
+
+
+@profiled
+def compact_songs_df(df):
+    """
+    Converts the song DataFrame to a compact schema, to be called once the IDs are unique.
+
+    Low-cardinality and stream-level columns become categoricals (one copy of each value plus
+    small integer codes). The other text columns are mostly unique and keep their string dtype.
+    Dates and lengths are already datetime64/timedelta64 columns.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+
+    Returns:
+    pd.DataFrame: The same data with the compact dtypes.
+    """
+    df = df.copy()
+    for column in categorical_song_columns:
+        if column in df.columns:
+            df[column] = df[column].astype("category")
+    return df
+
+
+@profiled
+def print_simple_stats(df, stats=None):
     """
     Prints simple statistics about the songs in the DataFrame.
 
     Parameters:
     df (pd.DataFrame): The DataFrame containing song data.
+    stats (stats.SongStats): The statistics of `df`, if already computed. Default is None.
 
     Prints:
     Various statistics including the count of songs by rank, number of live streams, total music length,
     average music time per stream, longest music time for a stream, average song length, longest song length,
     average number of songs per stream, highest number of songs for a stream, and estimated live streams and songs left to rank.
     """
+    if stats is None:
+        stats = get_song_stats(df)
+
     print("\n_______ Simple stats _______")
 
     # Print song counts by rank
-    ranks = ["S", "A+", "A", "B+", "B", "C+", "C", "D", "I"]
-    print(f"\nAny rank : ({len(df)})")
-    for rank in ranks:
-        print(f'{rank:>2} : ({len(df.query(f"rank == \'{rank}\'"))})')
+    print(f"\nAny rank : ({stats.n_songs})")
+    for rank, count in stats.rank_counts.items():
+        print(f"{rank:>2} : ({count})")
 
     # Print live stream statistics
-    num_streams = len(df.groupby("htmlID"))
-    total_length = df["length_DT"].sum()
-    avg_length_per_stream = total_length / num_streams
-    print(avg_length_per_stream)
-    longest_stream_length = (
-        df[["length_DT", "htmlID"]].groupby("htmlID").sum().max().iloc[0]
-    )
-    longest_stream_title = (
-        df[["length_DT", "live_title"]].groupby("live_title").sum().idxmax().iloc[0]
-    )
-    longest_stream_htmlID = (
-        df[["length_DT", "htmlID"]].groupby("htmlID").sum().idxmax().iloc[0]
-    )
-
-    print(f"\nNumber of Live Streams done: {num_streams} streams")
-    print(f"Total music ranked: {len(df)} songs")
-    print(f"Total music length ranked: {str(total_length)}\n")
-    print(f"Average music time per streams: {str(avg_length_per_stream)[7:15]}")
+    print(stats.avg_length_per_stream)
+    print(f"\nNumber of Live Streams done: {stats.n_streams} streams")
+    print(f"Total music ranked: {stats.n_songs} songs")
+    print(f"Total music length ranked: {str(stats.total_length)}\n")
+    print(f"Average music time per streams: {str(stats.avg_length_per_stream)[7:15]}")
     print(
-        f"Longest music time for a stream: {str(longest_stream_length)[7:15]}, {longest_stream_title}"
+        f"Longest music time for a stream: {str(stats.longest_stream_length)[7:15]}, {stats.longest_stream_title}"
     )
-    if longest_stream_htmlID != "s201209":
+    if stats.longest_stream_htmlID != "s201209":
         print("NEW RECORD!\n")
     else:
         print()
 
     # Print song length statistics
-    avg_song_length = total_length / len(df)
-    longest_song_length = df["length_DT"].max()
-    longest_song_name = df.loc[df["length_DT"].idxmax()]["name"]
-
-    print(f"Average song length: {str(avg_song_length)[7:15]}")
+    print(f"Average song length: {str(stats.avg_song_length)[7:15]}")
     print(
-        f"Longest song length: {str(longest_song_length)[7:15]} with {longest_song_name}\n"
+        f"Longest song length: {str(stats.longest_song_length)[7:15]} with {stats.longest_song_name}\n"
     )
 
     # Print song count per stream statistics
-    avg_songs_per_stream = len(df) / num_streams
-    max_songs_per_stream = (
-        df[["length_DT", "live_title"]].groupby("live_title").size().max()
-    )
-    max_songs_stream_title = (
-        df[["length_DT", "live_title"]].groupby("live_title").size().idxmax()
-    )
-
-    print(f"Average number of songs per stream: {avg_songs_per_stream:.2f} songs")
+    print(f"Average number of songs per stream: {stats.avg_songs_per_stream:.2f} songs")
     print(
-        f"Highest number of songs for a stream: {max_songs_per_stream} songs, {max_songs_stream_title}"
+        f"Highest number of songs for a stream: {stats.max_songs_per_stream} songs, {stats.max_songs_stream_title}"
     )
-    if longest_stream_htmlID != "s180211":
+    if stats.longest_stream_htmlID != "s180211":
         print("NEW RECORD!\n")
     else:
         print()
 
     # Print estimated remaining statistics
-    estimated_live_left = 108 + 25 - num_streams
-    estimated_songs_left = estimated_live_left * avg_songs_per_stream
-    estimated_length_left = estimated_live_left * avg_length_per_stream
-
-    print(f"Number of Live Stream left to rank (estimation): {estimated_live_left}")
-    print(f"Number of songs left to rank (estimation): {estimated_songs_left:.0f}")
     print(
-        f"Total music length left to rank (estimation): {str(estimated_length_left)}\n"
+        f"Number of Live Stream left to rank (estimation): {stats.estimated_streams_left}"
+    )
+    print(
+        f"Number of songs left to rank (estimation): {stats.estimated_songs_left:.0f}"
+    )
+    print(
+        f"Total music length left to rank (estimation): {str(stats.estimated_length_left)}\n"
     )
@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import hashlib
+import pandas as pd
+from utils import get_df_from_xls, get_unique_IDs, compact_songs_df
+from database import (
+    get_albums,
+    write_newdatabase_JSON,
+    make_html_tables,
+    database_fr,
+    database_en,
+)
+from search_index import write_search_index, get_search_index_path
+from rollup import build_rollup
+from profiling import profiled, stage
+import plotting
+
+# The plots of do_plots.py, with their arguments and the rollup inputs they read:
+# (function, kwargs, cube dimensions, cube measures, stream columns)
+plot_inputs = [
+    (
+        "make_length_plot",
+        {"plot_type": "timing"},
+        ["date_YM_DT"],
+        ["n_lengths", "length_minutes_sum", "length_seconds_sum"],
+        [],
+    ),
+    (
+        "make_length_plot",
+        {"plot_type": "stream_length"},
+        ["date_YM_DT"],
+        ["length_sum"],
+        ["htmlID", "date_YM_DT"],
+    ),
+    ("make_count_plot", {}, ["date_YM_DT"], ["n_songs"], ["htmlID", "date_YM_DT"]),
+    ("make_nsongs_plot", {}, ["rank"], ["n_songs"], []),
+    ("make_streamtype_plot", {"plot_type": "rank"}, ["media", "rank"], ["n_songs"], []),
+    ("make_livetype_plot", {}, [], [], ["htmlID", "media", "date_YM_DT"]),
+    (
+        "make_rank_length_streamtype",
+        {},
+        ["media", "rank"],
+        ["n_lengths", "length_sum"],
+        [],
+    ),
+] + [
+    (
+        "make_rank_plots",
+        {"rank": rank},
+        ["date_YM_DT", "when_ranked_YM_DT", "rank"],
+        ["n_songs"],
+        [],
+    )
+    for rank in ["high", "mid", "low"]
+]
+
+
+def get_file_fingerprints(xls_files):
+    """
+    Returns the (size, mtime_ns) of each workbook, None for the missing ones (e.g. during a save).
+    """
+    fingerprints = {}
+    for xls_file in xls_files:
+        try:
+            stat = os.stat(xls_file)
+            fingerprints[xls_file] = (stat.st_size, stat.st_mtime_ns)
+        except FileNotFoundError:
+            fingerprints[xls_file] = None
+    return fingerprints
+
+
+def get_stream_signatures(df):
+    """
+    Returns the hash of the rows of each stream, to tell which streams changed between two builds.
+
+    Parameters:
+    df (pd.DataFrame): The DataFrame containing song data.
+
+    Returns:
+    dict: A mapping {htmlID: hex digest}.
+    """
+    row_hashes = pd.util.hash_pandas_object(df, index=False)
+    return {
+        htmlID: hashlib.sha1(hashes.to_numpy().tobytes()).hexdigest()
+        for htmlID, hashes in row_hashes.groupby(
+            df["htmlID"].astype(str).to_numpy(), sort=False
+        )
+    }
+
+
+def get_plot_signature(rollup, dimensions, measures, stream_columns):
+    """
+    Returns the hash of the rollup inputs of a plot, to tell whether it must be drawn again.
+
+    Parameters:
+    rollup (rollup.Rollup): The rollup of the plotted songs.
+    dimensions (list): The cube dimensions the plot groups by.
+    measures (list): The cube measures the plot reads.
+    stream_columns (list): The columns of the per-stream totals the plot reads.
+
+    Returns:
+    str: The hex digest.
+    """
+    sha = hashlib.sha1()
+    if dimensions:
+        cube = (
+            rollup.cube.groupby(dimensions, observed=True, dropna=False)[measures]
+            .sum()
+            .reset_index()
+        )
+        sha.update(pd.util.hash_pandas_object(cube, index=False).to_numpy().tobytes())
+    if stream_columns:
+        streams = rollup.streams[stream_columns]
+        sha.update(
+            pd.util.hash_pandas_object(streams, index=False).to_numpy().tobytes()
+        )
+    return sha.hexdigest()
+
+
+class Watcher:
+    """
+    Keeps the parsed workbooks in memory and rebuilds the outputs of the workbooks that change.
+
+    A changed workbook is parsed again as a whole: the stream-block incremental parse
+    (`get_df_from_xls(incremental=True)`) is no faster, as every row must still be read and hashed
+    (see benchmarks/bench_incremental.py). The albums and the HTML tables are regenerated only for
+    the streams whose rows changed, and a plot only if the rollup data it reads changed.
+    """
+
+    def __init__(
+        self,
+        xls_files,
+        sheets=(False,),
+        tables=False,
+        plots=True,
+        debounce=2.0,
+        compact=False,
+        shards=None,
+    ):
+        """
+        Parameters:
+        xls_files (list): The paths to the Excel files, in concatenation order.
+        sheets (tuple): The EN flags of the sheets to watch. Default is French only.
+        tables (bool): A flag to regenerate the HTML tables of the changed streams. Default is False.
+        plots (bool): A flag to redraw the plots whose data changed, from the French sheet. Default is True.
+        debounce (float): The time (seconds) the workbooks must stay unchanged before a rebuild, so that
+                          a burst of saves triggers a single one. Default is 2.0.
+        compact (bool): A flag to write the database as compact JSON. Default is False.
+        shards (str): "album" or "year" to also write the database as shards. Default is None.
+        """
+        self.xls_files = xls_files
+        self.sheets = sheets
+        self.tables = tables
+        self.plots = plots and False in sheets
+        self.debounce = debounce
+        self.compact = compact
+        self.shards = shards
+        # Parsed sheet of each (workbook, EN flag), and the outputs of the last build
+        self.raw_dfs = {}
+        self.dfs = {}
+        self.signatures = {EN: {} for EN in sheets}
+        self.albums = {EN: {} for EN in sheets}
+        self.plot_signatures = {}
+        self.built = {}
+
+    @profiled
+    def ingest(self, xls_files):
+        """
+        Parses the given workbooks again, in full, and rebuilds the dataset of each sheet.
+        """
+        for xls_file in xls_files:
+            for EN in self.sheets:
+                self.raw_dfs[xls_file, EN] = get_df_from_xls(xls_file, EN=EN)
+        for EN in self.sheets:
+            self.dfs[EN] = compact_songs_df(
+                get_unique_IDs(
+                    pd.concat(
+                        [self.raw_dfs[xls_file, EN] for xls_file in self.xls_files],
+                        ignore_index=True,
+                    )
+                )
+            )
+
+    @profiled
+    def update_database(self, EN):
+        """
+        Rebuilds the albums of the changed streams, then writes the database, its search index and the
+        HTML tables of the changed streams.
+
+        Returns:
+        set: The htmlIDs of the changed or added streams.
+        """
+        df = self.dfs[EN]
+        signatures = get_stream_signatures(df)
+        changed = {
+            htmlID
+            for htmlID, signature in signatures.items()
+            if self.signatures[EN].get(htmlID) != signature
+        }
+        removed = set(self.signatures[EN]) - set(signatures)
+        if not changed and not removed:
+            return changed
+
+        albums = self.albums[EN]
+        for htmlID in removed:
+            albums.pop(htmlID, None)
+        if changed:
+            for album in get_albums(df[df["htmlID"].isin(changed)], EN):
+                albums[album["id"]] = album
+        write_newdatabase_JSON(
+            [albums[htmlID] for htmlID in signatures if htmlID in albums],
+            EN,
+            self.compact,
+            self.shards,
+        )
+        write_search_index(
+            df, get_search_index_path(database_en if EN else database_fr)
+        )
+        if self.tables and changed:
+            make_html_tables(df, EN, htmlIDs_to_update=changed)
+        # Only once every output is written, so that a failed rebuild is retried on the next one
+        self.signatures[EN] = signatures
+        print(
+            f"{'EN' if EN else 'FR'}: {len(changed)} stream(s) updated, {len(removed)} removed"
+        )
+        return changed
+
+    @profiled
+    def update_plots(self):
+        """
+        Redraws the plots whose rollup inputs changed since the last build.
+
+        Returns:
+        list: The names of the redrawn plots.
+        """
+        filtered_df = plotting.get_plotted_songs(self.dfs[False])
+        rollup = build_rollup(filtered_df)
+        redrawn = []
+        for function, kwargs, dimensions, measures, stream_columns in plot_inputs:
+            name = f"{function}{kwargs or ''}"
+            signature = get_plot_signature(rollup, dimensions, measures, stream_columns)
+            if self.plot_signatures.get(name) == signature:
+                continue
+            getattr(plotting, function)(filtered_df, rollup=rollup, **kwargs)
+            self.plot_signatures[name] = signature
+            redrawn.append(name)
+        if redrawn:
+            import matplotlib.pyplot as plt
+
+            plt.close("all")
+        print(f"{len(redrawn)} plot(s) redrawn")
+        return redrawn
+
+    @profiled
+    def rebuild(self, fingerprints):
+        """
+        Re-ingests the workbooks whose fingerprint changed since the last build and updates the outputs.
+
+        Parameters:
+        fingerprints (dict): The current fingerprints, see `get_file_fingerprints`.
+        """
+        changed_files = [
+            xls_file
+            for xls_file in self.xls_files
+            if fingerprints[xls_file] != self.built.get(xls_file)
+        ]
+        if any(fingerprints[xls_file] is None for xls_file in changed_files):
+            # A workbook is being replaced, wait for the next change
+            return
+        print(f"Rebuilding from {', '.join(changed_files)}")
+        with stage("watch.rebuild", "watch"):
+            self.ingest(changed_files)
+            for EN in self.sheets:
+                self.update_database(EN)
+            if self.plots:
+                self.update_plots()
+        self.built.update(fingerprints)
+
+    def run(self, interval=0.5):
+        """
+        Builds every output, then polls the workbooks and rebuilds once they stay unchanged for
+        `self.debounce` seconds. Stops on Ctrl+C.
+
+        Parameters:
+        interval (float): The polling interval (seconds). Default is 0.5.
+        """
+        self.rebuild(get_file_fingerprints(self.xls_files))
+        seen = dict(self.built)
+        last_change = None
+        print(f"Watching {', '.join(self.xls_files)} (Ctrl+C to stop)")
+        try:
+            while True:
+                time.sleep(interval)
+                fingerprints = get_file_fingerprints(self.xls_files)
+                if fingerprints != seen:
+                    seen = fingerprints
+                    last_change = time.monotonic()
+                elif (
+                    last_change is not None
+                    and time.monotonic() - last_change >= self.debounce
+                ):
+                    last_change = None
+                    try:
+                        self.rebuild(fingerprints)
+                    except Exception as error:
+                        # e.g. a workbook saved halfway, rebuilt on its next save
+                        print(f"Rebuild failed: {type(error).__name__}: {error}")
+        except KeyboardInterrupt:
+            print("Stopped watching")
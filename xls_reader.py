@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import posixpath
+import zipfile
+import xml.etree.ElementTree as ET
+from openpyxl.formula.translate import Translator
+from openpyxl.styles.numbers import (
+    BUILTIN_FORMATS,
+    is_date_format,
+    is_timedelta_format,
+)
+from openpyxl.utils.cell import coordinate_to_tuple, range_boundaries
+from openpyxl.utils.datetime import CALENDAR_MAC_1904, CALENDAR_WINDOWS_1900
+from openpyxl.utils.datetime import from_excel, from_ISO8601
+from profiling import profiled
+
+MAIN_NS = "http://schemas.openxmlformats.org/spreadsheetml/2006/main"
+REL_NS = "http://schemas.openxmlformats.org/officeDocument/2006/relationships"
+PKG_REL_NS = "http://schemas.openxmlformats.org/package/2006/relationships"
+
+ROW_TAG = f"{{{MAIN_NS}}}row"
+CELL_TAG = f"{{{MAIN_NS}}}c"
+VALUE_TAG = f"{{{MAIN_NS}}}v"
+FORMULA_TAG = f"{{{MAIN_NS}}}f"
+INLINE_TAG = f"{{{MAIN_NS}}}is"
+TEXT_TAG = f"{{{MAIN_NS}}}t"
+RPH_TAG = f"{{{MAIN_NS}}}rPh"
+HYPERLINK_TAG = f"{{{MAIN_NS}}}hyperlink"
+
+
+def _get_text(element):
+    """
+    Returns the plain text of a shared or inline string element, ignoring phonetic runs.
+
+    Parameters:
+    element (xml.etree.ElementTree.Element): A <si> or <is> element.
+
+    Returns:
+    str: The concatenated text of the element.
+    """
+    snippets = []
+    for child in element:
+        if child.tag == TEXT_TAG:
+            snippets.append(child.text or "")
+        elif child.tag != RPH_TAG:
+            t = child.find(TEXT_TAG)
+            if t is not None:
+                snippets.append(t.text or "")
+    return "".join(snippets)
+
+
+def _read_rels(zf, path):
+    """
+    Reads a relationship part and maps each relationship id to its target.
+
+    Parameters:
+    zf (zipfile.ZipFile): The opened workbook archive.
+    path (str): The path of the .rels part inside the archive.
+
+    Returns:
+    dict: A mapping {rId: target}.
+    """
+    if path not in zf.namelist():
+        return {}
+    root = ET.fromstring(zf.read(path))
+    return {
+        rel.get("Id"): rel.get("Target")
+        for rel in root.iter(f"{{{PKG_REL_NS}}}Relationship")
+    }
+
+
+def _resolve_part(base_dir, target):
+    """
+    Resolves a relationship target to a path inside the archive.
+
+    Parameters:
+    base_dir (str): The folder of the part owning the relationship.
+    target (str): The relationship target.
+
+    Returns:
+    str: The normalized path inside the archive.
+    """
+    if target.startswith("/"):
+        return target[1:]
+    return posixpath.normpath(posixpath.join(base_dir, target))
+
+
+def _read_shared_strings(zf):
+    """
+    Streams the shared strings table of the workbook.
+
+    Parameters:
+    zf (zipfile.ZipFile): The opened workbook archive.
+
+    Returns:
+    list: The shared strings, in index order.
+    """
+    strings = []
+    if "xl/sharedStrings.xml" not in zf.namelist():
+        return strings
+    with zf.open("xl/sharedStrings.xml") as f:
+        for _, node in ET.iterparse(f):
+            if node.tag == f"{{{MAIN_NS}}}si":
+                strings.append(_get_text(node).replace("x005F_", ""))
+                node.clear()
+    return strings
+
+
+def _read_date_styles(zf):
+    """
+    Finds the cell styles whose number format is a date or a duration.
+
+    Parameters:
+    zf (zipfile.ZipFile): The opened workbook archive.
+
+    Returns:
+    tuple: The set of date style indexes and the set of timedelta style indexes.
+    """
+    date_styles, timedelta_styles = set(), set()
+    if "xl/styles.xml" not in zf.namelist():
+        return date_styles, timedelta_styles
+    root = ET.fromstring(zf.read("xl/styles.xml"))
+    custom = {
+        int(fmt.get("numFmtId")): fmt.get("formatCode")
+        for fmt in root.iter(f"{{{MAIN_NS}}}numFmt")
+    }
+    cell_xfs = root.find(f"{{{MAIN_NS}}}cellXfs")
+    if cell_xfs is None:
+        return date_styles, timedelta_styles
+    for idx, xf in enumerate(cell_xfs.iter(f"{{{MAIN_NS}}}xf")):
+        num_fmt_id = int(xf.get("numFmtId", 0))
+        fmt = custom.get(num_fmt_id, BUILTIN_FORMATS.get(num_fmt_id))
+        if fmt is None:
+            continue
+        if is_date_format(fmt):
+            date_styles.add(idx)
+        if is_timedelta_format(fmt):
+            timedelta_styles.add(idx)
+    return date_styles, timedelta_styles
+
+
+def _get_sheet_part(zf, sheet_name):
+    """
+    Finds the worksheet part of a sheet and returns the workbook epoch.
+
+    Parameters:
+    zf (zipfile.ZipFile): The opened workbook archive.
+    sheet_name (str): The name of the sheet (e.g. "Sheet1").
+
+    Returns:
+    tuple: The path of the worksheet part and the workbook epoch.
+    """
+    root = ET.fromstring(zf.read("xl/workbook.xml"))
+    epoch = CALENDAR_WINDOWS_1900
+    workbook_pr = root.find(f"{{{MAIN_NS}}}workbookPr")
+    if workbook_pr is not None and workbook_pr.get("date1904") in ["1", "true"]:
+        epoch = CALENDAR_MAC_1904
+
+    rels = _read_rels(zf, "xl/_rels/workbook.xml.rels")
+    for sheet in root.iter(f"{{{MAIN_NS}}}sheet"):
+        if sheet.get("name") == sheet_name:
+            return _resolve_part("xl", rels[sheet.get(f"{{{REL_NS}}}id")]), epoch
+    raise KeyError(f"Worksheet {sheet_name} does not exist.")
+
+
+@profiled
+def read_sheet_rows(xls_file, sheet_name, max_col=10, min_row=None, max_row=None):
+    """
+    Streams a worksheet straight from the workbook archive, without openpyxl's workbook model.
+
+    Only the first `max_col` columns are kept and only rows holding at least one value are returned,
+    so the cost is linear in the number of filled rows. Cell values follow openpyxl's conventions
+    (formulas as "=..." strings, dates as datetime objects, hyperlinked empty cells take their target).
+
+    Parameters:
+    xls_file (str): The path to the Excel file.
+    sheet_name (str): The name of the sheet to read (e.g. "Sheet1").
+    max_col (int): The number of columns to keep, starting from column A.
+    min_row (int): The first row to read. If None, reads from the first row. Earlier rows are
+                   skipped without decoding their cells.
+    max_row (int): The last row to read. If None, reads the whole sheet.
+
+    Returns:
+    dict: A mapping {row number: (values, hyperlinks)}, where values and hyperlinks are lists
+          of length `max_col` holding the cell values and hyperlink targets (None when empty).
+    """
+    rows = {}
+    links = {}
+
+    with zipfile.ZipFile(xls_file) as zf:
+        sheet_part, epoch = _get_sheet_part(zf, sheet_name)
+        shared_strings = _read_shared_strings(zf)
+        date_styles, timedelta_styles = _read_date_styles(zf)
+        shared_formulae = {}
+
+        with zf.open(sheet_part) as f:
+            n_row = 0
+            for _, node in ET.iterparse(f):
+                if node.tag == ROW_TAG:
+                    n_row = int(node.get("r", n_row + 1))
+                    if min_row is not None and n_row < min_row:
+                        # Later rows may still translate the shared formulae defined here
+                        for cell in node.iter(CELL_TAG):
+                            formula = cell.find(FORMULA_TAG)
+                            if (
+                                formula is not None
+                                and formula.get("t") == "shared"
+                                and formula.text
+                                and formula.get("si") not in shared_formulae
+                            ):
+                                shared_formulae[formula.get("si")] = Translator(
+                                    "=" + formula.text, cell.get("r")
+                                )
+                        node.clear()
+                        continue
+                    if max_row is not None and n_row > max_row:
+                        node.clear()
+                        continue
+                    values = [None] * max_col
+                    n_col = 0
+                    for cell in node.iter(CELL_TAG):
+                        coordinate = cell.get("r")
+                        if coordinate:
+                            n_col = coordinate_to_tuple(coordinate)[1]
+                        else:
+                            n_col += 1
+                        if n_col > max_col:
+                            continue
+                        values[n_col - 1] = _get_cell_value(
+                            cell,
+                            coordinate,
+                            shared_strings,
+                            shared_formulae,
+                            date_styles,
+                            timedelta_styles,
+                            epoch,
+                        )
+                    if any(value is not None for value in values):
+                        rows[n_row] = values
+                    node.clear()
+
+                elif node.tag == HYPERLINK_TAG:
+                    links[node.get("ref")] = (
+                        node.get(f"{{{REL_NS}}}id"),
+                        node.get("location"),
+                    )
+
+        sheet_dir, sheet_file = posixpath.split(sheet_part)
+        sheet_rels = _read_rels(zf, f"{sheet_dir}/_rels/{sheet_file}.rels")
+
+    # Hyperlinks are stored after the sheet data, bind them once every row is known
+    hyperlinks = {}
+    for ref, (rel_id, location) in links.items():
+        target = sheet_rels.get(rel_id) if rel_id else None
+        min_col, min_row_ref, max_col_ref, max_row_ref = range_boundaries(ref)
+        for n_row in range(max(min_row_ref, min_row or 1), max_row_ref + 1):
+            if max_row is not None and n_row > max_row:
+                break
+            for n_col in range(min_col, min(max_col_ref, max_col) + 1):
+                hyperlinks.setdefault(n_row, [None] * max_col)[n_col - 1] = target
+                values = rows.setdefault(n_row, [None] * max_col)
+                if values[n_col - 1] is None:
+                    values[n_col - 1] = target or location
+
+    return {
+        n_row: (values, hyperlinks.get(n_row, [None] * max_col))
+        for n_row, values in sorted(rows.items())
+    }
+
+
+def _get_cell_value(
+    cell,
+    coordinate,
+    shared_strings,
+    shared_formulae,
+    date_styles,
+    timedelta_styles,
+    epoch,
+):
+    """
+    Converts a <c> element to the value openpyxl would give the cell.
+
+    Parameters:
+    cell (xml.etree.ElementTree.Element): The cell element.
+    coordinate (str): The cell coordinate (e.g. "C5").
+    shared_strings (list): The shared strings table.
+    shared_formulae (dict): The shared formulae met so far, updated in place.
+    date_styles (set): The style indexes holding a date format.
+    timedelta_styles (set): The style indexes holding a duration format.
+    epoch (datetime.datetime): The workbook epoch.
+
+    Returns:
+    The cell value, or None if the cell is empty.
+    """
+    data_type = cell.get("t", "n")
+
+    formula = cell.find(FORMULA_TAG)
+    if formula is not None:
+        value = "=" + (formula.text or "")
+        if formula.get("t") == "shared":
+            idx = formula.get("si")
+            if idx in shared_formulae:
+                value = shared_formulae[idx].translate_formula(coordinate)
+            elif value != "=":
+                shared_formulae[idx] = Translator(value, coordinate)
+        return value
+
+    if data_type == "inlineStr":
+        child = cell.find(INLINE_TAG)
+        return _get_text(child) if child is not None else None
+
+    value = cell.findtext(VALUE_TAG) or None
+    if value is None:
+        return None
+    if data_type == "n":
+        value = float(value) if any(c in value for c in ".Ee") else int(value)
+        style_id = int(cell.get("s", 0))
+        if style_id in date_styles:
+            try:
+                value = from_excel(value, epoch, timedelta=style_id in timedelta_styles)
+            except (OverflowError, ValueError):
+                value = "#VALUE!"
+    elif data_type == "s":
+        value = shared_strings[int(value)]
+    elif data_type == "b":
+        value = bool(int(value))
+    elif data_type == "d":
+        value = from_ISO8601(value)
+    return value
+
+
+@profiled
+def read_sheet_rows_openpyxl(xls_file, sheet_name, max_col=10, max_row=1500):
+    """
+    Reads a worksheet with a full openpyxl workbook load, in the same format as `read_sheet_rows`.
+
+    Parameters:
+    xls_file (str): The path to the Excel file.
+    sheet_name (str): The name of the sheet to read (e.g. "Sheet1").
+    max_col (int): The number of columns to keep, starting from column A.
+    max_row (int): The last row to read.
+
+    Returns:
+    dict: A mapping {row number: (values, hyperlinks)}, see `read_sheet_rows`.
+    """
+    import openpyxl
+
+    wrkbk = openpyxl.load_workbook(xls_file)
+    sh = wrkbk[sheet_name]
+    if max_row is None:
+        max_row = sh.max_row
+
+    rows = {}
+    for n_row, row in enumerate(
+        sh.iter_rows(min_row=1, min_col=1, max_row=max_row, max_col=max_col), 1
+    ):
+        values = [cell.value for cell in row]
+        if any(value is not None for value in values):
+            rows[n_row] = (
+                values,
+                [
+                    cell.hyperlink.target if cell.hyperlink is not None else None
+                    for cell in row
+                ],
+            )
+    return rows